@@ -0,0 +1,23 @@
+"""Add retry scheduling column
+
+Revision ID: 002_retry_scheduling
+Revises: 001_initial
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002_retry_scheduling'
+down_revision = '001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('next_retry_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'next_retry_at')
@@ -0,0 +1,27 @@
+"""Add job priority
+
+Revision ID: 003_job_priority
+Revises: 002_retry_scheduling
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003_job_priority'
+down_revision = '002_retry_scheduling'
+branch_labels = None
+depends_on = None
+
+jobpriority = sa.Enum('HIGH', 'NORMAL', 'LOW', name='jobpriority')
+
+
+def upgrade() -> None:
+    jobpriority.create(op.get_bind(), checkfirst=True)
+    op.add_column('jobs', sa.Column('priority', jobpriority, nullable=False, server_default='NORMAL'))
+
+
+def downgrade() -> None:
+    op.drop_column('jobs', 'priority')
+    jobpriority.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,26 @@
+"""Add CANCELLED task status
+
+Revision ID: 004_task_cancelled_status
+Revises: 003_job_priority
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '004_task_cancelled_status'
+down_revision = '003_job_priority'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # SQLite stores enums as plain strings; only Postgres has a type to extend
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE taskstatus ADD VALUE IF NOT EXISTS 'CANCELLED'")
+
+
+def downgrade() -> None:
+    # Postgres cannot drop a value from an enum type; map it back instead
+    op.execute("UPDATE tasks SET status = 'FAILED' WHERE status = 'CANCELLED'")
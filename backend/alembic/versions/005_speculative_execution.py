@@ -0,0 +1,23 @@
+"""Add speculative execution column
+
+Revision ID: 005_speculative_execution
+Revises: 004_task_cancelled_status
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005_speculative_execution'
+down_revision = '004_task_cancelled_status'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('speculated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'speculated_at')
@@ -0,0 +1,35 @@
+"""Add database-backed queue table
+
+Revision ID: 006_queue_messages
+Revises: 005_speculative_execution
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006_queue_messages'
+down_revision = '005_speculative_execution'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'queue_messages',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('queue', sa.String(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('visible_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('receipt_handle', sa.String(), nullable=True),
+        sa.Column('receive_count', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_queue_messages_queue_visible_at', 'queue_messages', ['queue', 'visible_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_queue_messages_queue_visible_at', table_name='queue_messages')
+    op.drop_table('queue_messages')
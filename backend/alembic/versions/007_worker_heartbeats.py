@@ -0,0 +1,29 @@
+"""Add worker heartbeats for queue shard assignment
+
+Revision ID: 007_worker_heartbeats
+Revises: 006_queue_messages
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007_worker_heartbeats'
+down_revision = '006_queue_messages'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'worker_heartbeats',
+        sa.Column('worker_id', sa.String(), nullable=False),
+        sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('worker_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('worker_heartbeats')
@@ -0,0 +1,27 @@
+"""Add result store references to tasks
+
+Revision ID: 008_task_result_refs
+Revises: 007_worker_heartbeats
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_task_result_refs'
+down_revision = '007_worker_heartbeats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('result_ref', sa.String(), nullable=True))
+    op.add_column('tasks', sa.Column('result_digest', sa.String(), nullable=True))
+    op.add_column('tasks', sa.Column('result_size_bytes', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'result_size_bytes')
+    op.drop_column('tasks', 'result_digest')
+    op.drop_column('tasks', 'result_ref')
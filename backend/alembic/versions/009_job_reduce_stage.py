@@ -0,0 +1,39 @@
+"""Add reduce stage to jobs
+
+Revision ID: 009_job_reduce_stage
+Revises: 008_task_result_refs
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009_job_reduce_stage'
+down_revision = '008_task_result_refs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('reduce_spec', sa.Text(), nullable=True))
+    op.add_column('jobs', sa.Column('reduce_result', sa.Text(), nullable=True))
+    op.add_column('jobs', sa.Column('reduce_completed_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_table(
+        'job_reduce_partials',
+        sa.Column('job_id', sa.String(), nullable=False),
+        sa.Column('level', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.Integer(), nullable=False),
+        sa.Column('expected', sa.Integer(), nullable=False),
+        sa.Column('received', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['jobs.id'], ),
+        sa.PrimaryKeyConstraint('job_id', 'level', 'bucket')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job_reduce_partials')
+    op.drop_column('jobs', 'reduce_completed_at')
+    op.drop_column('jobs', 'reduce_result')
+    op.drop_column('jobs', 'reduce_spec')
@@ -0,0 +1,48 @@
+"""Add job stages and task dependencies
+
+Revision ID: 010_job_stages
+Revises: 009_job_reduce_stage
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010_job_stages'
+down_revision = '009_job_reduce_stage'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('stage_index', sa.Integer(), nullable=True))
+    op.add_column('tasks', sa.Column('pending_dependencies', sa.Integer(), server_default='0', nullable=False))
+    op.create_table(
+        'job_stages',
+        sa.Column('job_id', sa.String(), nullable=False),
+        sa.Column('stage_index', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('num_tasks', sa.Integer(), nullable=False),
+        sa.Column('first_task_index', sa.Integer(), nullable=False),
+        sa.Column('depends_on', sa.Text(), nullable=True),
+        sa.Column('dependency', sa.String(), nullable=False),
+        sa.Column('pending_tasks', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['jobs.id'], ),
+        sa.PrimaryKeyConstraint('job_id', 'stage_index')
+    )
+    op.create_table(
+        'task_dependencies',
+        sa.Column('depends_on_task_id', sa.String(), nullable=False),
+        sa.Column('task_id', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['depends_on_task_id'], ['tasks.id'], ),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ),
+        sa.PrimaryKeyConstraint('depends_on_task_id', 'task_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('task_dependencies')
+    op.drop_table('job_stages')
+    op.drop_column('tasks', 'pending_dependencies')
+    op.drop_column('tasks', 'stage_index')
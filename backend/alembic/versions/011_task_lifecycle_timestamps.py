@@ -0,0 +1,25 @@
+"""Add lifecycle timestamps to tasks
+
+Revision ID: 011_task_lifecycle_timestamps
+Revises: 010_job_stages
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011_task_lifecycle_timestamps'
+down_revision = '010_job_stages'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('enqueued_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('tasks', sa.Column('received_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'received_at')
+    op.drop_column('tasks', 'enqueued_at')
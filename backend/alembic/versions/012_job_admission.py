@@ -0,0 +1,23 @@
+"""Add admission request to jobs
+
+Revision ID: 012_job_admission
+Revises: 011_task_lifecycle_timestamps
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012_job_admission'
+down_revision = '011_task_lifecycle_timestamps'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('admission_request', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('jobs', 'admission_request')
@@ -0,0 +1,55 @@
+"""Replace single-column task indexes with composite and partial ones
+
+Revision ID: 013_composite_indexes
+Revises: 012_job_admission
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013_composite_indexes'
+down_revision = '012_job_admission'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Duplicates of the primary key indexes
+    op.drop_index('ix_jobs_id', table_name='jobs')
+    op.drop_index('ix_tasks_id', table_name='tasks')
+    
+    op.create_index('ix_jobs_created_at', 'jobs', ['created_at'], unique=False)
+    op.create_index(
+        'ix_jobs_awaiting_admission', 'jobs', ['created_at'], unique=False,
+        postgresql_where=sa.text("admission_request IS NOT NULL"),
+        sqlite_where=sa.text("admission_request IS NOT NULL"),
+    )
+    
+    # Prefixes of the composite indexes below
+    op.drop_index('ix_tasks_job_id', table_name='tasks')
+    op.drop_index('ix_tasks_status', table_name='tasks')
+    
+    op.create_index('uq_tasks_job_id_task_index', 'tasks', ['job_id', 'task_index'], unique=True)
+    op.create_index('ix_tasks_job_id_status', 'tasks', ['job_id', 'status'], unique=False)
+    op.create_index('ix_tasks_status_started_at', 'tasks', ['status', 'started_at'], unique=False)
+    op.create_index(
+        'ix_tasks_retrying_next_retry_at', 'tasks', ['next_retry_at'], unique=False,
+        postgresql_where=sa.text("status = 'RETRYING'"),
+        sqlite_where=sa.text("status = 'RETRYING'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_retrying_next_retry_at', table_name='tasks')
+    op.drop_index('ix_tasks_status_started_at', table_name='tasks')
+    op.drop_index('ix_tasks_job_id_status', table_name='tasks')
+    op.drop_index('uq_tasks_job_id_task_index', table_name='tasks')
+    op.create_index('ix_tasks_status', 'tasks', ['status'], unique=False)
+    op.create_index('ix_tasks_job_id', 'tasks', ['job_id'], unique=False)
+    
+    op.drop_index('ix_jobs_awaiting_admission', table_name='jobs')
+    op.drop_index('ix_jobs_created_at', table_name='jobs')
+    op.create_index('ix_tasks_id', 'tasks', ['id'], unique=False)
+    op.create_index('ix_jobs_id', 'jobs', ['id'], unique=False)
@@ -0,0 +1,53 @@
+"""Add tasks_archive for tasks of finished jobs past retention
+
+Revision ID: 014_tasks_archive
+Revises: 013_composite_indexes
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014_tasks_archive'
+down_revision = '013_composite_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('archived_at', sa.DateTime(timezone=True), nullable=True))
+    # Monthly partitions are created by the archiver (Postgres only)
+    op.create_table(
+        'tasks_archive',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('job_id', sa.String(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('task_index', sa.Integer(), nullable=False),
+        sa.Column('stage_index', sa.Integer(), nullable=True),
+        sa.Column('retry_count', sa.Integer(), nullable=True),
+        sa.Column('max_retries', sa.Integer(), nullable=True),
+        sa.Column('parameters', sa.Text(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('result_ref', sa.String(), nullable=True),
+        sa.Column('result_digest', sa.String(), nullable=True),
+        sa.Column('result_size_bytes', sa.Integer(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('processing_time_seconds', sa.Float(), nullable=True),
+        sa.Column('enqueued_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id', 'completed_at'),
+        postgresql_partition_by='RANGE (completed_at)'
+    )
+    op.create_index('ix_tasks_archive_job_id_task_index', 'tasks_archive', ['job_id', 'task_index'], unique=False)
+
+
+def downgrade() -> None:
+    # Partitions are dropped with the parent table
+    op.drop_index('ix_tasks_archive_job_id_task_index', table_name='tasks_archive')
+    op.drop_table('tasks_archive')
+    op.drop_column('jobs', 'archived_at')
@@ -1,56 +1,112 @@
 """
 Database configuration and session management.
+
+The engine is built from ``DATABASE_URL`` as given (no probing or fallback)
+by ``init_engine()``, which the API's lifespan hook calls at startup before
+warming the pool. Importing this module never touches the network.
 """
-from sqlalchemy import create_engine
+import threading
+from typing import Any, Dict
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import structlog
+
 from app.utils.config import get_settings
 
+logger = structlog.get_logger(__name__)
 settings = get_settings()
 
-# Create engine
-# Use SQLite for local demo if Postgres not available
-database_url = settings.database_url
-if "postgresql" in database_url and "localhost" in database_url:
-    # Check if we can connect to Postgres, fallback to SQLite
-    try:
-        import psycopg2
-        from urllib.parse import urlparse
-        parsed = urlparse(database_url)
-        conn = psycopg2.connect(
-            host=parsed.hostname or "localhost",
-            port=parsed.port or 5432,
-            user=parsed.username or "postgres",
-            password=parsed.password or "postgres",
-            database=parsed.path[1:] if parsed.path else "jobdb",
-            connect_timeout=2
-        )
-        conn.close()
-    except:
-        # Fallback to SQLite for demo
-        database_url = "sqlite:///./jobdb.db"
-        print("⚠️  Postgres not available, using SQLite for demo")
-
-engine = create_engine(
-    database_url,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
-    connect_args={"check_same_thread": False} if "sqlite" in database_url else {}
-)
-
-# Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Session factory; bound to the engine by init_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 # Base class for models
 Base = declarative_base()
 
+_engine: Engine = None
+_engine_lock = threading.Lock()
+_ready = False
+
+
+def init_engine() -> Engine:
+    """Create the engine and bind ``SessionLocal`` to it (once per process)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            database_url = settings.database_url
+            if database_url.startswith("sqlite"):
+                connect_args = {"check_same_thread": False}
+            elif database_url.startswith("postgresql"):
+                connect_args = {"connect_timeout": settings.database_connect_timeout_seconds}
+            else:
+                connect_args = {}
+            _engine = create_engine(
+                database_url,
+                pool_pre_ping=True,
+                pool_size=settings.database_pool_size,
+                max_overflow=settings.database_max_overflow,
+                connect_args=connect_args,
+            )
+            SessionLocal.configure(bind=_engine)
+            logger.info("Database engine created", dialect=_engine.dialect.name)
+    return _engine
+
+
+def get_engine() -> Engine:
+    """The process-wide engine, created on first use."""
+    return _engine or init_engine()
+
+
+def warm_up_pool(connections: int = None) -> int:
+    """Open pool connections up front so the first requests don't pay for them; raises if unreachable."""
+    engine = get_engine()
+    count = settings.database_pool_warm_up if connections is None else connections
+    opened = []
+    try:
+        for _ in range(count):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()  # Back to the pool, still open
+    logger.info("Database pool warmed up", connections=len(opened))
+    return len(opened)
+
+
+def set_ready(ready: bool) -> None:
+    """Mark startup as finished (or shutdown as begun) for readiness checks."""
+    global _ready
+    _ready = ready
+
+
+def readiness() -> Dict[str, Any]:
+    """Readiness for /health: startup has finished and the database answers now."""
+    if not _ready:
+        return {"ready": False, "database": "not ready"}
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.warning("Database readiness check failed", error=str(e))
+        return {"ready": False, "database": "unavailable"}
+    return {"ready": True, "database": "connected"}
+
+
+def dispose_engine() -> None:
+    """Close pooled connections at shutdown."""
+    global _ready
+    _ready = False
+    if _engine is not None:
+        _engine.dispose()
+
 
 def get_db():
     """Dependency for getting database session."""
+    get_engine()
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-
@@ -1,7 +1,7 @@
 """
 SQLAlchemy database models.
 """
-from sqlalchemy import Column, String, Integer, DateTime, Enum, Text, ForeignKey, Float
+from sqlalchemy import Column, String, Integer, DateTime, Enum, Text, ForeignKey, Float, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -19,6 +19,13 @@ class JobStatus(str, enum.Enum):
     CANCELLED = "CANCELLED"
 
 
+class JobPriority(str, enum.Enum):
+    """Job priority enumeration (selects the SQS queue tasks are routed to)."""
+    HIGH = "HIGH"
+    NORMAL = "NORMAL"
+    LOW = "LOW"
+
+
 class TaskStatus(str, enum.Enum):
     """Task status enumeration."""
     PENDING = "PENDING"
@@ -27,15 +34,26 @@ class TaskStatus(str, enum.Enum):
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
     RETRYING = "RETRYING"
+    CANCELLED = "CANCELLED"
 
 
 class Job(Base):
     """Job model representing a distributed computation job."""
     __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_created_at", "created_at"),
+        # Jobs held by admission control, in submission order
+        Index(
+            "ix_jobs_awaiting_admission", "created_at",
+            postgresql_where=text("admission_request IS NOT NULL"),
+            sqlite_where=text("admission_request IS NOT NULL"),
+        ),
+    )
     
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     job_type = Column(String, nullable=False, index=True)
     status = Column(Enum(JobStatus), default=JobStatus.PENDING, index=True)
+    priority = Column(Enum(JobPriority), default=JobPriority.NORMAL, nullable=False)
     total_tasks = Column(Integer, default=0)
     completed_tasks = Column(Integer, default=0)
     failed_tasks = Column(Integer, default=0)
@@ -45,9 +63,16 @@ class Job(Base):
     started_at = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     error_message = Column(Text, nullable=True)
+    reduce_spec = Column(Text, nullable=True)  # JSON ReduceSpec, set when the job has a reduce stage
+    reduce_result = Column(Text, nullable=True)  # JSON result of the reduce stage
+    reduce_completed_at = Column(DateTime(timezone=True), nullable=True)  # Set once every task is folded in
+    admission_request = Column(Text, nullable=True)  # JSON JobCreate while held by admission control
+    archived_at = Column(DateTime(timezone=True), nullable=True)  # Tasks moved to tasks_archive
     
     # Relationships
     tasks = relationship("Task", back_populates="job", cascade="all, delete-orphan")
+    reduce_partials = relationship("JobReducePartial", cascade="all, delete-orphan")
+    stages = relationship("JobStage", cascade="all, delete-orphan", order_by="JobStage.stage_index")
     
     def __repr__(self):
         return f"<Job(id={self.id}, status={self.status}, tasks={self.completed_tasks}/{self.total_tasks})>"
@@ -56,21 +81,42 @@ class Job(Base):
 class Task(Base):
     """Task model representing a single unit of work."""
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Also serves job_id lookups and per-job ordering by task_index
+        Index("uq_tasks_job_id_task_index", "job_id", "task_index", unique=True),
+        Index("ix_tasks_job_id_status", "job_id", "status"),
+        # Also serves status-only counts; started_at for finding stuck RUNNING tasks
+        Index("ix_tasks_status_started_at", "status", "started_at"),
+        Index(
+            "ix_tasks_retrying_next_retry_at", "next_retry_at",
+            postgresql_where=text("status = 'RETRYING'"),
+            sqlite_where=text("status = 'RETRYING'"),
+        ),
+    )
     
-    id = Column(String, primary_key=True, index=True)
-    job_id = Column(String, ForeignKey("jobs.id"), nullable=False, index=True)
-    status = Column(Enum(TaskStatus), default=TaskStatus.PENDING, index=True)
+    id = Column(String, primary_key=True)
+    job_id = Column(String, ForeignKey("jobs.id"), nullable=False)
+    status = Column(Enum(TaskStatus), default=TaskStatus.PENDING)
     task_index = Column(Integer, nullable=False)  # Order within job
     retry_count = Column(Integer, default=0)
     max_retries = Column(Integer, default=3)
     parameters = Column(Text)  # JSON string
     result = Column(Text, nullable=True)  # JSON string
+    result_ref = Column(String, nullable=True)  # Result store key for offloaded (large) results
+    result_digest = Column(String, nullable=True)  # "sha256:<hex>" of the uncompressed payload
+    result_size_bytes = Column(Integer, nullable=True)  # Uncompressed payload size
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     started_at = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     processing_time_seconds = Column(Float, nullable=True)
+    enqueued_at = Column(DateTime(timezone=True), nullable=True)  # Message became visible (last attempt)
+    received_at = Column(DateTime(timezone=True), nullable=True)  # Worker received the message (worker clock)
+    next_retry_at = Column(DateTime(timezone=True), nullable=True)  # When a RETRYING task is due
+    speculated_at = Column(DateTime(timezone=True), nullable=True)  # When a speculative copy was enqueued
+    stage_index = Column(Integer, nullable=True)  # Stage within a multi-stage job
+    pending_dependencies = Column(Integer, default=0, nullable=False)  # Unfinished inputs; enqueued at 0
     
     # Relationships
     job = relationship("Job", back_populates="tasks")
@@ -78,3 +124,131 @@ class Task(Base):
     def __repr__(self):
         return f"<Task(id={self.id}, job_id={self.job_id}, status={self.status}, retries={self.retry_count})>"
 
+
+class TaskArchive(Base):
+    """
+    Task of a finished job moved out of ``tasks`` after the retention window.
+    
+    Range-partitioned by month of ``completed_at`` on Postgres; partitions are
+    created by the archiver as needed. Scheduling-only columns are not kept.
+    """
+    __tablename__ = "tasks_archive"
+    __table_args__ = (
+        Index("ix_tasks_archive_job_id_task_index", "job_id", "task_index"),
+        {"postgresql_partition_by": "RANGE (completed_at)"},
+    )
+    
+    # The partition key has to be part of the primary key
+    id = Column(String, primary_key=True)
+    completed_at = Column(DateTime(timezone=True), primary_key=True)
+    job_id = Column(String, nullable=False)
+    status = Column(Enum(TaskStatus, native_enum=False, length=16), nullable=False)
+    task_index = Column(Integer, nullable=False)
+    stage_index = Column(Integer, nullable=True)
+    retry_count = Column(Integer, default=0)
+    max_retries = Column(Integer, default=3)
+    parameters = Column(Text)
+    result = Column(Text, nullable=True)
+    result_ref = Column(String, nullable=True)
+    result_digest = Column(String, nullable=True)
+    result_size_bytes = Column(Integer, nullable=True)
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    processing_time_seconds = Column(Float, nullable=True)
+    enqueued_at = Column(DateTime(timezone=True), nullable=True)
+    received_at = Column(DateTime(timezone=True), nullable=True)
+    
+    def __repr__(self):
+        return f"<TaskArchive(id={self.id}, job_id={self.job_id}, status={self.status})>"
+
+
+class QueueMessage(Base):
+    """Message in the database-backed task queue (QUEUE_BACKEND=database)."""
+    __tablename__ = "queue_messages"
+    __table_args__ = (
+        Index("ix_queue_messages_queue_visible_at", "queue", "visible_at"),
+    )
+    
+    id = Column(String, primary_key=True)
+    queue = Column(String, nullable=False)
+    body = Column(Text, nullable=False)  # JSON string
+    visible_at = Column(DateTime(timezone=True), nullable=False)  # Hidden until this time
+    receipt_handle = Column(String, nullable=True)  # Set on each receive
+    receive_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<QueueMessage(id={self.id}, queue={self.queue}, receives={self.receive_count})>"
+
+
+class WorkerHeartbeat(Base):
+    """Last heartbeat of a worker, used to divide queue shards between live workers."""
+    __tablename__ = "worker_heartbeats"
+    
+    worker_id = Column(String, primary_key=True)
+    last_seen_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<WorkerHeartbeat(worker_id={self.worker_id}, last_seen_at={self.last_seen_at})>"
+
+
+class JobStage(Base):
+    """
+    Stage of a multi-stage job.
+    
+    A stage's tasks occupy task indexes ``first_task_index`` onwards. With
+    ``dependency="all"`` each task waits for every task of the upstream stages
+    (one barrier per upstream stage, released when ``pending_tasks`` reaches
+    zero); with ``"one_to_one"`` task i waits for task i of each upstream stage
+    (edges in ``task_dependencies``).
+    """
+    __tablename__ = "job_stages"
+    
+    job_id = Column(String, ForeignKey("jobs.id"), primary_key=True)
+    stage_index = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    num_tasks = Column(Integer, nullable=False)
+    first_task_index = Column(Integer, nullable=False)
+    depends_on = Column(Text, nullable=True)  # JSON list of upstream stage indexes
+    dependency = Column(String, nullable=False, default="all")  # "all" or "one_to_one"
+    pending_tasks = Column(Integer, nullable=False)  # Tasks not yet completed or failed
+    
+    def __repr__(self):
+        return f"<JobStage(job_id={self.job_id}, name={self.name}, pending={self.pending_tasks}/{self.num_tasks})>"
+
+
+class TaskDependency(Base):
+    """Edge from an upstream task to a task waiting for it (one_to_one stages)."""
+    __tablename__ = "task_dependencies"
+    
+    # Upstream first: completions look up their dependents by it
+    depends_on_task_id = Column(String, ForeignKey("tasks.id"), primary_key=True)
+    task_id = Column(String, ForeignKey("tasks.id"), primary_key=True)
+    
+    def __repr__(self):
+        return f"<TaskDependency({self.depends_on_task_id} -> {self.task_id})>"
+
+
+class JobReducePartial(Base):
+    """
+    One node of a job's reduce tree.
+    
+    Level 0 buckets fold ``fan_in`` consecutive tasks each; a bucket that has
+    received all of its inputs is folded into its parent on the next level, up
+    to the single root. Rows are created with the job and deleted once the
+    root completes.
+    """
+    __tablename__ = "job_reduce_partials"
+    
+    job_id = Column(String, ForeignKey("jobs.id"), primary_key=True)
+    level = Column(Integer, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    expected = Column(Integer, nullable=False)  # Inputs (tasks or child buckets) this node waits for
+    received = Column(Integer, default=0, nullable=False)
+    value = Column(Text, nullable=True)  # JSON partial aggregate
+    
+    def __repr__(self):
+        return f"<JobReducePartial(job_id={self.job_id}, level={self.level}, bucket={self.bucket}, {self.received}/{self.expected})>"
@@ -2,14 +2,27 @@
 FastAPI application entrypoint for the Job Orchestration Platform.
 """
 import os
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 import structlog
 
-from app.db.database import engine, Base, get_db
-from app.routes import jobs, tasks, analytics
+from app.db.database import Base, SessionLocal, dispose_engine, init_engine, readiness, set_ready, warm_up_pool
+from app.routes import jobs, tasks, analytics, queue, workers
+from app.services.admission_service import get_admission_controller
+from app.services.archive_service import get_task_archiver
+from app.services.backlog_service import register_backlog_collector
+from app.services.retry_service import get_retry_scheduler
+from app.services.fair_share_service import get_fair_share_dispatcher
+from app.services.straggler_service import get_straggler_detector
+from app.services.embedded_worker import get_embedded_worker_pool
+from app.utils.aws import close_aws_clients, init_aws_clients
 from app.utils.config import get_settings
+from app.utils.logging_config import configure_logging
+from app.utils.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_PROGRESS, register_pool_collector
+from app.utils.profiling import TimedJSONResponse, instrument_engine, profile_request
 
 logger = structlog.get_logger(__name__)
 settings = get_settings()
@@ -18,17 +31,65 @@ settings = get_settings()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events."""
-    # Startup
+    # Startup; logging first, so its queue listener starts with the app rather than on import
+    configure_logging()
     logger.info("Starting application", database_url=settings.database_url)
     
+    # Connect to the configured database before anything else uses it
+    engine = init_engine()
+    register_pool_collector(engine)
+    if settings.profiling_enabled:
+        instrument_engine(engine)
+    try:
+        warm_up_pool()
+    except Exception as e:
+        logger.error("Database unreachable at startup", error=str(e))
+    
+    # Shared AWS clients, built once instead of per request
+    init_aws_clients()
+    
     # Create tables (in production, use migrations)
     if os.getenv("CREATE_TABLES", "false").lower() == "true":
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables created")
     
+    # Re-enqueue RETRYING tasks once their backoff elapses
+    retry_scheduler = get_retry_scheduler()
+    retry_scheduler.start(SessionLocal)
+    
+    # Release held tasks to SQS by weighted round robin across job types
+    if settings.fair_share_enabled:
+        get_fair_share_dispatcher().start(SessionLocal)
+    
+    # Admit jobs held by admission control as outstanding tasks finish
+    if get_admission_controller().enabled:
+        get_admission_controller().start(SessionLocal)
+    
+    # Speculatively re-run stragglers of nearly finished jobs
+    if settings.speculative_execution_enabled:
+        get_straggler_detector().start(SessionLocal)
+    
+    # Move finished jobs' tasks past retention into tasks_archive
+    if settings.archive_enabled:
+        get_task_archiver().start(SessionLocal)
+    
+    # Run tasks in-process against the in-memory queue
+    if settings.queue_backend == "memory" and settings.embedded_worker_count > 0:
+        get_embedded_worker_pool().start(SessionLocal)
+    
+    set_ready(True)
     yield
     
     # Shutdown
+    set_ready(False)
+    get_embedded_worker_pool().stop()
+    get_task_archiver().stop()
+    get_straggler_detector().stop()
+    get_admission_controller().stop()
+    get_fair_share_dispatcher().stop()
+    retry_scheduler.stop()
+    dispose_engine()
+    close_aws_clients()
     logger.info("Shutting down application")
 
 
@@ -37,6 +98,7 @@ app = FastAPI(
     description="Distributed job orchestration system with AWS Serverless + Kubernetes",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=TimedJSONResponse,
 )
 
 # CORS middleware
@@ -48,10 +110,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Observe request latency per route template and track in-flight requests."""
+    in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(request.method)
+    in_progress.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_progress.dec()
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            request.method,
+            route.path if route else "unmatched",
+            str(status)
+        ).observe(time.perf_counter() - start)
+
+
+# Opt-in: Server-Timing breakdown on every response, profiles of sampled requests
+if settings.profiling_enabled:
+    app.middleware("http")(profile_request)
+
+register_backlog_collector(SessionLocal)
+
 # Include routers
 app.include_router(jobs.router, prefix="/api/v1", tags=["jobs"])
 app.include_router(tasks.router, prefix="/api/v1", tags=["tasks"])
 app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["analytics"])
+app.include_router(queue.router, prefix="/api/v1", tags=["queue"])
+app.include_router(workers.router, prefix="/api/v1", tags=["workers"])
 
 
 @app.get("/")
@@ -64,12 +156,21 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics (sync: the backlog collector queries the database and queues)."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health")
-async def health():
-    """Detailed health check."""
+def health(response: Response):
+    """Readiness check: 503 until startup has finished and while the database is unreachable."""
+    state = readiness()
+    if not state["ready"]:
+        response.status_code = 503
     return {
-        "status": "healthy",
-        "database": "connected"  # Could add actual DB check
+        "status": "healthy" if state["ready"] else "unavailable",
+        "database": state["database"],
     }
 
 
@@ -2,19 +2,81 @@
 Pydantic schemas for API request/response models.
 """
 from pydantic import BaseModel, Field, model_validator
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Literal
 from datetime import datetime
-from app.db.models import JobStatus, TaskStatus
+from app.db.models import JobStatus, JobPriority, TaskStatus
 import json
 import ast
 
 
 # Job Schemas
+class ReduceSpec(BaseModel):
+    """Schema for a job's reduce stage, which folds task results into one job result."""
+    op: Literal["sum", "concat", "top_k", "custom"] = Field(..., description="Reduce operation")
+    field: str = Field(default="output", description="Dotted path of the reduced value within each task result")
+    k: Optional[int] = Field(default=None, ge=1, le=10000, description="Items kept by top_k")
+    key: Optional[str] = Field(default=None, description="top_k: dotted path of the sort key within each item (default: the item)")
+    handler: Optional[str] = Field(default=None, description="custom: name of a reducer registered in REDUCE_HANDLERS")
+    fan_in: int = Field(default=64, ge=2, le=1024, description="Inputs folded per node of the reduce tree")
+    
+    @model_validator(mode='after')
+    def check_op_arguments(self):
+        """top_k needs k and custom needs a handler."""
+        if self.op == "top_k" and self.k is None:
+            raise ValueError("top_k reduce requires k")
+        if self.op == "custom" and not self.handler:
+            raise ValueError("custom reduce requires handler")
+        return self
+
+
+class StageSpec(BaseModel):
+    """Schema for one stage of a multi-stage job."""
+    name: str = Field(..., min_length=1, description="Stage name, referenced by depends_on")
+    num_tasks: int = Field(..., ge=1, le=10000, description="Number of tasks in the stage")
+    parameters: Optional[Dict[str, Any]] = Field(default=None, description="Merged over the job parameters")
+    depends_on: List[str] = Field(default_factory=list, description="Names of earlier stages this stage waits for")
+    dependency: Literal["all", "one_to_one"] = Field(
+        default="all",
+        description="all: each task waits for every upstream task; one_to_one: task i waits for upstream task i"
+    )
+
+
 class JobCreate(BaseModel):
     """Schema for creating a new job."""
     job_type: str = Field(..., description="Type of job (e.g., 'compute', 'data_processing')")
-    num_tasks: int = Field(..., ge=1, le=10000, description="Number of tasks to create")
+    num_tasks: Optional[int] = Field(default=None, ge=1, le=10000, description="Number of tasks to create (total of the stages for multi-stage jobs)")
     parameters: Optional[Dict[str, Any]] = Field(default=None, description="Job-specific parameters")
+    priority: JobPriority = Field(default=JobPriority.NORMAL, description="Queue priority (HIGH for interactive, LOW for batch)")
+    reduce: Optional[ReduceSpec] = Field(default=None, description="Optional reduce stage, exposed via GET /jobs/{id}/result")
+    stages: Optional[List[StageSpec]] = Field(default=None, description="Stages of a multi-stage job, in dependency order")
+    queue_when_busy: bool = Field(default=True, description="Hold the job PENDING when admission limits are reached (false: reject with 429)")
+    
+    @model_validator(mode='after')
+    def check_stages(self):
+        """Stages must only depend on earlier stages; num_tasks defaults to their total."""
+        if not self.stages:
+            if self.num_tasks is None:
+                raise ValueError("num_tasks is required")
+            return self
+        
+        stages = {}
+        for stage in self.stages:
+            if stage.name in stages:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            for upstream in stage.depends_on:
+                if upstream not in stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown or later stage {upstream}")
+                if stage.dependency == "one_to_one" and stages[upstream].num_tasks != stage.num_tasks:
+                    raise ValueError(f"one_to_one stage {stage.name} must have as many tasks as {upstream}")
+            stages[stage.name] = stage
+        
+        total = sum(stage.num_tasks for stage in self.stages)
+        if total > 10000:
+            raise ValueError("Stages may not have more than 10000 tasks in total")
+        if self.num_tasks is not None and self.num_tasks != total:
+            raise ValueError(f"num_tasks ({self.num_tasks}) does not match the stages' total ({total})")
+        self.num_tasks = total
+        return self
 
 
 class JobResponse(BaseModel):
@@ -22,6 +84,7 @@ class JobResponse(BaseModel):
     id: str
     job_type: str
     status: JobStatus
+    priority: JobPriority = JobPriority.NORMAL
     total_tasks: int
     completed_tasks: int
     failed_tasks: int
@@ -31,6 +94,8 @@ class JobResponse(BaseModel):
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
+    reduce: Optional[ReduceSpec] = None
+    awaiting_admission: bool = False
     
     @classmethod
     def from_orm(cls, obj):
@@ -39,6 +104,7 @@ class JobResponse(BaseModel):
             "id": obj.id,
             "job_type": obj.job_type,
             "status": obj.status.value if hasattr(obj.status, 'value') else obj.status,
+            "priority": obj.priority.value if hasattr(obj.priority, 'value') else (obj.priority or JobPriority.NORMAL),
             "total_tasks": obj.total_tasks,
             "completed_tasks": obj.completed_tasks,
             "failed_tasks": obj.failed_tasks,
@@ -47,6 +113,7 @@ class JobResponse(BaseModel):
             "started_at": obj.started_at,
             "completed_at": obj.completed_at,
             "error_message": obj.error_message,
+            "awaiting_admission": getattr(obj, "admission_request", None) is not None,
         }
         
         # Parse parameters string to dict
@@ -57,6 +124,9 @@ class JobResponse(BaseModel):
             except:
                 data["parameters"] = None
         
+        if getattr(obj, "reduce_spec", None):
+            data["reduce"] = json.loads(obj.reduce_spec)
+        
         return cls(**data)
     
     class Config:
@@ -64,6 +134,26 @@ class JobResponse(BaseModel):
         use_enum_values = True
 
 
+class JobResultResponse(BaseModel):
+    """Schema for the result of a job's reduce stage."""
+    job_id: str
+    status: JobStatus
+    op: str
+    complete: bool = Field(..., description="Whether every task has been folded in")
+    result: Any = None
+    completed_at: Optional[datetime] = None
+
+
+class JobStageResponse(BaseModel):
+    """Schema for a stage of a multi-stage job."""
+    name: str
+    stage_index: int
+    num_tasks: int
+    pending_tasks: int
+    depends_on: list[str]
+    dependency: str
+
+
 class JobListResponse(BaseModel):
     """Schema for paginated job list."""
     jobs: list[JobResponse]
@@ -84,12 +174,18 @@ class TaskResponse(BaseModel):
     max_retries: int
     parameters: Optional[Dict[str, Any]] = None
     result: Optional[Dict[str, Any]] = None
+    result_ref: Optional[str] = None
+    result_digest: Optional[str] = None
+    result_size_bytes: Optional[int] = None
     error_message: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     processing_time_seconds: Optional[float] = None
+    enqueued_at: Optional[datetime] = None
+    received_at: Optional[datetime] = None
+    stage_index: Optional[int] = None
     
     @model_validator(mode='before')
     @classmethod
@@ -100,8 +196,10 @@ class TaskResponse(BaseModel):
             # Convert ORM object to dict
             data_dict = {}
             for key in ['id', 'job_id', 'status', 'task_index', 'retry_count', 'max_retries',
-                       'parameters', 'result', 'error_message', 'created_at', 'updated_at',
-                       'started_at', 'completed_at', 'processing_time_seconds']:
+                       'parameters', 'result', 'result_ref', 'result_digest', 'result_size_bytes',
+                       'error_message', 'created_at', 'updated_at',
+                       'started_at', 'completed_at', 'processing_time_seconds',
+                       'enqueued_at', 'received_at', 'stage_index']:
                 if hasattr(data, key):
                     value = getattr(data, key)
                     # Handle enum
@@ -143,6 +241,13 @@ class TaskCompleteRequest(BaseModel):
     result: Optional[Dict[str, Any]] = None
     processing_time_seconds: Optional[float] = None
     error_message: Optional[str] = None
+    # Set instead of result when the worker offloaded a large result to the result store
+    result_ref: Optional[str] = None
+    result_digest: Optional[str] = None
+    result_size_bytes: Optional[int] = None
+    # Lifecycle timestamps (epoch seconds): from the message, and when the worker received it
+    enqueued_at: Optional[float] = None
+    received_at: Optional[float] = None
 
 
 class TaskListResponse(BaseModel):
@@ -150,3 +255,61 @@ class TaskListResponse(BaseModel):
     tasks: list[TaskResponse]
     total: int
 
+
+# Queue Schemas (database queue backend, consumed by workers over HTTP)
+class QueueReceiveRequest(BaseModel):
+    """Schema for receiving messages from a database-backed queue."""
+    max_messages: int = Field(default=10, ge=1, le=100)
+    wait_time_seconds: int = Field(default=0, ge=0, le=20, description="Long-poll duration")
+    visibility_timeout: Optional[int] = Field(default=None, ge=1, le=43200)
+
+
+class QueueMessageResponse(BaseModel):
+    """Schema for a received queue message."""
+    message_id: str
+    receipt_handle: str
+    body: Dict[str, Any]
+
+
+class QueueReceiveResponse(BaseModel):
+    """Schema for queue receive response."""
+    messages: list[QueueMessageResponse]
+
+
+class QueueAckRequest(BaseModel):
+    """Schema for acknowledging (deleting) a received message."""
+    receipt_handle: str
+
+
+class QueueVisibilityRequest(BaseModel):
+    """Schema for extending a received message's visibility timeout."""
+    receipt_handle: str
+    timeout_seconds: int = Field(..., ge=0, le=43200)
+
+
+class WorkerHeartbeatResponse(BaseModel):
+    """Schema for worker heartbeat response: the live worker membership."""
+    workers: list[str]
+    ttl_seconds: int
+
+
+class QueueDepthResponse(BaseModel):
+    """Schema for one queue's approximate depth."""
+    queue: str
+    visible: int
+    in_flight: int
+    delayed: int
+
+
+class BacklogResponse(BaseModel):
+    """Schema for the queue backlog and the worker count needed to drain it."""
+    queues: list[QueueDepthResponse]
+    queued_tasks: int
+    enqueued_tasks: int
+    running_tasks: int
+    retrying_tasks: int
+    completed_in_window: int
+    throughput_per_second: float
+    avg_task_seconds: float
+    live_workers: int
+    desired_workers: int
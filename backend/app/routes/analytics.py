@@ -3,9 +3,11 @@ API routes for analytics and metrics.
 """
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
+from typing import Optional
 
 from app.db.database import get_db
 from app.services.analytics_service import AnalyticsService
+from app.services.fair_share_service import get_fair_share_dispatcher
 
 router = APIRouter()
 
@@ -65,6 +67,17 @@ async def get_processing_time_stats(
     return service.get_processing_time_stats()
 
 
+@router.get("/task-latency")
+async def get_task_latency(
+    job_type: Optional[str] = Query(None),
+    hours: int = Query(24, ge=1, le=720),
+    db: Session = Depends(get_db)
+):
+    """Get queue-wait, pickup, execution and reporting distributions per job type."""
+    service = AnalyticsService(db)
+    return service.get_task_latency_stats(job_type=job_type, hours=hours)
+
+
 @router.get("/recent-jobs")
 async def get_recent_jobs(
     limit: int = Query(10, ge=1, le=50),
@@ -74,3 +87,9 @@ async def get_recent_jobs(
     service = AnalyticsService(db)
     return service.get_recent_jobs(limit=limit)
 
+
+
+@router.get("/fair-share")
+async def get_fair_share():
+    """Get held and in-flight task counts per fair-share group."""
+    return get_fair_share_dispatcher().snapshot()
@@ -1,15 +1,20 @@
 """
 API routes for job management.
 """
+import json
+from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.db.database import get_db
-from app.models.schemas import JobCreate, JobResponse, JobListResponse
-from app.services.job_service import JobService
+from app.models.schemas import JobCreate, JobResponse, JobListResponse, JobResultResponse, JobStageResponse
+from app.services.admission_service import AdmissionRejectedError
+from app.services.job_service import JobService, JobStateError
+from app.utils.config import get_settings
 
 router = APIRouter()
+settings = get_settings()
 
 
 @router.post("/jobs", response_model=JobResponse, status_code=201)
@@ -22,6 +27,14 @@ async def create_job(
     try:
         job = service.create_job(job_create)
         return JobResponse.from_orm(job)
+    except AdmissionRejectedError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after_seconds)}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -51,6 +64,21 @@ async def list_jobs(
     )
 
 
+@router.get("/jobs/cancelled")
+async def list_cancelled_jobs(
+    since: Optional[datetime] = Query(None, description="Only jobs cancelled at or after this time"),
+    db: Session = Depends(get_db)
+):
+    """List ids of recently cancelled jobs (polled by workers to drop queued work)."""
+    service = JobService(db)
+    # Overlapping refreshes may repeat a job id; the worker keeps a set
+    as_of = datetime.utcnow() - timedelta(seconds=settings.cancelled_jobs_overlap_seconds)
+    return {
+        "job_ids": service.get_cancelled_job_ids(since=since),
+        "as_of": as_of.isoformat(),
+    }
+
+
 @router.get("/jobs/{job_id}", response_model=JobResponse)
 async def get_job(
     job_id: str,
@@ -64,3 +92,69 @@ async def get_job(
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+
+@router.get("/jobs/{job_id}/stages", response_model=list[JobStageResponse])
+async def get_job_stages(
+    job_id: str,
+    db: Session = Depends(get_db)
+):
+    """Get the stages of a multi-stage job with their progress."""
+    service = JobService(db)
+    try:
+        stages = service.get_job_stages(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    names = {stage.stage_index: stage.name for stage in stages}
+    return [
+        JobStageResponse(
+            name=stage.name,
+            stage_index=stage.stage_index,
+            num_tasks=stage.num_tasks,
+            pending_tasks=stage.pending_tasks,
+            depends_on=[names[i] for i in json.loads(stage.depends_on or "[]")],
+            dependency=stage.dependency,
+        )
+        for stage in stages
+    ]
+
+
+@router.get("/jobs/{job_id}/result", response_model=JobResultResponse)
+async def get_job_result(
+    job_id: str,
+    db: Session = Depends(get_db)
+):
+    """Get the result of a job's reduce stage (complete=false while tasks are outstanding)."""
+    service = JobService(db)
+    try:
+        job = service.get_job_result(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except JobStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    spec = json.loads(job.reduce_spec)
+    return JobResultResponse(
+        job_id=job.id,
+        status=job.status,
+        op=spec["op"],
+        complete=job.reduce_completed_at is not None,
+        result=json.loads(job.reduce_result) if job.reduce_result else None,
+        completed_at=job.reduce_completed_at,
+    )
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(
+    job_id: str,
+    db: Session = Depends(get_db)
+):
+    """Cancel a job and its tasks that haven't started yet."""
+    service = JobService(db)
+    try:
+        job = service.cancel_job(job_id)
+        return JobResponse.from_orm(job)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except JobStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -0,0 +1,69 @@
+"""
+API routes for the database-backed task queue (used by workers with QUEUE_BACKEND=http).
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal, get_db, get_engine
+from app.models.schemas import (
+    QueueReceiveRequest, QueueReceiveResponse, QueueAckRequest, QueueVisibilityRequest
+)
+from app.services.queue_backend import DatabaseQueueBackend
+from app.utils.config import get_settings
+
+router = APIRouter()
+settings = get_settings()
+
+
+def require_database_queue() -> None:
+    """Dependency: 404 unless the database queue is the configured backend."""
+    if settings.queue_backend != "database":
+        raise HTTPException(status_code=404, detail="Database queue backend is not enabled")
+
+
+def get_database_queue(
+    db: Session = Depends(get_db),
+    _: None = Depends(require_database_queue)
+) -> DatabaseQueueBackend:
+    """Dependency for the database queue, on the request's session."""
+    return DatabaseQueueBackend(db)
+
+
+# Async, with no request session: the long poll waits on the event loop and
+# each claim uses a short session, so idle receivers hold no thread or connection
+@router.post("/queue/{queue}/receive", response_model=QueueReceiveResponse)
+async def receive_messages(
+    queue: str,
+    receive_request: QueueReceiveRequest,
+    _: None = Depends(require_database_queue)
+):
+    """Receive messages from a queue, hiding them for the visibility timeout."""
+    get_engine()  # Binds SessionLocal on first use
+    messages = await DatabaseQueueBackend.receive_async(
+        SessionLocal,
+        queue,
+        max_messages=receive_request.max_messages,
+        wait_time_seconds=receive_request.wait_time_seconds,
+        visibility_timeout=receive_request.visibility_timeout
+    )
+    return QueueReceiveResponse(messages=messages)
+
+
+@router.post("/queue/{queue}/ack", status_code=204)
+async def ack_message(
+    queue: str,
+    ack_request: QueueAckRequest,
+    backend: DatabaseQueueBackend = Depends(get_database_queue)
+):
+    """Delete a received message."""
+    backend.ack(queue, ack_request.receipt_handle)
+
+
+@router.post("/queue/{queue}/visibility", status_code=204)
+async def extend_visibility(
+    queue: str,
+    visibility_request: QueueVisibilityRequest,
+    backend: DatabaseQueueBackend = Depends(get_database_queue)
+):
+    """Extend a received message's visibility timeout."""
+    backend.extend_visibility(queue, visibility_request.receipt_handle, visibility_request.timeout_seconds)
@@ -1,16 +1,34 @@
 """
 API routes for task management.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.models.schemas import TaskResponse, TaskListResponse, TaskCompleteRequest
+from app.services.result_store import ResultNotFoundError, get_result_store, gunzip_chunks
 from app.services.task_service import TaskService
 
 router = APIRouter()
 
 
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, by name or through "*"."""
+    qualities = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: str,
@@ -19,12 +37,47 @@ async def get_task(
     """Get task by ID."""
     service = TaskService(db)
     try:
-        task = service.get_task(task_id)
+        task = service.get_task(task_id, include_archived=True)
         return task
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
+# Plain (sync) def: opening the store stream is blocking I/O (S3 GetObject)
+@router.get("/tasks/{task_id}/result")
+def get_task_result(
+    task_id: str,
+    accept_encoding: str = Header(default=""),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a task's full result.
+    
+    Offloaded results are streamed from the result store as stored
+    (gzip-compressed JSON, served with ``Content-Encoding: gzip``) to clients
+    that accept gzip, and decompressed on the fly for the rest.
+    """
+    service = TaskService(db)
+    try:
+        task = service.get_task(task_id, include_archived=True)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    if not task.result_ref:
+        return TaskResponse.from_orm(task).result
+    
+    try:
+        chunks = get_result_store().stream(task.result_ref)
+    except ResultNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Result payload for task {task_id} not found")
+    headers = {"X-Result-Digest": task.result_digest or "", "Vary": "Accept-Encoding"}
+    if _accepts_gzip(accept_encoding):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        chunks = gunzip_chunks(chunks)
+    return StreamingResponse(chunks, media_type="application/json", headers=headers)
+
+
 @router.get("/jobs/{job_id}/tasks", response_model=TaskListResponse)
 async def get_job_tasks(
     job_id: str,
@@ -85,7 +138,8 @@ async def mark_task_failed(
         if error_request is None:
             error_request = {}
         error_message = error_request.get("error_message", "Unknown error") if isinstance(error_request, dict) else getattr(error_request, "error_message", "Unknown error")
-        task = service.mark_task_failed(task_id, error_message)
+        attempt = error_request.get("attempt") if isinstance(error_request, dict) else None
+        task = service.mark_task_failed(task_id, error_message, attempt=attempt)
         return TaskResponse.from_orm(task)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
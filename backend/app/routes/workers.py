@@ -0,0 +1,53 @@
+"""
+API routes for worker membership (used to divide queue shards between workers).
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.models.schemas import BacklogResponse, WorkerHeartbeatResponse
+from app.services.backlog_service import BacklogService
+from app.services.worker_service import WorkerService
+from app.utils.config import get_settings
+
+router = APIRouter()
+settings = get_settings()
+
+
+@router.get("/workers/backlog", response_model=BacklogResponse)
+async def get_backlog(db: Session = Depends(get_db)):
+    """
+    Queue backlog and desired worker count.
+    
+    Point KEDA's metrics-api scaler (or an HPA external metric) at
+    ``desired_workers`` with a target value of 1.
+    """
+    service = BacklogService(db)
+    try:
+        return BacklogResponse(**service.get_backlog())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to compute backlog: {str(e)}")
+
+
+@router.post("/workers/{worker_id}/heartbeat", response_model=WorkerHeartbeatResponse)
+async def worker_heartbeat(
+    worker_id: str,
+    db: Session = Depends(get_db)
+):
+    """Record a worker heartbeat and return the live workers."""
+    service = WorkerService(db)
+    try:
+        workers = service.heartbeat(worker_id)
+        return WorkerHeartbeatResponse(workers=workers, ttl_seconds=settings.worker_heartbeat_ttl_seconds)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to record heartbeat: {str(e)}")
+
+
+@router.delete("/workers/{worker_id}", status_code=204)
+async def deregister_worker(
+    worker_id: str,
+    db: Session = Depends(get_db)
+):
+    """Remove a worker from the live set (graceful shutdown)."""
+    service = WorkerService(db)
+    service.deregister(worker_id)
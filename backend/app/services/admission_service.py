@@ -0,0 +1,168 @@
+"""
+Admission control for job submission.
+
+With ``ADMISSION_MAX_OUTSTANDING_TASKS`` (global) or
+``ADMISSION_MAX_OUTSTANDING_TASKS_PER_TYPE`` set, ``JobService.create_job``
+only creates a job's tasks while the unfinished tasks already in the system
+leave room for them. Otherwise the job is stored PENDING with its creation
+request and no tasks, and the ``AdmissionController`` admits held jobs in
+submission order as capacity frees up. Outstanding work stays at what the
+workers can drain, instead of a burst of submissions writing millions of task
+rows and queue messages up front. Callers that opt out of queueing
+(``queue_when_busy: false``) get 429 with Retry-After instead.
+
+Limits are checked without a global lock, so concurrent submissions to
+several API processes can overshoot them by a few jobs.
+"""
+from typing import Dict, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+import structlog
+
+from app.db.models import Job, JobStatus, Task, TaskStatus
+from app.utils.background import PeriodicTask
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+OUTSTANDING_STATUSES = [TaskStatus.PENDING, TaskStatus.ENQUEUED, TaskStatus.RUNNING, TaskStatus.RETRYING]
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a job doesn't fit the admission limits and the caller opted out of queueing."""
+    
+    def __init__(self, message: str, retry_after_seconds: int):
+        super().__init__(message)
+        self.retry_after_seconds = retry_after_seconds
+
+
+class AdmissionController:
+    """Decides whether new jobs may start and admits held jobs as tasks finish."""
+    
+    def __init__(
+        self,
+        max_outstanding_tasks: int = None,
+        max_outstanding_tasks_per_type: Dict[str, int] = None,
+    ):
+        self.max_outstanding_tasks = (
+            max_outstanding_tasks if max_outstanding_tasks is not None
+            else settings.admission_max_outstanding_tasks
+        )
+        self.max_outstanding_tasks_per_type = (
+            max_outstanding_tasks_per_type if max_outstanding_tasks_per_type is not None
+            else settings.admission_max_outstanding_tasks_per_type
+        )
+        self._periodic: Optional[PeriodicTask] = None
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether any limit is configured."""
+        return bool(self.max_outstanding_tasks or self.max_outstanding_tasks_per_type)
+    
+    def outstanding(self, db: Session) -> Tuple[int, Dict[str, int]]:
+        """Unfinished tasks, in total and per job type."""
+        by_type = dict(
+            db.query(Job.job_type, func.count(Task.id))
+            .join(Task, Task.job_id == Job.id)
+            .filter(Task.status.in_(OUTSTANDING_STATUSES))
+            .group_by(Job.job_type)
+            .all()
+        )
+        return sum(by_type.values()), by_type
+    
+    def should_hold(self, db: Session, job_type: str, num_tasks: int) -> bool:
+        """Whether a new job has to wait for admission (it queues behind any job already held)."""
+        if not self.enabled:
+            return False
+        if db.query(Job.id).filter(Job.status == JobStatus.PENDING, Job.admission_request.isnot(None)).first():
+            return True
+        total, by_type = self.outstanding(db)
+        return self._exceeded_limit(job_type, num_tasks, total, by_type) is not None
+    
+    def admit(self, db: Session) -> int:
+        """
+        Admit held jobs in submission order while they fit; returns how many were admitted.
+        
+        A job over its type's limit only holds back later jobs of that type;
+        one over the global limit holds back everything after it, so large
+        jobs aren't starved by a stream of small ones.
+        """
+        from app.services.job_service import JobService
+        
+        held = (
+            db.query(Job)
+            .filter(Job.status == JobStatus.PENDING, Job.admission_request.isnot(None))
+            .order_by(Job.created_at)
+            .all()
+        )
+        if not held:
+            return 0
+        
+        total, by_type = self.outstanding(db)
+        blocked_types = set()
+        admitted = 0
+        for job in held:
+            if job.job_type in blocked_types:
+                continue
+            exceeded = self._exceeded_limit(job.job_type, job.total_tasks, total, by_type)
+            if exceeded == "global":
+                break
+            if exceeded == "type":
+                blocked_types.add(job.job_type)
+                continue
+            if JobService(db).admit_job(job):
+                total += job.total_tasks
+                by_type[job.job_type] = by_type.get(job.job_type, 0) + job.total_tasks
+                admitted += 1
+        
+        if admitted:
+            logger.info("Jobs admitted", admitted=admitted, held=len(held) - admitted, outstanding=total)
+        return admitted
+    
+    def start(self, session_factory) -> None:
+        """Start the admission thread."""
+        def tick():
+            with session_factory() as db:
+                self.admit(db)
+        
+        self._periodic = PeriodicTask("admission-controller", settings.admission_interval_seconds, tick)
+        self._periodic.start()
+        self.wake()
+    
+    def stop(self) -> None:
+        """Stop the admission thread."""
+        if self._periodic:
+            self._periodic.stop()
+            self._periodic = None
+    
+    def wake(self) -> None:
+        """Ask the admission thread to run now (no-op when it isn't running)."""
+        if self._periodic:
+            self._periodic.trigger()
+    
+    def _exceeded_limit(self, job_type: str, num_tasks: int, total: int, by_type: Dict[str, int]) -> Optional[str]:
+        """
+        The limit a job would exceed: "type", "global" or None.
+        
+        A job larger than a limit is let in once nothing it competes with is
+        outstanding, so it can't wait forever.
+        """
+        type_limit = self.max_outstanding_tasks_per_type.get(job_type)
+        type_outstanding = by_type.get(job_type, 0)
+        if type_limit and type_outstanding and type_outstanding + num_tasks > type_limit:
+            return "type"
+        if self.max_outstanding_tasks and total and total + num_tasks > self.max_outstanding_tasks:
+            return "global"
+        return None
+
+
+_controller: AdmissionController = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get or create the process-wide admission controller."""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
@@ -4,13 +4,42 @@ Analytics service for job and task metrics.
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import structlog
 
 from app.db.models import Job, Task, JobStatus, TaskStatus
 
 logger = structlog.get_logger(__name__)
 
+LATENCY_PHASES = ["queue_wait", "pickup", "execution", "reporting"]
+
+
+def _distribution(values: List[float]) -> Dict[str, Any]:
+    """Count, mean, max and nearest-rank percentiles of a list of durations."""
+    if not values:
+        return {
+            "count": 0,
+            "avg_seconds": None,
+            "p50_seconds": None,
+            "p90_seconds": None,
+            "p99_seconds": None,
+            "max_seconds": None,
+        }
+    values = sorted(values)
+    n = len(values)
+    
+    def percentile(p: float) -> float:
+        return round(values[min(n - 1, int(p * n))], 4)
+    
+    return {
+        "count": n,
+        "avg_seconds": round(sum(values) / n, 4),
+        "p50_seconds": percentile(0.50),
+        "p90_seconds": percentile(0.90),
+        "p99_seconds": percentile(0.99),
+        "max_seconds": round(values[-1], 4),
+    }
+
 
 class AnalyticsService:
     """Service for analytics and metrics."""
@@ -174,6 +203,55 @@ class AnalyticsService:
             "median_seconds": None,
         }
     
+    def get_task_latency_stats(self, job_type: Optional[str] = None, hours: int = 24) -> List[Dict[str, Any]]:
+        """
+        Where completed tasks spent their time, per job type.
+        
+        Phases of the last attempt of each task completed in the window:
+        queue_wait (message visible -> worker received it), pickup (received ->
+        marked running), execution (worker-measured processing time) and
+        reporting (end of execution -> completion recorded). queue_wait and
+        pickup compare worker and API clocks, so clock skew shifts time between
+        them; their sum is unaffected.
+        """
+        since = datetime.utcnow() - timedelta(hours=hours)
+        query = (
+            self.db.query(
+                Job.job_type,
+                Task.enqueued_at,
+                Task.received_at,
+                Task.started_at,
+                Task.completed_at,
+                Task.processing_time_seconds,
+            )
+            .join(Job, Task.job_id == Job.id)
+            .filter(Task.status == TaskStatus.COMPLETED, Task.completed_at >= since)
+        )
+        if job_type:
+            query = query.filter(Job.job_type == job_type)
+        
+        phases: Dict[str, Dict[str, List[float]]] = {}
+        for row_type, enqueued_at, received_at, started_at, completed_at, processing_time in query.all():
+            samples = phases.setdefault(row_type, {phase: [] for phase in LATENCY_PHASES})
+            enqueued_at, received_at, started_at, completed_at = (
+                t.replace(tzinfo=None) if t else None
+                for t in (enqueued_at, received_at, started_at, completed_at)
+            )
+            if enqueued_at and received_at:
+                samples["queue_wait"].append(max((received_at - enqueued_at).total_seconds(), 0.0))
+            if received_at and started_at:
+                samples["pickup"].append(max((started_at - received_at).total_seconds(), 0.0))
+            if processing_time is not None:
+                samples["execution"].append(processing_time)
+                if started_at and completed_at:
+                    reporting = (completed_at - started_at).total_seconds() - processing_time
+                    samples["reporting"].append(max(reporting, 0.0))
+        
+        return [
+            {"job_type": row_type, **{phase: _distribution(values) for phase, values in samples.items()}}
+            for row_type, samples in sorted(phases.items())
+        ]
+    
     def get_recent_jobs(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent jobs with basic info."""
         jobs = (
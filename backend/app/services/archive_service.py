@@ -0,0 +1,166 @@
+"""
+Archival of finished jobs' tasks.
+
+The hot ``tasks`` table only has to hold tasks that can still change or are
+recent enough to be queried often. With ``ARCHIVE_ENABLED=true`` the
+``TaskArchiver`` periodically moves the tasks of jobs that finished more
+than ``ARCHIVE_RETENTION_DAYS`` ago into ``tasks_archive`` (INSERT ... SELECT
+and DELETE in one transaction per batch of jobs), so the hot table and its
+indexes stay small enough to live in cache and status counts and analytics
+aggregates scan only recent work.
+
+On Postgres ``tasks_archive`` is range-partitioned by month of completion.
+Partitions are created just before rows for their month are copied, and a
+month that is no longer needed can be detached or dropped as a whole.
+
+Job rows stay, with their counters. Their tasks are still served by
+``GET /jobs/{id}/tasks``, ``GET /tasks/{id}`` and ``GET /tasks/{id}/result``;
+task-level analytics only cover the hot table.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import String, cast, func, insert, select, text
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import Job, JobReducePartial, JobStatus, Task, TaskArchive, TaskDependency
+from app.utils.background import PeriodicTask
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+FINISHED_JOB_STATUSES = [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED]
+
+# Copied as-is; status is cast to text and completed_at is never NULL in the archive
+ARCHIVED_COLUMNS = [
+    "id", "job_id", "task_index", "stage_index", "retry_count", "max_retries",
+    "parameters", "result", "result_ref", "result_digest", "result_size_bytes",
+    "error_message", "created_at", "updated_at", "started_at",
+    "processing_time_seconds", "enqueued_at", "received_at",
+]
+
+
+class ArchiveService:
+    """Service for moving finished jobs' tasks out of the hot table."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def archive_finished_jobs(self, retention_days: float = None, batch_size: int = None) -> int:
+        """Archive one batch of jobs finished before the retention window; returns how many."""
+        retention_days = settings.archive_retention_days if retention_days is None else retention_days
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        job_ids = [
+            job_id for (job_id,) in
+            self.db.query(Job.id)
+            .filter(
+                Job.status.in_(FINISHED_JOB_STATUSES),
+                Job.completed_at < cutoff,
+                Job.archived_at.is_(None),
+            )
+            .order_by(Job.completed_at)
+            .limit(batch_size or settings.archive_batch_jobs)
+            .all()
+        ]
+        if not job_ids:
+            return 0
+        
+        start = time.perf_counter()
+        completed_at = func.coalesce(Task.completed_at, Task.updated_at, Task.created_at)
+        self._ensure_partitions(job_ids, completed_at)
+        
+        self.db.execute(
+            insert(TaskArchive).from_select(
+                ARCHIVED_COLUMNS + ["status", "completed_at"],
+                select(
+                    *[getattr(Task, name) for name in ARCHIVED_COLUMNS],
+                    cast(Task.status, String),
+                    completed_at,
+                ).where(Task.job_id.in_(job_ids))
+            )
+        )
+        job_task_ids = select(Task.id).where(Task.job_id.in_(job_ids))
+        # Edges only connect tasks of the same job
+        self.db.query(TaskDependency).filter(TaskDependency.task_id.in_(job_task_ids)).delete(synchronize_session=False)
+        self.db.query(JobReducePartial).filter(JobReducePartial.job_id.in_(job_ids)).delete(synchronize_session=False)
+        moved = self.db.query(Task).filter(Task.job_id.in_(job_ids)).delete(synchronize_session=False)
+        self.db.query(Job).filter(Job.id.in_(job_ids)).update(
+            {Job.archived_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        self.db.commit()
+        
+        logger.info(
+            "Tasks archived",
+            jobs=len(job_ids),
+            tasks=moved,
+            seconds=round(time.perf_counter() - start, 3)
+        )
+        return len(job_ids)
+    
+    def get_archived_tasks(self, job_id: str) -> List[TaskArchive]:
+        """Archived tasks of a job, in order."""
+        return (
+            self.db.query(TaskArchive)
+            .filter(TaskArchive.job_id == job_id)
+            .order_by(TaskArchive.task_index)
+            .all()
+        )
+    
+    def get_archived_task(self, task_id: str) -> Optional[TaskArchive]:
+        """An archived task by id, if there is one."""
+        return self.db.query(TaskArchive).filter(TaskArchive.id == task_id).first()
+    
+    def _ensure_partitions(self, job_ids: List[str], completed_at) -> None:
+        """Create the monthly archive partitions the jobs' tasks will land in (Postgres only)."""
+        if self.db.get_bind().dialect.name != "postgresql":
+            return
+        
+        month = func.date_trunc("month", func.timezone("UTC", completed_at))
+        months = self.db.query(month).filter(Task.job_id.in_(job_ids)).distinct().all()
+        for (first_day,) in months:
+            next_month = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1)
+            self.db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS tasks_archive_y{first_day:%Y}m{first_day:%m} "
+                f"PARTITION OF tasks_archive "
+                f"FOR VALUES FROM ('{first_day:%Y-%m-%d} 00:00:00+00') TO ('{next_month:%Y-%m-%d} 00:00:00+00')"
+            ))
+
+
+class TaskArchiver:
+    """Runs archival in the background, a batch of jobs at a time."""
+    
+    def __init__(self):
+        self._periodic: Optional[PeriodicTask] = None
+    
+    def start(self, session_factory) -> None:
+        """Start the archiver thread."""
+        def tick():
+            # Work through the whole backlog, committing after every batch
+            while True:
+                with session_factory() as db:
+                    if ArchiveService(db).archive_finished_jobs() < settings.archive_batch_jobs:
+                        return
+        
+        self._periodic = PeriodicTask("task-archiver", settings.archive_interval_seconds, tick)
+        self._periodic.start()
+        self._periodic.trigger()
+    
+    def stop(self) -> None:
+        """Stop the archiver thread."""
+        if self._periodic:
+            self._periodic.stop()
+            self._periodic = None
+
+
+_archiver: TaskArchiver = None
+
+
+def get_task_archiver() -> TaskArchiver:
+    """Get or create the process-wide task archiver."""
+    global _archiver
+    if _archiver is None:
+        _archiver = TaskArchiver()
+    return _archiver
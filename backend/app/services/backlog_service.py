@@ -0,0 +1,145 @@
+"""
+Backlog and desired worker count, for autoscaling workers on queued work.
+
+Combines the queue backend's approximate depth with task counts from the
+database and the recent average task time, and turns them into the number of
+workers needed to work the backlog off within
+``AUTOSCALE_TARGET_DRAIN_SECONDS``. Served as JSON (``GET
+/workers/backlog``, for KEDA's metrics-api scaler) and as Prometheus gauges
+on ``/metrics`` (for an HPA external metric).
+"""
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import REGISTRY, Collector
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import Task, TaskStatus
+from app.services.queue_backend import QueueBackend, get_queue_backend
+from app.services.worker_service import WorkerService
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+
+class BacklogService:
+    """Service for queue backlog and worker sizing."""
+    
+    def __init__(self, db: Session, backend: QueueBackend = None):
+        self.db = db
+        self.backend = backend or get_queue_backend(db)
+    
+    def get_backlog(self) -> Dict[str, Any]:
+        """
+        Current backlog and the worker count it calls for.
+        
+        Queued work is the larger of the queues' visible + delayed messages
+        (approximate, and counting speculative duplicates) and ENQUEUED tasks
+        in the database (which lag sends on non-transactional queues).
+        Workers run one task at a time, so RUNNING tasks keep their workers
+        and queued tasks add ``queued * avg_task_seconds / target`` more,
+        never more than one per queued task.
+        """
+        queues = []
+        for queue in self.backend.queues():
+            try:
+                queues.append({"queue": queue, **self.backend.approximate_depth(queue)})
+            except Exception as e:
+                logger.warning("Failed to read queue depth", queue=queue, error=str(e))
+        
+        counts = dict(
+            self.db.query(Task.status, func.count(Task.id))
+            .filter(Task.status.in_([TaskStatus.ENQUEUED, TaskStatus.RUNNING, TaskStatus.RETRYING]))
+            .group_by(Task.status)
+            .all()
+        )
+        enqueued = counts.get(TaskStatus.ENQUEUED, 0)
+        running = counts.get(TaskStatus.RUNNING, 0)
+        
+        window = settings.autoscale_throughput_window_seconds
+        completed, avg_task_seconds = (
+            self.db.query(func.count(Task.id), func.avg(Task.processing_time_seconds))
+            .filter(
+                Task.status == TaskStatus.COMPLETED,
+                Task.completed_at >= datetime.utcnow() - timedelta(seconds=window),
+            )
+            .one()
+        )
+        avg_task_seconds = float(avg_task_seconds or settings.autoscale_default_task_seconds)
+        
+        queued = max(sum(q["visible"] + q["delayed"] for q in queues), enqueued)
+        queue_workers = min(
+            queued,
+            math.ceil(queued * avg_task_seconds / settings.autoscale_target_drain_seconds)
+        )
+        desired = min(
+            max(running + queue_workers, settings.autoscale_min_workers),
+            settings.autoscale_max_workers
+        )
+        
+        return {
+            "queues": queues,
+            "queued_tasks": queued,
+            "enqueued_tasks": enqueued,
+            "running_tasks": running,
+            "retrying_tasks": counts.get(TaskStatus.RETRYING, 0),
+            "completed_in_window": completed,
+            "throughput_per_second": round(completed / window, 4),
+            "avg_task_seconds": round(avg_task_seconds, 4),
+            "live_workers": len(WorkerService(self.db).live_workers()),
+            "desired_workers": desired,
+        }
+
+
+class BacklogCollector(Collector):
+    """Backlog gauges, computed at scrape time."""
+    
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+    
+    def describe(self) -> Iterator[GaugeMetricFamily]:
+        # Lets the registry learn the metric names without querying at import
+        yield GaugeMetricFamily("orchestrator_queue_messages", "", labels=["queue", "state"])
+        yield GaugeMetricFamily("orchestrator_backlog_tasks", "", labels=["state"])
+        yield GaugeMetricFamily("orchestrator_desired_workers", "")
+    
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        try:
+            with self.session_factory() as db:
+                backlog = BacklogService(db).get_backlog()
+        except Exception as e:
+            logger.warning("Failed to compute backlog metrics", error=str(e))
+            return
+        
+        messages = GaugeMetricFamily(
+            "orchestrator_queue_messages", "Approximate messages per queue", labels=["queue", "state"]
+        )
+        for queue in backlog["queues"]:
+            for state in ("visible", "in_flight", "delayed"):
+                messages.add_metric([queue["queue"], state], queue[state])
+        yield messages
+        
+        tasks = GaugeMetricFamily("orchestrator_backlog_tasks", "Tasks waiting or running", labels=["state"])
+        for state in ("queued", "running", "retrying"):
+            tasks.add_metric([state], backlog[f"{state}_tasks"])
+        yield tasks
+        
+        yield GaugeMetricFamily(
+            "orchestrator_desired_workers", "Workers needed to drain the backlog in time",
+            value=backlog["desired_workers"]
+        )
+
+
+_backlog_collector: BacklogCollector = None
+
+
+def register_backlog_collector(session_factory) -> None:
+    """Expose backlog gauges on /metrics (once per process)."""
+    global _backlog_collector
+    if _backlog_collector is None:
+        _backlog_collector = BacklogCollector(session_factory)
+        REGISTRY.register(_backlog_collector)
@@ -0,0 +1,211 @@
+"""
+Dependency tracking for multi-stage jobs.
+
+Every task of a multi-stage job carries a ``pending_dependencies`` counter
+and stays PENDING (unqueued) until it reaches zero. A finishing task only
+touches its own dependents: one decrement per outgoing ``task_dependencies``
+edge, plus one per task of each ``"all"`` downstream stage when it is the
+last task of its stage to finish. Downstream tasks are enqueued in the same
+request that completes their last input, so stages flow into each other
+without anything polling. A permanently failed task fails everything that
+(transitively) depends on it.
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, List
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import Job, JobStage, Task, TaskDependency, TaskStatus
+from app.models.schemas import StageSpec
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+
+def task_id_for(job_id: str, task_index: int) -> str:
+    """Id of a job's task at the given index."""
+    return f"{job_id}-task-{task_index}"
+
+
+class DependencyService:
+    """Service for stage and task dependencies."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def create_stages(self, job: Job, stages: List[StageSpec], parameters: Dict[str, Any] = None) -> List[Task]:
+        """
+        Create the stages, tasks and dependency edges of a multi-stage job.
+        
+        Returns all tasks; those without dependencies are given the initial
+        queued status and the rest stay PENDING (caller commits and enqueues).
+        """
+        initial_status = TaskStatus.PENDING if settings.fair_share_enabled else TaskStatus.ENQUEUED
+        by_name: Dict[str, JobStage] = {}
+        tasks: List[Task] = []
+        edges: List[TaskDependency] = []
+        first_task_index = 0
+        
+        for stage_index, spec in enumerate(stages):
+            upstream = [by_name[name] for name in spec.depends_on]
+            stage = JobStage(
+                job_id=job.id,
+                stage_index=stage_index,
+                name=spec.name,
+                num_tasks=spec.num_tasks,
+                first_task_index=first_task_index,
+                depends_on=json.dumps([u.stage_index for u in upstream]),
+                dependency=spec.dependency,
+                pending_tasks=spec.num_tasks,
+            )
+            by_name[spec.name] = stage
+            self.db.add(stage)
+            
+            stage_parameters = {**(parameters or {}), **(spec.parameters or {})}
+            for i in range(spec.num_tasks):
+                task_id = task_id_for(job.id, first_task_index + i)
+                task_parameters = dict(stage_parameters)
+                if spec.dependency == "one_to_one" and upstream:
+                    upstream_ids = [task_id_for(job.id, u.first_task_index + i) for u in upstream]
+                    task_parameters["upstream_task_ids"] = upstream_ids
+                    edges.extend(TaskDependency(depends_on_task_id=u, task_id=task_id) for u in upstream_ids)
+                tasks.append(Task(
+                    id=task_id,
+                    job_id=job.id,
+                    status=initial_status if not upstream else TaskStatus.PENDING,
+                    task_index=first_task_index + i,
+                    stage_index=stage_index,
+                    # One per edge (one_to_one) or per upstream stage barrier (all)
+                    pending_dependencies=len(upstream),
+                    parameters=str(task_parameters) if task_parameters else None,
+                ))
+            first_task_index += spec.num_tasks
+        
+        self.db.add_all(tasks)
+        self.db.flush()  # Edges reference the tasks
+        self.db.add_all(edges)
+        return tasks
+    
+    def get_stages(self, job_id: str) -> List[JobStage]:
+        """Stages of a job, in order."""
+        return (
+            self.db.query(JobStage)
+            .filter(JobStage.job_id == job_id)
+            .order_by(JobStage.stage_index)
+            .all()
+        )
+    
+    def task_completed(self, task: Task) -> List[Task]:
+        """
+        Record a completed task; returns the dependents it released (caller commits and enqueues).
+        
+        Dependent rows are locked in id order, so completions racing for the
+        same dependents serialize instead of losing decrements.
+        """
+        if task.stage_index is None:
+            return []
+        
+        stage_done = self._finish_in_stage(task)
+        dependent_ids = [
+            task_id for (task_id,) in
+            self.db.query(TaskDependency.task_id).filter(TaskDependency.depends_on_task_id == task.id)
+        ]
+        filters = [Task.id.in_(dependent_ids)] if dependent_ids else []
+        if stage_done:
+            barrier_stages = self._downstream_stages(task, dependency="all")
+            if barrier_stages:
+                filters.append(Task.stage_index.in_(barrier_stages))
+        
+        released = []
+        for condition in filters:
+            dependents = (
+                self.db.query(Task)
+                .filter(Task.job_id == task.job_id, condition)
+                .order_by(Task.id)
+                .with_for_update()
+                .all()
+            )
+            for dependent in dependents:
+                dependent.pending_dependencies -= 1
+                if dependent.pending_dependencies == 0 and dependent.status == TaskStatus.PENDING:
+                    if not settings.fair_share_enabled:
+                        dependent.status = TaskStatus.ENQUEUED
+                    released.append(dependent)
+        
+        if released:
+            logger.info("Dependent tasks released", job_id=task.job_id, upstream=task.id, count=len(released))
+        return released
+    
+    def task_failed(self, task: Task) -> List[Task]:
+        """
+        Record a permanently failed task and fail everything downstream of it.
+        
+        Returns the tasks failed as a consequence (caller commits and updates
+        the job's counters).
+        """
+        if task.stage_index is None:
+            return []
+        
+        now = datetime.utcnow()
+        failed = []
+        frontier = [task]
+        while frontier:
+            upstream = frontier.pop()
+            self._finish_in_stage(upstream)
+            dependent_ids = [
+                task_id for (task_id,) in
+                self.db.query(TaskDependency.task_id).filter(TaskDependency.depends_on_task_id == upstream.id)
+            ]
+            barrier_stages = self._downstream_stages(upstream, dependency="all")
+            conditions = []
+            if dependent_ids:
+                conditions.append(Task.id.in_(dependent_ids))
+            if barrier_stages:
+                conditions.append(Task.stage_index.in_(barrier_stages))
+            
+            for condition in conditions:
+                dependents = (
+                    self.db.query(Task)
+                    .filter(Task.job_id == task.job_id, condition, Task.status == TaskStatus.PENDING)
+                    .order_by(Task.id)
+                    .with_for_update()
+                    .all()
+                )
+                for dependent in dependents:
+                    dependent.status = TaskStatus.FAILED
+                    dependent.error_message = f"Upstream task {upstream.id} failed"
+                    dependent.completed_at = now
+                    failed.append(dependent)
+                    frontier.append(dependent)
+        
+        if failed:
+            logger.warning("Dependent tasks failed", job_id=task.job_id, upstream=task.id, count=len(failed))
+        return failed
+    
+    def _finish_in_stage(self, task: Task) -> bool:
+        """Count a task as finished in its stage; True for the stage's last task."""
+        stage_filter = (JobStage.job_id == task.job_id, JobStage.stage_index == task.stage_index)
+        self.db.query(JobStage).filter(*stage_filter).update(
+            {JobStage.pending_tasks: JobStage.pending_tasks - 1},
+            synchronize_session=False
+        )
+        remaining = self.db.query(JobStage.pending_tasks).filter(*stage_filter).scalar()
+        return remaining == 0
+    
+    def _downstream_stages(self, task: Task, dependency: str) -> List[int]:
+        """Indexes of the stages that depend on the task's stage with the given dependency kind."""
+        stages = (
+            self.db.query(JobStage.stage_index, JobStage.depends_on)
+            .filter(
+                JobStage.job_id == task.job_id,
+                JobStage.stage_index > task.stage_index,
+                JobStage.dependency == dependency,
+            )
+            .all()
+        )
+        return [
+            stage_index for stage_index, depends_on in stages
+            if task.stage_index in json.loads(depends_on or "[]")
+        ]
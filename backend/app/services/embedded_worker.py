@@ -0,0 +1,151 @@
+"""
+Embedded worker pool for the in-memory queue (``QUEUE_BACKEND=memory``).
+
+Runs the worker's ``TaskProcessor`` (from ``orchestrator_common.execution``,
+shared with the standalone worker) on threads inside the API process and reports through ``TaskService`` directly instead
+of over HTTP, so a dev setup needs neither LocalStack nor a separate worker,
+and benchmarks measure the orchestration paths rather than the transport.
+Messages are kept hidden while their task runs by a heartbeat that extends
+their visibility every third of ``QUEUE_VISIBILITY_TIMEOUT_SECONDS``. Each
+status report uses its own short session, so a long task does not hold a
+pooled connection while its handler runs.
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+import structlog
+from orchestrator_common.execution import PriorityQueueSelector, TaskProcessor
+
+from app.models.schemas import TaskCompleteRequest
+from app.services.queue_backend import get_memory_queue_backend
+from app.services.task_service import OPEN_TASK_STATUSES, TaskService
+from app.utils.background import PeriodicTask
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+
+class EmbeddedWorkerPool:
+    """Threads that consume the in-memory queue and run tasks in-process."""
+    
+    def __init__(self):
+        self._threads: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+        self._session_factory = None
+        self._held: Dict[str, str] = {}  # receipt handle -> queue, while its task runs
+        self._held_lock = threading.Lock()
+        self._heartbeat: Optional[PeriodicTask] = None
+    
+    @property
+    def running(self) -> bool:
+        """Whether any executor thread is alive."""
+        return any(thread.is_alive() for thread in self._threads)
+    
+    def start(self, session_factory, count: Optional[int] = None) -> None:
+        """Start ``count`` executor threads (default: EMBEDDED_WORKER_COUNT)."""
+        if self.running:
+            return
+        self._session_factory = session_factory
+        self._stop_event.clear()
+        count = settings.embedded_worker_count if count is None else count
+        self._threads = [
+            threading.Thread(target=self._run, name=f"embedded-worker-{i}", daemon=True)
+            for i in range(count)
+        ]
+        for thread in self._threads:
+            thread.start()
+        self._heartbeat = PeriodicTask(
+            "embedded-worker-heartbeat", settings.queue_visibility_timeout_seconds / 3, self._extend_held
+        )
+        self._heartbeat.start()
+        logger.info("Embedded workers started", count=count)
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the executor threads after their current task."""
+        if not self._threads:
+            return
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        if self._heartbeat:
+            self._heartbeat.stop()
+            self._heartbeat = None
+        logger.info("Embedded workers stopped")
+    
+    def _run(self) -> None:
+        """Executor loop: receive one message at a time in priority order."""
+        queue = get_memory_queue_backend()
+        selector = PriorityQueueSelector({"HIGH": "HIGH", "NORMAL": "NORMAL", "LOW": "LOW"})
+        processor = TaskProcessor()
+        
+        while not self._stop_event.is_set():
+            order = selector.next_order()
+            for i, (_, queue_name) in enumerate(order):
+                # Only the last queue blocks, as in the standalone worker
+                wait_time = settings.embedded_worker_poll_seconds if i == len(order) - 1 else 0
+                messages = queue.receive(queue_name, max_messages=1, wait_time_seconds=wait_time)
+                if messages:
+                    receipt_handle = messages[0]["receipt_handle"]
+                    with self._held_lock:
+                        self._held[receipt_handle] = queue_name
+                    try:
+                        self._process(processor, messages[0]["body"], received_at=time.time())
+                        queue.ack(queue_name, receipt_handle)
+                    except Exception as e:
+                        # Leave the message to reappear after its visibility timeout
+                        logger.error("Embedded worker failed to report task", error=str(e))
+                    finally:
+                        with self._held_lock:
+                            self._held.pop(receipt_handle, None)
+                    break
+    
+    def _extend_held(self) -> None:
+        """Push out the visibility of messages whose tasks are still running."""
+        queue = get_memory_queue_backend()
+        with self._held_lock:
+            held = list(self._held.items())
+        for receipt_handle, queue_name in held:
+            queue.extend_visibility(queue_name, receipt_handle, settings.queue_visibility_timeout_seconds)
+    
+    def _process(self, processor, body: dict, received_at: float = None) -> None:
+        """Run one task and record the outcome, mirroring ``SQSWorker._process_task``."""
+        task_id = body["task_id"]
+        with self._session_factory() as db:
+            status = TaskService(db).mark_task_running(task_id).status
+        if status not in OPEN_TASK_STATUSES:
+            # Cancelled job, or a duplicate of a task that already finished
+            logger.info("Skipped task", task_id=task_id, status=status.value)
+            return
+        
+        try:
+            result = processor.process_task(
+                task_id, body["job_id"], body["task_index"], body.get("parameters") or {}
+            )
+        except Exception as e:
+            with self._session_factory() as db:
+                TaskService(db).mark_task_failed(task_id, str(e), attempt=body.get("attempt"))
+            return
+        
+        with self._session_factory() as db:
+            TaskService(db).mark_task_complete(
+                task_id,
+                TaskCompleteRequest(
+                    result=result,
+                    processing_time_seconds=result["processing_time_seconds"],
+                    enqueued_at=body.get("enqueued_at"),
+                    received_at=received_at,
+                ),
+            )
+
+
+_pool: EmbeddedWorkerPool = None
+
+
+def get_embedded_worker_pool() -> EmbeddedWorkerPool:
+    """Get or create the process-wide embedded worker pool."""
+    global _pool
+    if _pool is None:
+        _pool = EmbeddedWorkerPool()
+    return _pool
@@ -0,0 +1,286 @@
+"""
+Fair-share dispatching of tasks across job types.
+
+When enabled, ``JobService`` no longer pushes every task straight to SQS.
+Tasks are created as PENDING and handed to the ``FairShareDispatcher``, which
+keeps one sub-queue per group (``job_type``) and releases tasks to the shared
+queue by smooth weighted round robin. Each group is capped at a number of
+in-flight (ENQUEUED/RUNNING/RETRYING) tasks, so one huge submission cannot
+monopolize the workers; capacity is refilled as tasks finish.
+
+Every replica rebuilds its sub-queues from the database on startup (so held
+tasks survive restarts), which means several replicas can hold the same
+task. A dispatch therefore claims the tasks it picked with a conditional
+UPDATE (PENDING -> ENQUEUED) before sending, and only sends the ones it
+won: each task goes out once, and tasks another replica released or a
+cancel reached are dropped from the sub-queues. In-flight counts are read
+from the database on every dispatch. On Postgres the count and the claim
+run under a transaction-scoped advisory lock, so caps hold across API
+replicas; SQLite has no such lock, so run a single API process there.
+Round-robin shares are kept per API process.
+"""
+import ast
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, text, update
+import structlog
+
+from app.db.models import Job, JobStatus, Task, TaskStatus
+from app.services.queue_service import QueueService
+from app.utils.background import PeriodicTask
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+IN_FLIGHT_STATUSES = [TaskStatus.ENQUEUED, TaskStatus.RUNNING, TaskStatus.RETRYING]
+
+# pg_advisory_xact_lock key serializing count-then-claim across API replicas
+DISPATCH_LOCK_KEY = 0x66616972  # "fair"
+
+
+class FairShareDispatcher:
+    """Holds per-group sub-queues and releases tasks by weighted round robin."""
+    
+    def __init__(
+        self,
+        weights: Dict[str, int] = None,
+        max_in_flight_per_group: int = None,
+    ):
+        self.weights = weights if weights is not None else settings.fair_share_weights
+        self.max_in_flight_per_group = (
+            max_in_flight_per_group or settings.fair_share_max_in_flight_per_group
+        )
+        self._queues: Dict[str, deque] = {}
+        self._in_flight: Dict[str, int] = {}  # As counted by the last dispatch
+        self._current: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._periodic: Optional[PeriodicTask] = None
+    
+    def weight_for(self, group: str) -> int:
+        """Configured share for a group (at least 1, so no group starves)."""
+        return max(int(self.weights.get(group, 1)), 1)
+    
+    def submit(self, group: str, messages: List[Dict[str, Any]]) -> None:
+        """Queue task messages for a group and wake the dispatcher."""
+        with self._lock:
+            self._queues.setdefault(group, deque()).extend(messages)
+            self._in_flight.setdefault(group, 0)
+        logger.info("Tasks held for fair-share dispatch", group=group, count=len(messages))
+        self._wake()
+    
+    def drop_job(self, job_id: str) -> int:
+        """
+        Remove every held message belonging to a job; returns how many were dropped.
+        
+        Only this replica's sub-queues are touched; elsewhere the job's tasks
+        are dropped when their claim finds them CANCELLED.
+        """
+        dropped = 0
+        with self._lock:
+            for group, queue in self._queues.items():
+                kept = deque(m for m in queue if m["job_id"] != job_id)
+                dropped += len(queue) - len(kept)
+                self._queues[group] = kept
+        return dropped
+    
+    def dispatch(self, db: Session) -> int:
+        """Claim and release as many held tasks as the per-group caps allow."""
+        if not self.held_count():
+            return 0
+        self._lock_dispatch(db)
+        batch = self._select_batch(self.count_in_flight(db))
+        if not batch:
+            db.rollback()
+            return 0
+        
+        # Claim first; whatever is no longer PENDING was released elsewhere or cancelled
+        claimed_ids = set(
+            db.execute(
+                update(Task)
+                .where(
+                    Task.id.in_([message["task_id"] for _, message in batch]),
+                    Task.status == TaskStatus.PENDING,
+                )
+                .values(status=TaskStatus.ENQUEUED)
+                .returning(Task.id)
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
+        claimed = [(group, message) for group, message in batch if message["task_id"] in claimed_ids]
+        queue_service = QueueService(db)
+        if not queue_service.transactional:
+            # Commit before sending: a fast consumer must not find the task still PENDING
+            db.commit()
+        
+        sent_ids = set()
+        if claimed:
+            try:
+                sent_ids = set(queue_service.send_tasks([message for _, message in claimed]))
+            except Exception as e:
+                logger.error("Failed to release tasks", count=len(claimed), error=str(e))
+                db.rollback()  # Also undoes the claim when sends join the transaction
+        
+        unsent = [(group, message) for group, message in claimed if message["task_id"] not in sent_ids]
+        if unsent:
+            if not queue_service.transactional:
+                # The claim was committed before sending; hand the tasks back
+                (
+                    db.query(Task)
+                    .filter(
+                        Task.id.in_([message["task_id"] for _, message in unsent]),
+                        Task.status == TaskStatus.ENQUEUED,
+                    )
+                    .update({Task.status: TaskStatus.PENDING}, synchronize_session=False)
+                )
+            # Back at the head of their sub-queues for the next dispatch
+            with self._lock:
+                for group, message in reversed(unsent):
+                    self._queues[group].appendleft(message)
+        db.commit()
+        
+        lost = len(batch) - len(claimed)
+        if sent_ids or lost:
+            logger.info(
+                "Fair-share dispatch",
+                released=len(sent_ids),
+                skipped=lost,
+                held=self.held_count(),
+            )
+        if lost and self.held_count():
+            # Capacity picked for skipped tasks is still free
+            self._wake()
+        return len(sent_ids)
+    
+    def count_in_flight(self, db: Session) -> Dict[str, int]:
+        """In-flight tasks per group, across every API replica and worker."""
+        rows = (
+            db.query(Job.job_type, func.count(Task.id))
+            .join(Task, Task.job_id == Job.id)
+            .filter(Task.status.in_(IN_FLIGHT_STATUSES))
+            .group_by(Job.job_type)
+            .all()
+        )
+        return {group: count for group, count in rows}
+    
+    def load(self, db: Session) -> int:
+        """Rebuild sub-queues from the database."""
+        held = (
+            db.query(Task, Job.job_type, Job.priority)
+            .join(Job, Task.job_id == Job.id)
+            .filter(
+                Task.status == TaskStatus.PENDING,
+                Task.pending_dependencies == 0,  # Blocked stage tasks are submitted when released
+                Job.status.in_([JobStatus.ENQUEUED, JobStatus.RUNNING]),
+            )
+            .order_by(Job.created_at, Task.task_index)
+            .all()
+        )
+        
+        with self._lock:
+            self._queues = {}
+            for task, group, priority in held:
+                parameters = ast.literal_eval(task.parameters) if task.parameters else {}
+                self._queues.setdefault(group, deque()).append({
+                    "task_id": task.id,
+                    "job_id": task.job_id,
+                    "task_index": task.task_index,
+                    "parameters": parameters,
+                    "priority": priority,
+                })
+                self._in_flight.setdefault(group, 0)
+        logger.info("Fair-share queues loaded", held=len(held))
+        return len(held)
+    
+    def held_count(self) -> int:
+        """Total number of tasks waiting in sub-queues."""
+        with self._lock:
+            return sum(len(q) for q in self._queues.values())
+    
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Per-group view of held and in-flight tasks."""
+        with self._lock:
+            return [
+                {
+                    "group": group,
+                    "weight": self.weight_for(group),
+                    "held": len(self._queues.get(group, ())),
+                    "in_flight": self._in_flight.get(group, 0),
+                    "max_in_flight": self.max_in_flight_per_group,
+                }
+                for group in sorted(set(self._queues) | set(self._in_flight))
+            ]
+    
+    def start(self, session_factory) -> None:
+        """Load held tasks and start the dispatcher thread."""
+        with session_factory() as db:
+            self.load(db)
+        
+        def tick():
+            with session_factory() as db:
+                self.dispatch(db)
+        
+        self._periodic = PeriodicTask(
+            "fair-share-dispatcher", settings.fair_share_dispatch_interval_seconds, tick
+        )
+        self._periodic.start()
+        self._wake()
+    
+    def stop(self) -> None:
+        """Stop the dispatcher thread."""
+        if self._periodic:
+            self._periodic.stop()
+            self._periodic = None
+    
+    def _wake(self) -> None:
+        """Ask the dispatcher thread to run now (no-op when it isn't running)."""
+        if self._periodic:
+            self._periodic.trigger()
+    
+    def _lock_dispatch(self, db: Session) -> None:
+        """Hold the dispatch lock until the session's transaction ends (Postgres only)."""
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": DISPATCH_LOCK_KEY})
+    
+    def _select_batch(self, in_flight: Dict[str, int]) -> List[tuple]:
+        """
+        Pick the next tasks to release using smooth weighted round robin.
+        
+        Only groups with held tasks and free in-flight capacity take part in a
+        round, so an idle or capped group's share is redistributed rather than
+        wasted. ``in_flight`` holds fresh counts from the database; the tasks
+        picked here are added to it.
+        """
+        batch = []
+        with self._lock:
+            self._in_flight = in_flight
+            while True:
+                eligible = [
+                    group for group, queue in self._queues.items()
+                    if queue and self._in_flight.get(group, 0) < self.max_in_flight_per_group
+                ]
+                if not eligible:
+                    break
+                total = 0
+                for group in eligible:
+                    weight = self.weight_for(group)
+                    self._current[group] = self._current.get(group, 0) + weight
+                    total += weight
+                chosen = max(eligible, key=lambda g: self._current[g])
+                self._current[chosen] -= total
+                batch.append((chosen, self._queues[chosen].popleft()))
+                self._in_flight[chosen] = self._in_flight.get(chosen, 0) + 1
+        return batch
+
+
+_dispatcher: FairShareDispatcher = None
+
+
+def get_fair_share_dispatcher() -> FairShareDispatcher:
+    """Get or create the process-wide fair-share dispatcher."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = FairShareDispatcher()
+    return _dispatcher
@@ -1,20 +1,31 @@
 """
 Business logic for job management.
 """
+import ast
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import func, or_
 import structlog
 
 from app.db.models import Job, JobStatus, Task, TaskStatus
 from app.models.schemas import JobCreate
+from app.services.admission_service import AdmissionRejectedError, get_admission_controller
+from app.services.dependency_service import DependencyService
+from app.services.reduce_service import ReduceService
 from app.services.step_functions_service import StepFunctionsService
 from app.utils.config import get_settings
 
 logger = structlog.get_logger(__name__)
 settings = get_settings()
 
+# Task statuses that haven't started executing and can be cancelled outright
+CANCELLABLE_TASK_STATUSES = [TaskStatus.PENDING, TaskStatus.ENQUEUED, TaskStatus.RETRYING]
+
+
+class JobStateError(Exception):
+    """Raised when a job is not in a state that allows the requested operation."""
+
 
 class JobService:
     """Service for job operations."""
@@ -24,43 +35,96 @@ class JobService:
         self.step_functions = StepFunctionsService()
     
     def create_job(self, job_create: JobCreate) -> Job:
-        """Create a new job and initiate Step Functions workflow."""
+        """
+        Create a new job and initiate Step Functions workflow.
+        
+        When admission limits are reached the job is stored PENDING without
+        tasks until the admission controller lets it in, or rejected with
+        ``AdmissionRejectedError`` if the caller opted out of queueing.
+        """
+        admission = get_admission_controller()
+        held = admission.should_hold(self.db, job_create.job_type, job_create.num_tasks)
+        if held and not job_create.queue_when_busy:
+            raise AdmissionRejectedError(
+                f"Too many outstanding tasks to admit a {job_create.job_type} job now",
+                settings.admission_retry_after_seconds
+            )
+        
         job_id = str(uuid.uuid4())
         
         job = Job(
             id=job_id,
             job_type=job_create.job_type,
             status=JobStatus.PENDING,
+            priority=job_create.priority,
             total_tasks=job_create.num_tasks,
             completed_tasks=0,
             failed_tasks=0,
             parameters=str(job_create.parameters) if job_create.parameters else None,
+            admission_request=job_create.model_dump_json() if held else None,
         )
         
         self.db.add(job)
+        if job_create.reduce:
+            ReduceService(self.db).create_tree(job, job_create.reduce)
         self.db.commit()
         self.db.refresh(job)
         
-        logger.info("Job created", job_id=job_id, num_tasks=job_create.num_tasks)
+        logger.info("Job created", job_id=job_id, num_tasks=job_create.num_tasks, priority=job.priority.value)
+        
+        if held:
+            logger.info("Job held for admission", job_id=job_id, job_type=job.job_type)
+            admission.wake()
+            return job
         
-        # Start Step Functions workflow (if configured)
-        if settings.step_functions_arn:
+        self._start_job(job, job_create)
+        return job
+    
+    def admit_job(self, job: Job) -> bool:
+        """
+        Create the tasks of a job held by admission control.
+        
+        The job is claimed in the same transaction that creates its tasks;
+        returns False if it was cancelled or another process admitted it first.
+        """
+        job_create = JobCreate.model_validate_json(job.admission_request)
+        claimed = (
+            self.db.query(Job)
+            .filter(Job.id == job.id, Job.status == JobStatus.PENDING, Job.admission_request.isnot(None))
+            .update({Job.admission_request: None}, synchronize_session=False)
+        )
+        if not claimed:
+            self.db.rollback()
+            return False
+        
+        logger.info("Job admitted", job_id=job.id, num_tasks=job.total_tasks)
+        self._start_job(job, job_create)
+        return True
+    
+    def _start_job(self, job: Job, job_create: JobCreate):
+        """Create the job's tasks (or hand them to Step Functions) and enqueue them."""
+        if job_create.stages:
+            # The Step Functions workflow only fans out flat jobs
+            self._create_stage_tasks(job, job_create)
+        elif settings.step_functions_arn:
+            # Start Step Functions workflow (if configured)
             try:
-                self.step_functions.start_execution(job_id, job_create.num_tasks, job_create.parameters)
+                self.step_functions.start_execution(
+                    job.id, job_create.num_tasks, job_create.parameters, priority=job.priority.value
+                )
                 job.status = JobStatus.CREATING_TASKS
                 self.db.commit()
             except Exception as e:
-                logger.error("Failed to start Step Functions", job_id=job_id, error=str(e))
+                logger.error("Failed to start Step Functions", job_id=job.id, error=str(e))
                 # Continue anyway - tasks can be created manually
         else:
             # Local development: create tasks directly
             self._create_tasks_local(job, job_create.num_tasks, job_create.parameters)
-        
-        return job
     
     def _create_tasks_local(self, job: Job, num_tasks: int, parameters: dict):
         """Create tasks locally (for development without Step Functions)."""
-        from app.services.sqs_service import SQSService
+        # With fair-share dispatch, tasks stay PENDING until the dispatcher releases them
+        initial_status = TaskStatus.PENDING if settings.fair_share_enabled else TaskStatus.ENQUEUED
         
         tasks = []
         for i in range(num_tasks):
@@ -68,7 +132,7 @@ class JobService:
             task = Task(
                 id=task_id,
                 job_id=job.id,
-                status=TaskStatus.ENQUEUED,
+                status=initial_status,
                 task_index=i,
                 parameters=str(parameters) if parameters else None,
             )
@@ -76,24 +140,55 @@ class JobService:
         
         self.db.add_all(tasks)
         job.status = JobStatus.ENQUEUED
-        self.db.commit()
+        self.enqueue_tasks(job, tasks, parameters=parameters or {})
         
         logger.info("Tasks created locally", job_id=job.id, num_tasks=num_tasks)
+    
+    def _create_stage_tasks(self, job: Job, job_create: JobCreate):
+        """Create a multi-stage job's tasks and enqueue those of its first stages."""
+        tasks = DependencyService(self.db).create_stages(job, job_create.stages, job_create.parameters)
+        job.status = JobStatus.ENQUEUED
+        self.enqueue_tasks(job, [task for task in tasks if task.pending_dependencies == 0])
         
-        # Enqueue tasks to SQS
-        sqs_service = SQSService()
-        for task in tasks:
-            try:
-                message_body = {
-                    "task_id": task.id,
-                    "job_id": task.job_id,
-                    "task_index": task.task_index,
-                    "parameters": parameters or {}
-                }
-                sqs_service.send_message(message_body)
-                logger.info("Task enqueued to SQS", task_id=task.id)
-            except Exception as e:
-                logger.error("Failed to enqueue task to SQS", task_id=task.id, error=str(e))
+        logger.info("Stage tasks created", job_id=job.id, stages=len(job_create.stages), num_tasks=len(tasks))
+    
+    def enqueue_tasks(self, job: Job, tasks: list[Task], parameters: dict = None):
+        """
+        Commit the session and send the tasks' queue messages.
+        
+        With fair-share dispatch the messages are handed to the dispatcher
+        instead. ``parameters`` is shared by all tasks when given; otherwise each
+        task's stored parameters are sent.
+        """
+        from app.services.queue_service import QueueService
+        from app.services.fair_share_service import get_fair_share_dispatcher
+        
+        messages = [
+            {
+                "task_id": task.id,
+                "job_id": task.job_id,
+                "task_index": task.task_index,
+                "parameters": parameters if parameters is not None else (
+                    ast.literal_eval(task.parameters) if task.parameters else {}
+                ),
+                "priority": job.priority
+            }
+            for task in tasks
+        ]
+        
+        if settings.fair_share_enabled:
+            self.db.commit()
+            get_fair_share_dispatcher().submit(job.job_type, messages)
+            return
+        
+        queue_service = QueueService(self.db)
+        if queue_service.transactional:
+            # Tasks and their queue messages commit (or roll back) together
+            queue_service.send_tasks(messages)
+            self.db.commit()
+        else:
+            self.db.commit()
+            queue_service.send_tasks(messages)
     
     def get_job(self, job_id: str) -> Job:
         """Get job by ID."""
@@ -102,6 +197,18 @@ class JobService:
             raise ValueError(f"Job {job_id} not found")
         return job
     
+    def get_job_stages(self, job_id: str) -> list:
+        """Get the stages of a job (empty for single-stage jobs)."""
+        self.get_job(job_id)
+        return DependencyService(self.db).get_stages(job_id)
+    
+    def get_job_result(self, job_id: str) -> Job:
+        """Get a job whose reduce stage result was requested."""
+        job = self.get_job(job_id)
+        if not job.reduce_spec:
+            raise JobStateError(f"Job {job_id} has no reduce stage")
+        return job
+    
     def list_jobs(self, page: int = 1, page_size: int = 20, search: str = None) -> tuple[list[Job], int]:
         """List jobs with pagination and search."""
         offset = (page - 1) * page_size
@@ -125,6 +232,56 @@ class JobService:
         
         return jobs, total
     
+    def cancel_job(self, job_id: str) -> Job:
+        """
+        Cancel a job and all of its tasks that haven't started yet.
+        
+        Pending/enqueued/retrying tasks are cancelled in a single bulk UPDATE;
+        their SQS messages are dropped by workers, which poll the cancelled
+        job ids. Tasks already running are left to finish.
+        """
+        from app.services.fair_share_service import get_fair_share_dispatcher
+        
+        job = self.get_job(job_id)
+        if job.status == JobStatus.CANCELLED:
+            return job
+        if job.status in [JobStatus.COMPLETED, JobStatus.FAILED]:
+            raise JobStateError(f"Job {job_id} is already {job.status.value}")
+        
+        now = datetime.utcnow()
+        cancelled = (
+            self.db.query(Task)
+            .filter(Task.job_id == job_id, Task.status.in_(CANCELLABLE_TASK_STATUSES))
+            .update(
+                {Task.status: TaskStatus.CANCELLED, Task.completed_at: now, Task.next_retry_at: None},
+                synchronize_session=False
+            )
+        )
+        job.status = JobStatus.CANCELLED
+        job.admission_request = None
+        job.completed_at = now
+        job.updated_at = now
+        if job.reduce_spec and not job.reduce_completed_at:
+            ReduceService(self.db).drop_tree(job)
+        self.db.commit()
+        
+        if settings.fair_share_enabled:
+            get_fair_share_dispatcher().drop_job(job_id)
+        
+        logger.info("Job cancelled", job_id=job_id, cancelled_tasks=cancelled)
+        return job
+    
+    def get_cancelled_job_ids(self, since: datetime = None) -> list[str]:
+        """Get ids of jobs cancelled since the given time (default: last 24 hours)."""
+        if since is None:
+            since = datetime.utcnow() - timedelta(hours=24)
+        rows = (
+            self.db.query(Job.id)
+            .filter(Job.status == JobStatus.CANCELLED, Job.completed_at >= since)
+            .all()
+        )
+        return [row[0] for row in rows]
+    
     def update_job_status(self, job_id: str, status: JobStatus, error_message: str = None):
         """Update job status."""
         job = self.get_job(job_id)
@@ -142,37 +299,45 @@ class JobService:
         self.db.commit()
         logger.info("Job status updated", job_id=job_id, status=status.value)
     
-    def update_task_completion(self, job_id: str):
-        """Update job completion stats based on task statuses."""
-        job = self.get_job(job_id)
+    def update_task_completion(self, job_id: str, completed: int = 0, failed: int = 0):
+        """
+        Add newly finished tasks to a job's counters and advance its status.
         
-        completed = self.db.query(func.count(Task.id)).filter(
-            Task.job_id == job_id,
-            Task.status == TaskStatus.COMPLETED
-        ).scalar()
-        
-        failed = self.db.query(func.count(Task.id)).filter(
-            Task.job_id == job_id,
-            Task.status == TaskStatus.FAILED
-        ).scalar()
-        
-        job.completed_tasks = completed or 0
-        job.failed_tasks = failed or 0
-        
-        # Update job status based on task completion
-        if job.completed_tasks + job.failed_tasks == job.total_tasks:
-            if job.failed_tasks == 0:
-                job.status = JobStatus.COMPLETED
-            else:
-                # Job partially failed - could be configurable
-                job.status = JobStatus.COMPLETED  # Or FAILED if strict
-            job.completed_at = datetime.utcnow()
-        elif job.completed_tasks + job.failed_tasks > 0:
-            job.status = JobStatus.RUNNING
-            if not job.started_at:
-                job.started_at = datetime.utcnow()
+        Counters are incremented in the UPDATE itself rather than recounted and
+        written back, so concurrent completions can't overwrite each other with
+        stale totals. Status changes are conditional UPDATEs as well.
+        """
+        now = datetime.utcnow()
+        jobs = self.db.query(Job).filter(Job.id == job_id)
+        jobs.update(
+            {
+                Job.completed_tasks: func.coalesce(Job.completed_tasks, 0) + completed,
+                Job.failed_tasks: func.coalesce(Job.failed_tasks, 0) + failed,
+            },
+            synchronize_session=False
+        )
         
+        # Cancelled jobs keep their status; stragglers that were already running still report in
+        finished = Job.completed_tasks + Job.failed_tasks >= Job.total_tasks
+        # Partially failed jobs count as COMPLETED too (could be configurable)
+        jobs.filter(
+            Job.status.notin_([JobStatus.CANCELLED, JobStatus.COMPLETED, JobStatus.FAILED]),
+            finished
+        ).update(
+            {Job.status: JobStatus.COMPLETED, Job.completed_at: now},
+            synchronize_session=False
+        )
+        jobs.filter(
+            Job.status.in_([JobStatus.PENDING, JobStatus.CREATING_TASKS, JobStatus.ENQUEUED]),
+            ~finished
+        ).update(
+            {Job.status: JobStatus.RUNNING, Job.started_at: func.coalesce(Job.started_at, now)},
+            synchronize_session=False
+        )
         self.db.commit()
+        
+        job = self.get_job(job_id)
+        self.db.refresh(job)
         logger.info(
             "Job stats updated",
             job_id=job_id,
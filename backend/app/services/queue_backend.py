@@ -0,0 +1,403 @@
+"""
+Pluggable task queue backends.
+
+``QueueBackend`` is the transport interface used by ``QueueService``: send a
+batch (optionally delayed), receive with a visibility timeout, ack, and
+extend visibility. Three implementations ship with the app:
+
+- ``SQSService`` (``app/services/sqs_service.py``) for AWS SQS / LocalStack
+- ``DatabaseQueueBackend`` which stores messages in the ``queue_messages``
+  table and claims them with ``SELECT ... FOR UPDATE SKIP LOCKED``
+- ``MemoryQueueBackend``, an in-process queue for development and
+  benchmarking, consumed by the embedded worker pool
+
+The database backend joins the caller's transaction: messages sent through it
+become visible when the caller commits, so tasks and their messages are
+written atomically.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import JobPriority, QueueMessage
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+
+class QueueBackend(ABC):
+    """Interface every task queue transport implements."""
+    
+    # True when sends join the caller's DB transaction instead of going out immediately
+    transactional = False
+    
+    @abstractmethod
+    def queue_for(self, priority: JobPriority = JobPriority.NORMAL, job_id: str = None) -> str:
+        """Resolve the queue a task of the given priority (and job, for sharding) is routed to."""
+    
+    @abstractmethod
+    def send_batch(
+        self, queue: str, bodies: List[Dict[str, Any]], delay_seconds: int = 0
+    ) -> List[Optional[str]]:
+        """Send message bodies; returns a message id per body (None where the send failed)."""
+    
+    @abstractmethod
+    def receive(
+        self,
+        queue: str,
+        max_messages: int = 10,
+        wait_time_seconds: int = 0,
+        visibility_timeout: int = None,
+    ) -> List[Dict[str, Any]]:
+        """Receive up to ``max_messages`` as dicts with message_id, receipt_handle and body."""
+    
+    @abstractmethod
+    def ack(self, queue: str, receipt_handle: str) -> None:
+        """Delete a received message so it is not delivered again."""
+    
+    @abstractmethod
+    def extend_visibility(self, queue: str, receipt_handle: str, timeout_seconds: int) -> None:
+        """Keep a received message hidden for another ``timeout_seconds``."""
+    
+    @abstractmethod
+    def queues(self) -> List[str]:
+        """Every queue tasks can be routed to (each shard counts as a queue)."""
+    
+    @abstractmethod
+    def approximate_depth(self, queue: str) -> Dict[str, int]:
+        """Message counts of a queue: ``visible``, ``in_flight`` (received, unacked) and ``delayed``."""
+
+
+class DatabaseQueueBackend(QueueBackend):
+    """Queue stored in the application database, claimed with SKIP LOCKED."""
+    
+    transactional = True
+    poll_interval_seconds = 0.2
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def queue_for(self, priority: JobPriority = JobPriority.NORMAL, job_id: str = None) -> str:
+        """One logical queue per priority, named after it."""
+        return JobPriority(priority).value
+    
+    def send_batch(
+        self, queue: str, bodies: List[Dict[str, Any]], delay_seconds: int = 0
+    ) -> List[Optional[str]]:
+        """Add messages to the caller's session; they are visible once it commits."""
+        visible_at = datetime.utcnow() + timedelta(seconds=delay_seconds)
+        messages = [
+            QueueMessage(
+                id=str(uuid.uuid4()),
+                queue=queue,
+                body=json.dumps(body, default=str),
+                visible_at=visible_at,
+                receive_count=0,
+            )
+            for body in bodies
+        ]
+        self.db.add_all(messages)
+        return [message.id for message in messages]
+    
+    def receive(
+        self,
+        queue: str,
+        max_messages: int = 10,
+        wait_time_seconds: int = 0,
+        visibility_timeout: int = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Claim visible messages, emulating long polling up to ``wait_time_seconds``.
+        
+        Concurrent receivers skip rows locked by each other, so each message is
+        handed to exactly one of them until its visibility timeout expires.
+        """
+        visibility_timeout = visibility_timeout or settings.queue_visibility_timeout_seconds
+        deadline = time.time() + wait_time_seconds
+        while True:
+            claimed = self._claim(queue, max_messages, visibility_timeout)
+            if claimed or time.time() >= deadline:
+                return claimed
+            time.sleep(self.poll_interval_seconds)
+    
+    @classmethod
+    async def receive_async(
+        cls,
+        session_factory,
+        queue: str,
+        max_messages: int = 10,
+        wait_time_seconds: int = 0,
+        visibility_timeout: int = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        ``receive`` for the HTTP route: waits on the event loop between claims.
+        
+        Each claim runs on a thread with a session of its own, so a receiver
+        long-polling an empty queue holds neither a threadpool thread nor a
+        pooled connection.
+        """
+        visibility_timeout = visibility_timeout or settings.queue_visibility_timeout_seconds
+        deadline = time.time() + wait_time_seconds
+        while True:
+            claimed = await asyncio.to_thread(
+                cls._claim_in_session, session_factory, queue, max_messages, visibility_timeout
+            )
+            if claimed or time.time() >= deadline:
+                return claimed
+            await asyncio.sleep(cls.poll_interval_seconds)
+    
+    def ack(self, queue: str, receipt_handle: str) -> None:
+        """Delete the message if the receipt handle is still current."""
+        (
+            self.db.query(QueueMessage)
+            .filter(QueueMessage.queue == queue, QueueMessage.receipt_handle == receipt_handle)
+            .delete(synchronize_session=False)
+        )
+        self.db.commit()
+    
+    def extend_visibility(self, queue: str, receipt_handle: str, timeout_seconds: int) -> None:
+        """Push the message's visibility deadline out from now."""
+        (
+            self.db.query(QueueMessage)
+            .filter(QueueMessage.queue == queue, QueueMessage.receipt_handle == receipt_handle)
+            .update(
+                {QueueMessage.visible_at: datetime.utcnow() + timedelta(seconds=timeout_seconds)},
+                synchronize_session=False,
+            )
+        )
+        self.db.commit()
+    
+    def queues(self) -> List[str]:
+        """One queue per priority."""
+        return [priority.value for priority in JobPriority]
+    
+    def approximate_depth(self, queue: str) -> Dict[str, int]:
+        """Count rows by visibility; hidden rows that were never received are delayed sends."""
+        now = datetime.utcnow()
+        rows = (
+            self.db.query(
+                QueueMessage.visible_at <= now,
+                func.coalesce(QueueMessage.receive_count, 0) > 0,
+                func.count(QueueMessage.id),
+            )
+            .filter(QueueMessage.queue == queue)
+            .group_by(QueueMessage.visible_at <= now, func.coalesce(QueueMessage.receive_count, 0) > 0)
+            .all()
+        )
+        depth = {"visible": 0, "in_flight": 0, "delayed": 0}
+        for visible, received, count in rows:
+            key = "visible" if visible else ("in_flight" if received else "delayed")
+            depth[key] += count
+        return depth
+    
+    @classmethod
+    def _claim_in_session(
+        cls, session_factory, queue: str, max_messages: int, visibility_timeout: int
+    ) -> List[Dict[str, Any]]:
+        """One claim attempt in a short session of its own."""
+        with session_factory() as db:
+            return cls(db)._claim(queue, max_messages, visibility_timeout)
+    
+    def _claim(self, queue: str, max_messages: int, visibility_timeout: int) -> List[Dict[str, Any]]:
+        """Lock, hide and return up to ``max_messages`` visible rows in one transaction."""
+        now = datetime.utcnow()
+        rows = (
+            self.db.query(QueueMessage)
+            .filter(QueueMessage.queue == queue, QueueMessage.visible_at <= now)
+            .order_by(QueueMessage.visible_at)
+            .limit(max_messages)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        claimed = []
+        for row in rows:
+            receipt_handle = f"{row.id}:{uuid.uuid4().hex}"
+            # Only if no one re-hid it since the SELECT (SQLite ignores SKIP LOCKED)
+            updated = (
+                self.db.query(QueueMessage)
+                .filter(QueueMessage.id == row.id, QueueMessage.visible_at == row.visible_at)
+                .update(
+                    {
+                        QueueMessage.receipt_handle: receipt_handle,
+                        QueueMessage.visible_at: now + timedelta(seconds=visibility_timeout),
+                        QueueMessage.receive_count: func.coalesce(QueueMessage.receive_count, 0) + 1,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            if updated:
+                claimed.append({
+                    "message_id": row.id,
+                    "receipt_handle": receipt_handle,
+                    "body": json.loads(row.body),
+                })
+        self.db.commit()
+        return claimed
+
+
+class MemoryQueueBackend(QueueBackend):
+    """
+    In-process queue with SQS semantics: delays, visibility timeouts and acks.
+    
+    Each queue is a heap of ``(visible_at, seq, message_id, generation)``
+    entries. Receiving a message bumps its generation and pushes it back with
+    the visibility deadline, so unacked messages reappear on their own; entries
+    whose generation is stale (acked, extended or re-received) are skipped.
+    Messages live only as long as the process.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heaps: Dict[str, list] = defaultdict(list)
+        self._messages: Dict[str, Dict[str, Any]] = {}
+        self._seq = itertools.count()
+    
+    def queue_for(self, priority: JobPriority = JobPriority.NORMAL, job_id: str = None) -> str:
+        """One queue per priority, named after it (as in the database backend)."""
+        return JobPriority(priority).value
+    
+    def send_batch(
+        self, queue: str, bodies: List[Dict[str, Any]], delay_seconds: int = 0
+    ) -> List[Optional[str]]:
+        """Add messages, visible after ``delay_seconds``."""
+        visible_at = time.monotonic() + delay_seconds
+        message_ids = []
+        with self._cond:
+            for body in bodies:
+                message_id = str(uuid.uuid4())
+                self._messages[message_id] = {
+                    "body": body,
+                    "generation": 0,
+                    "receipt_handle": None,
+                    "receive_count": 0,
+                }
+                heapq.heappush(self._heaps[queue], (visible_at, next(self._seq), message_id, 0))
+                message_ids.append(message_id)
+            self._cond.notify_all()
+        return message_ids
+    
+    def receive(
+        self,
+        queue: str,
+        max_messages: int = 10,
+        wait_time_seconds: int = 0,
+        visibility_timeout: int = None,
+    ) -> List[Dict[str, Any]]:
+        """Claim visible messages, blocking up to ``wait_time_seconds`` for one to appear."""
+        visibility_timeout = visibility_timeout or settings.queue_visibility_timeout_seconds
+        deadline = time.monotonic() + wait_time_seconds
+        heap = self._heaps[queue]
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                claimed = []
+                while heap and heap[0][0] <= now and len(claimed) < max_messages:
+                    _, _, message_id, generation = heapq.heappop(heap)
+                    message = self._messages.get(message_id)
+                    if message is None or message["generation"] != generation:
+                        continue
+                    message["generation"] += 1
+                    message["receipt_handle"] = f"{message_id}:{uuid.uuid4().hex}"
+                    message["receive_count"] += 1
+                    heapq.heappush(
+                        heap,
+                        (now + visibility_timeout, next(self._seq), message_id, message["generation"]),
+                    )
+                    claimed.append({
+                        "message_id": message_id,
+                        "receipt_handle": message["receipt_handle"],
+                        "body": message["body"],
+                    })
+                if claimed or now >= deadline:
+                    return claimed
+                # Sleep until the next delayed message is due, a send, or the deadline
+                wake_at = min(heap[0][0], deadline) if heap else deadline
+                self._cond.wait(wake_at - now)
+    
+    def ack(self, queue: str, receipt_handle: str) -> None:
+        """Delete the message if the receipt handle is still current."""
+        message_id = receipt_handle.split(":", 1)[0]
+        with self._cond:
+            message = self._messages.get(message_id)
+            if message is not None and message["receipt_handle"] == receipt_handle:
+                del self._messages[message_id]
+    
+    def extend_visibility(self, queue: str, receipt_handle: str, timeout_seconds: int) -> None:
+        """Push the message's visibility deadline out from now."""
+        message_id = receipt_handle.split(":", 1)[0]
+        with self._cond:
+            message = self._messages.get(message_id)
+            if message is None or message["receipt_handle"] != receipt_handle:
+                return
+            message["generation"] += 1
+            heapq.heappush(
+                self._heaps[queue],
+                (time.monotonic() + timeout_seconds, next(self._seq), message_id, message["generation"]),
+            )
+    
+    def queues(self) -> List[str]:
+        """One queue per priority."""
+        return [priority.value for priority in JobPriority]
+    
+    def approximate_depth(self, queue: str) -> Dict[str, int]:
+        """Count live messages of a queue by visibility."""
+        now = time.monotonic()
+        depth = {"visible": 0, "in_flight": 0, "delayed": 0}
+        with self._cond:
+            for visible_at, _, message_id, generation in self._heaps.get(queue, []):
+                message = self._messages.get(message_id)
+                if message is None or message["generation"] != generation:
+                    continue
+                if visible_at <= now:
+                    depth["visible"] += 1
+                elif message["receipt_handle"]:
+                    depth["in_flight"] += 1
+                else:
+                    depth["delayed"] += 1
+        return depth
+    
+    def depth(self) -> Dict[str, int]:
+        """Messages per queue, including in-flight and delayed ones."""
+        with self._cond:
+            counts = defaultdict(int)
+            for queue, heap in self._heaps.items():
+                for _, _, message_id, generation in heap:
+                    message = self._messages.get(message_id)
+                    if message is not None and message["generation"] == generation:
+                        counts[queue] += 1
+            return dict(counts)
+
+
+_memory_backend: MemoryQueueBackend = None
+
+
+def get_memory_queue_backend() -> MemoryQueueBackend:
+    """Get or create the process-wide in-memory queue."""
+    global _memory_backend
+    if _memory_backend is None:
+        _memory_backend = MemoryQueueBackend()
+    return _memory_backend
+
+
+def get_queue_backend(db: Session) -> QueueBackend:
+    """Build the configured queue backend (``QUEUE_BACKEND=sqs|database|memory``)."""
+    if settings.queue_backend == "database":
+        return DatabaseQueueBackend(db)
+    if settings.queue_backend == "memory":
+        return get_memory_queue_backend()
+    if settings.queue_backend == "sqs":
+        from app.services.sqs_service import SQSService
+        return SQSService()
+    raise ValueError(f"Unknown queue backend: {settings.queue_backend}")
@@ -0,0 +1,102 @@
+"""
+Task queue service: builds task messages and routes them to a queue backend.
+"""
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import JobPriority
+from app.services.queue_backend import QueueBackend, get_queue_backend
+from app.utils.metrics import TASKS_ENQUEUED
+
+logger = structlog.get_logger(__name__)
+
+
+class QueueService:
+    """Service for enqueueing tasks on the configured queue backend."""
+    
+    def __init__(self, db: Session, backend: QueueBackend = None):
+        self.db = db
+        self.backend = backend or get_queue_backend(db)
+    
+    @property
+    def transactional(self) -> bool:
+        """Whether sends only take effect when the caller's session commits."""
+        return self.backend.transactional
+    
+    def send_task(
+        self,
+        task_id: str,
+        job_id: str,
+        task_index: int,
+        parameters: dict = None,
+        delay_seconds: int = 0,
+        priority: JobPriority = JobPriority.NORMAL,
+        attempt: int = 0
+    ) -> str:
+        """
+        Send a single task message, optionally delayed.
+        
+        ``attempt`` is the task's retry_count at send time; workers echo it back
+        when reporting a failure so duplicate deliveries can be told apart.
+        """
+        message = {
+            "task_id": task_id,
+            "job_id": job_id,
+            "task_index": task_index,
+            "parameters": parameters or {},
+            "attempt": attempt,
+            # When the message becomes visible (epoch seconds), for queue-wait tracking
+            "enqueued_at": time.time() + delay_seconds
+        }
+        [message_id] = self.backend.send_batch(
+            self.backend.queue_for(priority, job_id), [message], delay_seconds=delay_seconds
+        )
+        if message_id is None:
+            raise RuntimeError(f"Failed to enqueue task {task_id}")
+        TASKS_ENQUEUED.labels(JobPriority(priority).value).inc()
+        logger.debug("Task enqueued", task_id=task_id, message_id=message_id)
+        return message_id
+    
+    def send_tasks(self, messages: List[Dict[str, Any]]) -> List[str]:
+        """
+        Send task messages in batches, grouped by destination queue.
+        
+        Each message is a dict with task_id, job_id, task_index, parameters and
+        optional priority and attempt. Returns the ids of the tasks that were sent.
+        """
+        start = time.perf_counter()
+        by_queue = defaultdict(list)
+        enqueued_at = time.time()
+        for message in messages:
+            queue = self.backend.queue_for(message.get("priority", JobPriority.NORMAL), message["job_id"])
+            by_queue[queue].append({
+                "task_id": message["task_id"],
+                "job_id": message["job_id"],
+                "task_index": message["task_index"],
+                "parameters": message.get("parameters") or {},
+                "attempt": message.get("attempt", 0),
+                "enqueued_at": enqueued_at
+            })
+        
+        sent = []
+        for queue, bodies in by_queue.items():
+            message_ids = self.backend.send_batch(queue, bodies)
+            sent.extend(body["task_id"] for body, message_id in zip(bodies, message_ids) if message_id)
+        
+        sent_ids = set(sent)
+        for message in messages:
+            if message["task_id"] in sent_ids:
+                TASKS_ENQUEUED.labels(JobPriority(message.get("priority", JobPriority.NORMAL)).value).inc()
+        
+        if len(sent) < len(messages):
+            logger.error("Some tasks failed to enqueue", sent=len(sent), total=len(messages))
+        logger.info(
+            "Tasks enqueued",
+            count=len(sent),
+            queues=len(by_queue),
+            seconds=round(time.perf_counter() - start, 3)
+        )
+        return sent
@@ -0,0 +1,251 @@
+"""
+Reduce stage for jobs: folds task results into one job result as they arrive.
+
+Each job with a reduce stage gets a small tree of partial aggregates
+(``job_reduce_partials``). A finished task is folded into its level-0 bucket
+in the same transaction that marks it finished; a bucket that has seen all of
+its inputs is folded into its parent, and so on up to the root. Every write
+touches at most one row per level and each row has at most ``fan_in``
+writers, so large jobs don't serialize on a single hot row and no step ever
+re-reads all task results.
+
+Operations fold partials in whatever order tasks finish, so ``sum`` and
+custom reducers must be associative and commutative. ``concat`` keeps task
+order by carrying task indexes in its partials.
+"""
+import gzip
+import heapq
+import importlib
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import Job, JobReducePartial, Task
+from app.models.schemas import ReduceSpec, TaskCompleteRequest
+from app.services.result_store import get_result_store
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+
+def _lookup(value: Any, path: Optional[str]) -> Any:
+    """Follow a dotted path through nested dicts; None when any step is missing."""
+    if not path:
+        return value
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def tree_levels(total: int, fan_in: int) -> List[int]:
+    """Bucket count of each reduce-tree level, leaves first, ending with the root."""
+    levels = []
+    n = total
+    while True:
+        n = -(-n // fan_in)
+        levels.append(n)
+        if n == 1:
+            return levels
+
+
+class Reducer:
+    """
+    Folding rules of one reduce operation.
+    
+    Partials are JSON-serializable; ``None`` is the empty partial (failed
+    tasks and tasks without a value contribute nothing).
+    """
+    
+    def lift(self, task_index: int, value: Any) -> Any:
+        """Turn one task's value into a partial."""
+        return value
+    
+    def merge(self, left: Any, right: Any) -> Any:
+        """Combine two non-empty partials."""
+        raise NotImplementedError
+    
+    def finalize(self, partial: Any) -> Any:
+        """Turn the root partial into the job result."""
+        return partial
+    
+    def combine(self, left: Any, right: Any) -> Any:
+        """Merge with ``None`` as identity."""
+        if left is None:
+            return right
+        if right is None:
+            return left
+        return self.merge(left, right)
+
+
+class SumReducer(Reducer):
+    """Sum of numeric values (a list value contributes its sum)."""
+    
+    def lift(self, task_index: int, value: Any) -> Any:
+        values = value if isinstance(value, list) else [value]
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            raise ValueError(f"sum reduce needs numbers, got {value!r}")
+        return sum(values)
+    
+    def merge(self, left: Any, right: Any) -> Any:
+        return left + right
+
+
+class ConcatReducer(Reducer):
+    """Values concatenated in task order (a list value contributes its items)."""
+    
+    def lift(self, task_index: int, value: Any) -> Any:
+        return [[task_index, value if isinstance(value, list) else [value]]]
+    
+    def merge(self, left: Any, right: Any) -> Any:
+        return list(heapq.merge(left, right, key=lambda entry: entry[0]))
+    
+    def finalize(self, partial: Any) -> Any:
+        return [item for _, items in partial or [] for item in items]
+
+
+class TopKReducer(Reducer):
+    """The k largest items, by ``key`` (a list value contributes each of its items)."""
+    
+    def __init__(self, k: int, key: Optional[str]):
+        self.k = k
+        self.key = lambda item: _lookup(item, key)
+    
+    def lift(self, task_index: int, value: Any) -> Any:
+        return self.merge(value if isinstance(value, list) else [value], [])
+    
+    def merge(self, left: Any, right: Any) -> Any:
+        return heapq.nlargest(self.k, left + right, key=self.key)
+
+
+class CustomReducer(Reducer):
+    """A registered ``(left, right) -> merged`` function over values."""
+    
+    def __init__(self, function: Callable[[Any, Any], Any]):
+        self.function = function
+    
+    def merge(self, left: Any, right: Any) -> Any:
+        return self.function(left, right)
+
+
+_custom_reducers: Dict[str, Callable[[Any, Any], Any]] = {}
+
+
+def _custom_reducer(name: str) -> Callable[[Any, Any], Any]:
+    """Import a reducer registered in REDUCE_HANDLERS (clients can only pick by name)."""
+    if name not in _custom_reducers:
+        target = settings.reduce_handlers.get(name)
+        if not target:
+            raise ValueError(f"Unknown reduce handler: {name}")
+        module_name, _, attr = target.partition(":")
+        _custom_reducers[name] = getattr(importlib.import_module(module_name), attr)
+    return _custom_reducers[name]
+
+
+def get_reducer(spec: ReduceSpec) -> Reducer:
+    """Build the reducer for a reduce spec."""
+    if spec.op == "sum":
+        return SumReducer()
+    if spec.op == "concat":
+        return ConcatReducer()
+    if spec.op == "top_k":
+        return TopKReducer(spec.k, spec.key)
+    return CustomReducer(_custom_reducer(spec.handler))
+
+
+class ReduceService:
+    """Service for job reduce stages."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    @staticmethod
+    def spec_for(job: Job) -> Optional[ReduceSpec]:
+        """The job's reduce spec, if it has a reduce stage."""
+        if not job.reduce_spec:
+            return None
+        return ReduceSpec.model_validate_json(job.reduce_spec)
+    
+    def create_tree(self, job: Job, spec: ReduceSpec) -> None:
+        """Attach a reduce stage to a new job (caller commits)."""
+        get_reducer(spec)  # Fail job creation on an unknown custom handler
+        job.reduce_spec = spec.model_dump_json()
+        
+        inputs = job.total_tasks
+        for level, buckets in enumerate(tree_levels(job.total_tasks, spec.fan_in)):
+            self.db.add_all(
+                JobReducePartial(
+                    job_id=job.id,
+                    level=level,
+                    bucket=bucket,
+                    expected=min(spec.fan_in, inputs - bucket * spec.fan_in),
+                    received=0,
+                )
+                for bucket in range(buckets)
+            )
+            inputs = buckets
+    
+    def drop_tree(self, job: Job) -> None:
+        """Delete a job's partials once its reduce can no longer complete (caller commits)."""
+        self.db.query(JobReducePartial).filter(JobReducePartial.job_id == job.id).delete(synchronize_session=False)
+    
+    def task_value(self, spec: ReduceSpec, complete_request: TaskCompleteRequest) -> Any:
+        """Extract the reduced value from a completion, reading offloaded results back from the store."""
+        result = complete_request.result
+        if result is None and complete_request.result_ref:
+            payload = get_result_store().get(complete_request.result_ref)
+            result = json.loads(gzip.decompress(payload))
+        return _lookup(result, spec.field)
+    
+    def add(self, task: Task, spec: ReduceSpec, value: Any = None) -> None:
+        """
+        Fold a finished task into the job's reduce tree (caller commits).
+        
+        Called once per task, in the transaction that moved it to COMPLETED or
+        FAILED; ``value`` is None for failed tasks. Nodes are locked bottom-up,
+        which keeps concurrent completions from deadlocking.
+        """
+        reducer = get_reducer(spec)
+        partial = None
+        if value is not None:
+            try:
+                partial = reducer.lift(task.task_index, value)
+            except (TypeError, ValueError) as e:
+                logger.warning("Task value skipped by reduce", task_id=task.id, op=spec.op, error=str(e))
+        
+        top = len(tree_levels(task.job.total_tasks, spec.fan_in)) - 1
+        level, bucket = 0, task.task_index // spec.fan_in
+        while True:
+            node = (
+                self.db.query(JobReducePartial)
+                .filter(
+                    JobReducePartial.job_id == task.job_id,
+                    JobReducePartial.level == level,
+                    JobReducePartial.bucket == bucket,
+                )
+                .with_for_update()
+                .first()
+            )
+            if node is None:
+                # Tree dropped by a cancel while the task was running
+                return
+            merged = reducer.combine(json.loads(node.value) if node.value else None, partial)
+            node.value = json.dumps(merged, default=str)
+            node.received += 1
+            if node.received < node.expected:
+                return
+            if level == top:
+                break
+            partial = merged
+            level, bucket = level + 1, bucket // spec.fan_in
+        
+        job = task.job
+        job.reduce_result = json.dumps(reducer.finalize(merged), default=str)
+        job.reduce_completed_at = datetime.utcnow()
+        self.db.flush()  # Write the root before the bulk delete removes its row
+        self.drop_tree(job)
+        logger.info("Job reduce completed", job_id=job.id, op=spec.op)
@@ -0,0 +1,139 @@
+"""
+Blob store for large task results.
+
+Workers write results above their inline threshold here (gzip-compressed
+JSON) and report only the key, digest and size, which keeps the tasks table
+and task-list responses small. The API reads the payload back on demand for
+``GET /tasks/{task_id}/result``. ``RESULT_STORE`` selects the implementation
+and must match the workers' setting.
+"""
+import os
+import zlib
+from abc import ABC, abstractmethod
+from typing import Iterator
+from botocore.exceptions import ClientError
+import structlog
+
+from app.utils.aws import get_aws_client
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ResultNotFoundError(Exception):
+    """Raised when a result key has no stored payload."""
+
+
+def gunzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Decompress a gzip stream chunk by chunk (for clients that don't accept gzip)."""
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+class ResultStore(ABC):
+    """Key/value blob storage for offloaded task results."""
+    
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        """Store a payload under key."""
+    
+    @abstractmethod
+    def stream(self, key: str) -> Iterator[bytes]:
+        """Yield a stored payload in chunks; raises ResultNotFoundError if missing."""
+    
+    def get(self, key: str) -> bytes:
+        """Read a whole payload."""
+        return b"".join(self.stream(key))
+
+
+class LocalResultStore(ResultStore):
+    """Results as files under a root directory (shared volume in dev setups)."""
+    
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+    
+    def _path(self, key: str) -> str:
+        """Resolve a key, refusing anything that escapes the root."""
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid result key: {key}")
+        return path
+    
+    def put(self, key: str, data: bytes) -> None:
+        """Write atomically (temp file, then rename)."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    
+    def stream(self, key: str) -> Iterator[bytes]:
+        """Read the file in chunks."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            raise ResultNotFoundError(key)
+        
+        def chunks():
+            with open(path, "rb") as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    yield chunk
+        return chunks()
+
+
+class S3ResultStore(ResultStore):
+    """Results as objects in an S3-compatible bucket."""
+    
+    def __init__(self, bucket: str, prefix: str = ""):
+        self.bucket = bucket
+        self.prefix = prefix
+    
+    @property
+    def client(self):
+        """The shared S3 client (looked up per call: clients are closed and rebuilt across app restarts)."""
+        return get_aws_client(
+            's3',
+            region_name=settings.aws_region or 'us-east-1',
+            aws_access_key_id=settings.aws_access_key_id or None,
+            aws_secret_access_key=settings.aws_secret_access_key or None,
+            endpoint_url=settings.result_store_endpoint_url or None
+        )
+    
+    def put(self, key: str, data: bytes) -> None:
+        """Upload the payload as one object."""
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+    
+    def stream(self, key: str) -> Iterator[bytes]:
+        """Stream the object body in chunks."""
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise ResultNotFoundError(key)
+            raise
+        return response["Body"].iter_chunks(CHUNK_SIZE)
+
+
+_store: ResultStore = None
+
+
+def get_result_store() -> ResultStore:
+    """Get or create the process-wide result store (``RESULT_STORE=local|s3``)."""
+    global _store
+    if _store is None:
+        if settings.result_store == "s3":
+            _store = S3ResultStore(settings.result_store_bucket, settings.result_store_prefix)
+        elif settings.result_store == "local":
+            _store = LocalResultStore(settings.result_store_path)
+        else:
+            raise ValueError(f"Unknown result store: {settings.result_store}")
+    return _store
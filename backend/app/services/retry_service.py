@@ -0,0 +1,178 @@
+"""
+Retry scheduling for failed tasks.
+
+Tasks that fail below ``max_retries`` are moved to RETRYING and handed to the
+``RetryScheduler``, which re-enqueues them after an exponential backoff with
+full jitter. Delays that fit within SQS's ``DelaySeconds`` limit are delegated
+to SQS directly; longer ones stay RETRYING with ``next_retry_at`` in the
+database, which every API replica polls for tasks whose remaining delay now
+fits. Each send is preceded by a conditional UPDATE that claims the task, so
+only one replica re-enqueues it.
+"""
+import ast
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import Task, TaskStatus
+from app.utils.background import PeriodicTask
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+# SQS rejects per-message delays above 15 minutes
+SQS_MAX_DELAY_SECONDS = 900
+
+# RETRYING tasks re-enqueued per scheduler tick
+RETRY_BATCH_SIZE = 500
+
+
+class RetryScheduler:
+    """Re-enqueues RETRYING tasks with exponential backoff and jitter."""
+    
+    def __init__(
+        self,
+        base_delay_seconds: float = None,
+        max_delay_seconds: float = None,
+    ):
+        self.base_delay_seconds = base_delay_seconds or settings.retry_base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds or settings.retry_max_delay_seconds
+        self._periodic: Optional[PeriodicTask] = None
+    
+    def compute_delay(self, retry_count: int) -> float:
+        """
+        Backoff for the given retry attempt using "full jitter".
+        
+        The delay is drawn uniformly from ``[0, min(max, base * 2^(n-1))]`` so that
+        tasks failing together (e.g. a downstream outage) spread their retries
+        across the whole window instead of arriving in synchronized waves.
+        """
+        exponent = max(retry_count - 1, 0)
+        ceiling = min(self.max_delay_seconds, self.base_delay_seconds * (2 ** exponent))
+        return random.uniform(0, ceiling)
+    
+    def schedule(self, db: Session, task: Task) -> None:
+        """Compute the next attempt time for a RETRYING task and dispatch it if the delay fits."""
+        delay = self.compute_delay(task.retry_count)
+        task.next_retry_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.commit()
+        
+        if delay <= SQS_MAX_DELAY_SECONDS:
+            self._enqueue(db, task, delay)
+        else:
+            logger.info("Task retry deferred", task_id=task.id, delay_seconds=round(delay, 2))
+    
+    def run_due(self, db: Session) -> int:
+        """Enqueue RETRYING tasks whose remaining delay now fits in SQS; returns how many were sent."""
+        horizon = datetime.utcnow() + timedelta(seconds=SQS_MAX_DELAY_SECONDS)
+        tasks = (
+            db.query(Task)
+            .filter(
+                Task.status == TaskStatus.RETRYING,
+                or_(Task.next_retry_at <= horizon, Task.next_retry_at.is_(None)),
+            )
+            .order_by(Task.next_retry_at)
+            .limit(RETRY_BATCH_SIZE)
+            .all()
+        )
+        now = datetime.utcnow()
+        sent = 0
+        for task in tasks:
+            remaining = ((task.next_retry_at or now) - now).total_seconds()
+            sent += self._enqueue(db, task, max(remaining, 0))
+        return sent
+    
+    def start(self, session_factory) -> None:
+        """Start the periodic dispatcher thread."""
+        def tick():
+            with session_factory() as db:
+                self.run_due(db)
+        
+        self._periodic = PeriodicTask(
+            "retry-scheduler", settings.retry_scheduler_interval_seconds, tick
+        )
+        self._periodic.start()
+        self._periodic.trigger()  # Pick up retries left by a previous run right away
+    
+    def stop(self) -> None:
+        """Stop the periodic dispatcher thread."""
+        if self._periodic:
+            self._periodic.stop()
+            self._periodic = None
+    
+    def _enqueue(self, db: Session, task: Task, delay_seconds: float) -> bool:
+        """
+        Claim a RETRYING task as ENQUEUED and send it back to the queue with the given delay.
+        
+        Returns False without sending when another scheduler (or a cancel)
+        changed the task first.
+        """
+        from app.services.queue_service import QueueService
+        
+        parameters = {}
+        if task.parameters:
+            try:
+                parameters = ast.literal_eval(task.parameters)
+            except (ValueError, SyntaxError):
+                parameters = {}
+        
+        queue_service = QueueService(db)
+        claimed = (
+            db.query(Task)
+            .filter(Task.id == task.id, Task.status == TaskStatus.RETRYING)
+            .update(
+                {Task.status: TaskStatus.ENQUEUED, Task.next_retry_at: None},
+                synchronize_session=False
+            )
+        )
+        if claimed != 1:
+            db.rollback()
+            return False
+        if not queue_service.transactional:
+            # Commit before sending: a fast consumer must not find the task still RETRYING
+            db.commit()
+        
+        try:
+            queue_service.send_task(
+                task_id=task.id,
+                job_id=task.job_id,
+                task_index=task.task_index,
+                parameters=parameters,
+                delay_seconds=min(int(round(delay_seconds)), SQS_MAX_DELAY_SECONDS),
+                priority=task.job.priority,
+                attempt=task.retry_count,
+            )
+        except Exception as e:
+            # Back to RETRYING and try again on the next tick
+            logger.error("Failed to re-enqueue task", task_id=task.id, error=str(e))
+            db.rollback()
+            db.query(Task).filter(Task.id == task.id, Task.status == TaskStatus.ENQUEUED).update(
+                {Task.status: TaskStatus.RETRYING, Task.next_retry_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+            return False
+        
+        db.commit()
+        logger.info(
+            "Task re-enqueued for retry",
+            task_id=task.id,
+            retry_count=task.retry_count,
+            delay_seconds=round(delay_seconds, 2),
+        )
+        return True
+
+
+_retry_scheduler: RetryScheduler = None
+
+
+def get_retry_scheduler() -> RetryScheduler:
+    """Get or create the process-wide retry scheduler."""
+    global _retry_scheduler
+    if _retry_scheduler is None:
+        _retry_scheduler = RetryScheduler()
+    return _retry_scheduler
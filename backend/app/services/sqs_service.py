@@ -1,18 +1,35 @@
 """
 Service for AWS SQS integration.
 """
+import itertools
 import json
-import boto3
+import zlib
 from botocore.exceptions import ClientError
 import structlog
+from typing import Any, Dict, List, Optional
+from app.db.models import JobPriority
+from app.services.queue_backend import QueueBackend
+from app.utils.aws import get_aws_client
 from app.utils.config import get_settings
+from app.utils.metrics import SQS_BATCH_SIZE, SQS_REQUEST_DURATION
 
 logger = structlog.get_logger(__name__)
 settings = get_settings()
 
+# SendMessageBatch accepts at most 10 entries per call
+SQS_MAX_BATCH_SIZE = 10
 
-class SQSService:
-    """Service for SQS operations."""
+# Shared across SQSService instances so round robin keeps rotating between requests
+_shard_counter = itertools.count()
+
+
+def shard_queue_url(queue_url: str, shard: int) -> str:
+    """URL of one shard of a sharded queue (workers derive the same names)."""
+    return f"{queue_url}-{shard}"
+
+
+class SQSService(QueueBackend):
+    """SQS implementation of the queue backend."""
     
     def __init__(self):
         # Determine endpoint URL for LocalStack
@@ -24,7 +41,7 @@ class SQSService:
             parts = queue_url.split('/')
             endpoint_url = '/'.join(parts[:3])  # http://host:port
         
-        self.client = boto3.client(
+        self.client = get_aws_client(
             'sqs',
             region_name=settings.aws_region or 'us-east-1',
             aws_access_key_id=settings.aws_access_key_id or 'test',
@@ -32,78 +49,151 @@ class SQSService:
             endpoint_url=endpoint_url
         )
         self.queue_url = queue_url
-    
-    def send_task(self, task_id: str, job_id: str, task_index: int, parameters: dict = None):
-        """Send a task message to SQS."""
-        message = {
-            "task_id": task_id,
-            "job_id": job_id,
-            "task_index": task_index,
-            "parameters": parameters or {}
+        self.priority_queue_urls = {
+            JobPriority.HIGH: settings.sqs_high_priority_queue_url or queue_url,
+            JobPriority.NORMAL: queue_url,
+            JobPriority.LOW: settings.sqs_low_priority_queue_url or queue_url,
         }
+    
+    def queue_for(self, priority: JobPriority = JobPriority.NORMAL, job_id: str = None) -> str:
+        """
+        Resolve the queue URL a task is routed to.
         
-        try:
-            response = self.client.send_message(
-                QueueUrl=self.queue_url,
-                MessageBody=json.dumps(message)
-            )
-            logger.info("Task sent to SQS", task_id=task_id, message_id=response.get('MessageId'))
-            return response
-        except ClientError as e:
-            logger.error("Failed to send task to SQS", error=str(e))
-            raise
+        With SQS_SHARD_COUNT > 1 the priority queue is split into shards. The
+        "hash" strategy keeps a job's tasks on one shard (crc32 of job_id, stable
+        across processes); "round_robin" spreads them over all shards.
+        """
+        queue_url = self.priority_queue_urls.get(JobPriority(priority), self.queue_url)
+        shard_count = settings.sqs_shard_count
+        if shard_count <= 1:
+            return queue_url
+        if settings.sqs_shard_strategy == "hash" and job_id:
+            shard = zlib.crc32(job_id.encode()) % shard_count
+        else:
+            shard = next(_shard_counter) % shard_count
+        return shard_queue_url(queue_url, shard)
     
-    def send_message(self, message_body: dict):
-        """Send a message to SQS (alias for send_task with dict)."""
-        return self.send_task(
-            task_id=message_body['task_id'],
-            job_id=message_body['job_id'],
-            task_index=message_body['task_index'],
-            parameters=message_body.get('parameters', {})
-        )
+    def queues(self) -> List[str]:
+        """The distinct priority queue URLs, expanded to their shards."""
+        urls = list(dict.fromkeys(self.priority_queue_urls.values()))
+        if settings.sqs_shard_count <= 1:
+            return urls
+        return [shard_queue_url(url, shard) for url in urls for shard in range(settings.sqs_shard_count)]
     
-    def receive_tasks(self, max_messages: int = 10, wait_time_seconds: int = 20):
-        """Receive tasks from SQS queue."""
-        try:
-            response = self.client.receive_message(
-                QueueUrl=self.queue_url,
-                MaxNumberOfMessages=max_messages,
-                WaitTimeSeconds=wait_time_seconds,
-                MessageAttributeNames=['All']
+    def approximate_depth(self, queue: str) -> Dict[str, int]:
+        """SQS's approximate message counts (lag by up to a minute)."""
+        with SQS_REQUEST_DURATION.labels("get_attributes").time():
+            response = self.client.get_queue_attributes(
+                QueueUrl=queue,
+                AttributeNames=[
+                    'ApproximateNumberOfMessages',
+                    'ApproximateNumberOfMessagesNotVisible',
+                    'ApproximateNumberOfMessagesDelayed',
+                ]
             )
+        attributes = response.get('Attributes', {})
+        return {
+            "visible": int(attributes.get('ApproximateNumberOfMessages', 0)),
+            "in_flight": int(attributes.get('ApproximateNumberOfMessagesNotVisible', 0)),
+            "delayed": int(attributes.get('ApproximateNumberOfMessagesDelayed', 0)),
+        }
+    
+    def send_batch(
+        self,
+        queue: str,
+        bodies: List[Dict[str, Any]],
+        delay_seconds: int = 0
+    ) -> List[Optional[str]]:
+        """Send messages with SendMessageBatch, 10 per call, optionally delayed (max 900 seconds)."""
+        message_ids: List[Optional[str]] = [None] * len(bodies)
+        for start in range(0, len(bodies), SQS_MAX_BATCH_SIZE):
+            chunk = bodies[start:start + SQS_MAX_BATCH_SIZE]
+            entries = [
+                {
+                    'Id': str(start + i),
+                    'MessageBody': json.dumps(body, default=str),
+                    'DelaySeconds': delay_seconds
+                }
+                for i, body in enumerate(chunk)
+            ]
+            SQS_BATCH_SIZE.labels("send").observe(len(entries))
+            try:
+                with SQS_REQUEST_DURATION.labels("send").time():
+                    response = self.client.send_message_batch(QueueUrl=queue, Entries=entries)
+            except ClientError as e:
+                logger.error("Failed to send message batch to SQS", error=str(e), size=len(entries))
+                continue
             
-            messages = response.get('Messages', [])
-            tasks = []
-            
-            for msg in messages:
-                try:
-                    body = json.loads(msg['Body'])
-                    tasks.append({
-                        'receipt_handle': msg['ReceiptHandle'],
-                        'message_id': msg['MessageId'],
-                        'task_id': body['task_id'],
-                        'job_id': body['job_id'],
-                        'task_index': body['task_index'],
-                        'parameters': body.get('parameters', {})
-                    })
-                except (json.JSONDecodeError, KeyError) as e:
-                    logger.error("Failed to parse SQS message", error=str(e))
-                    continue
-            
-            return tasks
+            for success in response.get('Successful', []):
+                message_ids[int(success['Id'])] = success['MessageId']
+            for failure in response.get('Failed', []):
+                logger.error(
+                    "SQS rejected message",
+                    entry=failure['Id'],
+                    code=failure.get('Code'),
+                    error=failure.get('Message')
+                )
+        return message_ids
+    
+    def receive(
+        self,
+        queue: str,
+        max_messages: int = 10,
+        wait_time_seconds: int = 0,
+        visibility_timeout: int = None
+    ) -> List[Dict[str, Any]]:
+        """Receive messages from an SQS queue."""
+        params = {
+            'QueueUrl': queue,
+            'MaxNumberOfMessages': max_messages,
+            'WaitTimeSeconds': wait_time_seconds,
+            'MessageAttributeNames': ['All']
+        }
+        if visibility_timeout:
+            params['VisibilityTimeout'] = visibility_timeout
+        
+        try:
+            with SQS_REQUEST_DURATION.labels("receive").time():
+                response = self.client.receive_message(**params)
         except ClientError as e:
             logger.error("Failed to receive messages from SQS", error=str(e))
             return []
+        SQS_BATCH_SIZE.labels("receive").observe(len(response.get('Messages', [])))
+        
+        messages = []
+        for msg in response.get('Messages', []):
+            try:
+                messages.append({
+                    'message_id': msg['MessageId'],
+                    'receipt_handle': msg['ReceiptHandle'],
+                    'body': json.loads(msg['Body'])
+                })
+            except (json.JSONDecodeError, KeyError) as e:
+                logger.error("Failed to parse SQS message", error=str(e))
+        return messages
     
-    def delete_message(self, receipt_handle: str):
+    def ack(self, queue: str, receipt_handle: str) -> None:
         """Delete a message from SQS after processing."""
         try:
-            self.client.delete_message(
-                QueueUrl=self.queue_url,
-                ReceiptHandle=receipt_handle
-            )
+            with SQS_REQUEST_DURATION.labels("delete").time():
+                self.client.delete_message(
+                    QueueUrl=queue,
+                    ReceiptHandle=receipt_handle
+                )
             logger.debug("Message deleted from SQS", receipt_handle=receipt_handle[:20])
         except ClientError as e:
             logger.error("Failed to delete message from SQS", error=str(e))
             raise
-
+    
+    def extend_visibility(self, queue: str, receipt_handle: str, timeout_seconds: int) -> None:
+        """Change a received message's visibility timeout."""
+        try:
+            with SQS_REQUEST_DURATION.labels("change_visibility").time():
+                self.client.change_message_visibility(
+                    QueueUrl=queue,
+                    ReceiptHandle=receipt_handle,
+                    VisibilityTimeout=timeout_seconds
+                )
+        except ClientError as e:
+            logger.error("Failed to extend message visibility", error=str(e))
+            raise
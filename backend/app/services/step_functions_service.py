@@ -2,9 +2,9 @@
 Service for AWS Step Functions integration.
 """
 import json
-import boto3
 from botocore.exceptions import ClientError
 import structlog
+from app.utils.aws import get_aws_client
 from app.utils.config import get_settings
 
 logger = structlog.get_logger(__name__)
@@ -15,18 +15,16 @@ class StepFunctionsService:
     """Service for Step Functions operations."""
     
     def __init__(self):
+        self.client = None
         if settings.step_functions_arn:
-            self.client = boto3.client(
+            self.client = get_aws_client(
                 'stepfunctions',
                 region_name=settings.aws_region,
                 aws_access_key_id=settings.aws_access_key_id or None,
                 aws_secret_access_key=settings.aws_secret_access_key or None,
             )
-        else:
-            self.client = None
-            logger.info("Step Functions not configured, using local mode")
     
-    def start_execution(self, job_id: str, num_tasks: int, parameters: dict = None):
+    def start_execution(self, job_id: str, num_tasks: int, parameters: dict = None, priority: str = "NORMAL"):
         """Start a Step Functions execution for a job."""
         if not self.client:
             logger.warning("Step Functions client not available")
@@ -35,7 +33,8 @@ class StepFunctionsService:
         input_data = {
             "job_id": job_id,
             "num_tasks": num_tasks,
-            "parameters": parameters or {}
+            "parameters": parameters or {},
+            "priority": priority
         }
         
         try:
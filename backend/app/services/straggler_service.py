@@ -0,0 +1,181 @@
+"""
+Speculative re-execution of straggler tasks.
+
+Near the end of a job its wall-clock time is set by the slowest few tasks,
+often ones stuck on a slow or overloaded pod. The ``StragglerDetector``
+periodically looks at running jobs that are nearly done, derives a cut-off
+from the job's own ``processing_time_seconds`` distribution, and enqueues one
+duplicate of every RUNNING task that has exceeded it. Each duplicate is
+claimed first by setting ``speculated_at`` with a conditional UPDATE, so only
+one API replica sends it. Whichever copy reports first wins;
+``TaskService.mark_task_complete`` makes the completion idempotent.
+"""
+import ast
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import Job, JobStatus, Task, TaskStatus
+from app.services.queue_service import QueueService
+from app.utils.background import PeriodicTask
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+
+def _quantile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank quantile of an already sorted list."""
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class StragglerDetector:
+    """Finds tasks running far longer than their siblings and speculates on them."""
+    
+    def __init__(self):
+        self._periodic: Optional[PeriodicTask] = None
+    
+    def straggler_threshold(self, processing_times: list[float]) -> Optional[float]:
+        """
+        Runtime after which a task of this job counts as a straggler.
+        
+        ``multiplier * median``, but never below the job's p90 or the configured
+        minimum, so naturally long-tailed jobs don't speculate on every task.
+        Returns None until enough tasks have completed to trust the estimate.
+        """
+        if len(processing_times) < settings.speculation_min_samples:
+            return None
+        times = sorted(processing_times)
+        return max(
+            settings.speculation_multiplier * _quantile(times, 0.5),
+            _quantile(times, 0.9),
+            settings.speculation_min_runtime_seconds,
+        )
+    
+    def detect(self, db: Session) -> int:
+        """Enqueue speculative copies for stragglers of nearly finished jobs."""
+        jobs = (
+            db.query(Job)
+            .filter(
+                Job.status == JobStatus.RUNNING,
+                Job.total_tasks > 0,
+                (Job.completed_tasks + Job.failed_tasks)
+                >= Job.total_tasks * settings.speculation_min_progress,
+            )
+            .all()
+        )
+        
+        speculated = 0
+        for job in jobs:
+            speculated += self._speculate_job(db, job)
+        return speculated
+    
+    def _speculate_job(self, db: Session, job: Job) -> int:
+        """Check one job's RUNNING tasks against its completion-time distribution."""
+        processing_times = [
+            row[0]
+            for row in db.query(Task.processing_time_seconds)
+            .filter(
+                Task.job_id == job.id,
+                Task.status == TaskStatus.COMPLETED,
+                Task.processing_time_seconds.isnot(None),
+            )
+            .all()
+        ]
+        threshold = self.straggler_threshold(processing_times)
+        if threshold is None:
+            return 0
+        
+        cutoff = datetime.utcnow() - timedelta(seconds=threshold)
+        stragglers = (
+            db.query(Task)
+            .filter(
+                Task.job_id == job.id,
+                Task.status == TaskStatus.RUNNING,
+                Task.speculated_at.is_(None),
+                Task.started_at < cutoff,
+            )
+            .all()
+        )
+        
+        queue_service = QueueService(db)
+        speculated = 0
+        for task in stragglers:
+            task_id = task.id
+            parameters = ast.literal_eval(task.parameters) if task.parameters else {}
+            claimed_at = datetime.utcnow()
+            # Claim first: every replica runs the detector, only one may speculate
+            claimed = (
+                db.query(Task)
+                .filter(
+                    Task.id == task_id,
+                    Task.status == TaskStatus.RUNNING,
+                    Task.speculated_at.is_(None),
+                )
+                .update({Task.speculated_at: claimed_at}, synchronize_session=False)
+            )
+            if claimed != 1:
+                db.rollback()
+                continue
+            if not queue_service.transactional:
+                db.commit()
+            
+            try:
+                queue_service.send_task(
+                    task_id=task_id,
+                    job_id=job.id,
+                    task_index=task.task_index,
+                    parameters=parameters,
+                    priority=job.priority,
+                    attempt=task.retry_count,
+                )
+            except Exception as e:
+                logger.error("Failed to enqueue speculative copy", task_id=task_id, error=str(e))
+                db.rollback()
+                # Release the claim so a later pass can try again
+                db.query(Task).filter(Task.id == task_id, Task.speculated_at == claimed_at).update(
+                    {Task.speculated_at: None},
+                    synchronize_session=False
+                )
+                db.commit()
+                continue
+            
+            db.commit()
+            speculated += 1
+            logger.info(
+                "Speculative copy enqueued",
+                task_id=task_id,
+                job_id=job.id,
+                threshold_seconds=round(threshold, 2),
+            )
+        return speculated
+    
+    def start(self, session_factory) -> None:
+        """Start the periodic detection thread."""
+        def tick():
+            with session_factory() as db:
+                self.detect(db)
+        
+        self._periodic = PeriodicTask(
+            "straggler-detector", settings.speculation_interval_seconds, tick
+        )
+        self._periodic.start()
+    
+    def stop(self) -> None:
+        """Stop the detection thread."""
+        if self._periodic:
+            self._periodic.stop()
+            self._periodic = None
+
+
+_detector: StragglerDetector = None
+
+
+def get_straggler_detector() -> StragglerDetector:
+    """Get or create the process-wide straggler detector."""
+    global _detector
+    if _detector is None:
+        _detector = StragglerDetector()
+    return _detector
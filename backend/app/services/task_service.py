@@ -5,11 +5,26 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 import structlog
 
-from app.db.models import Task, TaskStatus, Job
+from app.db.models import Task, TaskStatus, Job, JobStatus
 from app.models.schemas import TaskCompleteRequest
+from app.services.archive_service import ArchiveService
+from app.services.dependency_service import DependencyService
 from app.services.job_service import JobService
+from app.services.reduce_service import ReduceService
+from app.services.retry_service import get_retry_scheduler
+from app.utils.config import get_settings
+from app.utils.metrics import TASKS_FINISHED
 
 logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+# Statuses a task can still leave by completing or failing
+OPEN_TASK_STATUSES = [TaskStatus.PENDING, TaskStatus.ENQUEUED, TaskStatus.RUNNING, TaskStatus.RETRYING]
+
+
+def _from_epoch(timestamp: float = None) -> datetime:
+    """Naive UTC datetime from epoch seconds reported by a worker (None passes through)."""
+    return datetime.utcfromtimestamp(timestamp) if timestamp is not None else None
 
 
 class TaskService:
@@ -18,17 +33,22 @@ class TaskService:
     def __init__(self, db: Session):
         self.db = db
         self.job_service = JobService(db)
+        self.dependency_service = DependencyService(db)
     
-    def get_task(self, task_id: str) -> Task:
-        """Get task by ID."""
+    def get_task(self, task_id: str, include_archived: bool = False) -> Task:
+        """Get task by ID (for reads, optionally from the archive once its job's tasks were archived)."""
         task = self.db.query(Task).filter(Task.id == task_id).first()
+        if not task and include_archived:
+            task = ArchiveService(self.db).get_archived_task(task_id)
         if not task:
             raise ValueError(f"Task {task_id} not found")
         return task
     
     def get_tasks_by_job(self, job_id: str) -> list[Task]:
-        """Get all tasks for a job."""
+        """Get all tasks for a job (from the archive once the job's tasks were archived)."""
         tasks = self.db.query(Task).filter(Task.job_id == job_id).order_by(Task.task_index).all()
+        if not tasks:
+            tasks = ArchiveService(self.db).get_archived_tasks(job_id)
         return tasks
     
     def mark_task_complete(
@@ -36,72 +56,168 @@ class TaskService:
         task_id: str,
         complete_request: TaskCompleteRequest
     ) -> Task:
-        """Mark a task as completed (called by worker)."""
-        task = self.get_task(task_id)
+        """
+        Mark a task as completed (called by worker).
         
-        if task.status == TaskStatus.COMPLETED:
-            logger.warning("Task already completed", task_id=task_id)
-            return task
+        Idempotent: the transition is a single conditional UPDATE, so when a
+        duplicate delivery or a speculative copy races the original, exactly
+        one completion wins and the others are no-ops.
+        """
+        task = self.get_task(task_id)
         
-        task.status = TaskStatus.COMPLETED
-        task.completed_at = datetime.utcnow()
-        task.result = str(complete_request.result) if complete_request.result else None
-        task.processing_time_seconds = complete_request.processing_time_seconds
+        reduce_service = ReduceService(self.db)
+        reduce_spec = reduce_service.spec_for(task.job)
+        if reduce_spec:
+            # Resolved before the UPDATE so no store read happens while holding row locks
+            reduce_value = reduce_service.task_value(reduce_spec, complete_request)
         
-        if task.started_at:
+        completed_at = datetime.utcnow()
+        processing_time = complete_request.processing_time_seconds
+        if not processing_time and task.started_at:
             # Calculate processing time if not provided
-            if not task.processing_time_seconds:
-                delta = task.completed_at - task.started_at
-                task.processing_time_seconds = delta.total_seconds()
+            processing_time = (completed_at - task.started_at.replace(tzinfo=None)).total_seconds()
+        
+        won = (
+            self.db.query(Task)
+            .filter(Task.id == task_id, Task.status.in_(OPEN_TASK_STATUSES))
+            .update(
+                {
+                    Task.status: TaskStatus.COMPLETED,
+                    Task.completed_at: completed_at,
+                    Task.result: str(complete_request.result) if complete_request.result else None,
+                    Task.result_ref: complete_request.result_ref,
+                    Task.result_digest: complete_request.result_digest,
+                    Task.result_size_bytes: complete_request.result_size_bytes,
+                    Task.processing_time_seconds: processing_time,
+                    Task.enqueued_at: _from_epoch(complete_request.enqueued_at),
+                    Task.received_at: _from_epoch(complete_request.received_at),
+                },
+                synchronize_session=False
+            )
+        )
+        released = []
+        if won:
+            if reduce_spec:
+                # Folded in the same transaction, so a task is reduced exactly once
+                reduce_service.add(task, reduce_spec, reduce_value)
+            released = self.dependency_service.task_completed(task)
+        if released:
+            # Commits together with the completion
+            self.job_service.enqueue_tasks(task.job, released)
+        else:
+            self.db.commit()
+        self.db.refresh(task)
+        
+        if not won:
+            logger.warning("Task already finished, ignoring completion", task_id=task_id, status=task.status.value)
+            return task
         
-        self.db.commit()
         logger.info("Task completed", task_id=task_id, job_id=task.job_id)
+        TASKS_FINISHED.labels(task.job.job_type, TaskStatus.COMPLETED.value).inc()
         
         # Update job completion stats
-        self.job_service.update_task_completion(task.job_id)
+        self.job_service.update_task_completion(task.job_id, completed=1)
         
         return task
     
-    def mark_task_failed(self, task_id: str, error_message: str):
-        """Mark a task as failed."""
+    def mark_task_failed(self, task_id: str, error_message: str, attempt: int = None):
+        """
+        Mark a task as failed.
+        
+        ``attempt`` is the task's ``retry_count`` when its message was sent. The
+        transition is a single UPDATE conditional on that value, so a duplicate
+        delivery (or the other copy of a speculated task) failing the same
+        attempt is a no-op instead of burning another retry. Without an attempt
+        (older workers) the value just read is used.
+        """
         task = self.get_task(task_id)
+        if attempt is None:
+            attempt = task.retry_count
         
-        task.retry_count += 1
+        now = datetime.utcnow()
+        if task.job.status == JobStatus.CANCELLED:
+            # Was already running when the job was cancelled - don't retry it
+            status, completed_at = TaskStatus.CANCELLED, now
+        elif attempt + 1 >= task.max_retries:
+            status, completed_at = TaskStatus.FAILED, now
+        else:
+            status, completed_at = TaskStatus.RETRYING, None
         
-        if task.retry_count >= task.max_retries:
-            task.status = TaskStatus.FAILED
-            task.error_message = error_message
-            task.completed_at = datetime.utcnow()
+        won = (
+            self.db.query(Task)
+            .filter(
+                Task.id == task_id,
+                Task.status.in_(OPEN_TASK_STATUSES),
+                Task.retry_count == attempt,
+            )
+            .update(
+                {
+                    Task.status: status,
+                    Task.retry_count: attempt + 1,
+                    Task.error_message: error_message,
+                    Task.completed_at: completed_at,
+                },
+                synchronize_session=False
+            )
+        )
+        cascaded = []
+        if won and status == TaskStatus.FAILED:
+            cascaded = self.dependency_service.task_failed(task)
+            reduce_spec = ReduceService.spec_for(task.job)
+            if reduce_spec:
+                # Counted with no value so the reduce can still complete
+                reduce_service = ReduceService(self.db)
+                for failed_task in [task] + cascaded:
+                    reduce_service.add(failed_task, reduce_spec)
+        self.db.commit()
+        self.db.refresh(task)
+        
+        if not won:
+            # Finished meanwhile, or this attempt's failure was already recorded
+            logger.warning(
+                "Duplicate or stale failure ignored",
+                task_id=task_id,
+                attempt=attempt,
+                status=task.status.value
+            )
+            return task
+        
+        # Update job stats if task is permanently failed, otherwise schedule the retry
+        if task.status == TaskStatus.FAILED:
             logger.error(
                 "Task failed after max retries",
                 task_id=task_id,
                 retries=task.retry_count
             )
-        else:
-            task.status = TaskStatus.RETRYING
+            TASKS_FINISHED.labels(task.job.job_type, TaskStatus.FAILED.value).inc(1 + len(cascaded))
+            # Tasks downstream of it can no longer run and fail with it
+            self.job_service.update_task_completion(task.job_id, failed=1 + len(cascaded))
+        elif task.status == TaskStatus.RETRYING:
             logger.warning(
                 "Task retrying",
                 task_id=task_id,
                 retry_count=task.retry_count,
                 max_retries=task.max_retries
             )
-        
-        self.db.commit()
-        
-        # Update job stats if task is permanently failed
-        if task.status == TaskStatus.FAILED:
-            self.job_service.update_task_completion(task.job_id)
+            get_retry_scheduler().schedule(self.db, task)
         
         return task
     
     def mark_task_running(self, task_id: str) -> Task:
-        """Mark a task as running."""
+        """Mark a task as running (a no-op for duplicates and already finished tasks)."""
         task = self.get_task(task_id)
         
-        if task.status == TaskStatus.PENDING or task.status == TaskStatus.ENQUEUED:
-            task.status = TaskStatus.RUNNING
-            task.started_at = datetime.utcnow()
+        started = (
+            self.db.query(Task)
+            .filter(Task.id == task_id, Task.status.in_([TaskStatus.PENDING, TaskStatus.ENQUEUED]))
+            .update(
+                {Task.status: TaskStatus.RUNNING, Task.started_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+        )
+        if started:
             self.db.commit()
+            self.db.refresh(task)
             logger.info("Task started", task_id=task_id, job_id=task.job_id)
         
         return task
@@ -0,0 +1,64 @@
+"""
+Worker membership tracking.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import WorkerHeartbeat
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+
+class WorkerService:
+    """Service for worker heartbeats and the live worker set."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def heartbeat(self, worker_id: str) -> list[str]:
+        """
+        Record a heartbeat and return the ids of all live workers.
+        
+        Workers that have not reported within the TTL are removed, so shards
+        owned by a crashed pod are reassigned once its heartbeat expires.
+        """
+        now = datetime.utcnow()
+        heartbeat = self.db.query(WorkerHeartbeat).filter(WorkerHeartbeat.worker_id == worker_id).first()
+        if heartbeat:
+            heartbeat.last_seen_at = now
+        else:
+            self.db.add(WorkerHeartbeat(worker_id=worker_id, last_seen_at=now))
+            logger.info("Worker joined", worker_id=worker_id)
+        
+        cutoff = now - timedelta(seconds=settings.worker_heartbeat_ttl_seconds)
+        (
+            self.db.query(WorkerHeartbeat)
+            .filter(WorkerHeartbeat.last_seen_at < cutoff)
+            .delete(synchronize_session=False)
+        )
+        self.db.commit()
+        return self.live_workers()
+    
+    def live_workers(self) -> list[str]:
+        """Ids of workers with a heartbeat inside the TTL, sorted."""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.worker_heartbeat_ttl_seconds)
+        rows = (
+            self.db.query(WorkerHeartbeat.worker_id)
+            .filter(WorkerHeartbeat.last_seen_at >= cutoff)
+            .order_by(WorkerHeartbeat.worker_id)
+            .all()
+        )
+        return [row[0] for row in rows]
+    
+    def deregister(self, worker_id: str) -> None:
+        """Remove a worker on graceful shutdown so its shards move immediately."""
+        (
+            self.db.query(WorkerHeartbeat)
+            .filter(WorkerHeartbeat.worker_id == worker_id)
+            .delete(synchronize_session=False)
+        )
+        self.db.commit()
+        logger.info("Worker left", worker_id=worker_id)
@@ -0,0 +1,72 @@
+"""
+Process-wide boto3 clients.
+
+Building a boto3 client loads service models and sets up its own HTTP
+connection pool, which costs milliseconds and memory; clients themselves are
+thread-safe. The API therefore builds one client per service and endpoint,
+at startup for the configured services (``init_aws_clients``), shares it
+between requests and background threads, and closes them at shutdown.
+"""
+import threading
+from typing import Dict, Optional, Tuple
+import boto3
+from botocore.client import BaseClient
+from botocore.config import Config
+import structlog
+
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+_clients: Dict[Tuple[str, Optional[str]], BaseClient] = {}
+# Client creation goes through a boto3 session, which isn't thread-safe
+_clients_lock = threading.Lock()
+
+
+def get_aws_client(service: str, endpoint_url: str = None, **client_kwargs) -> BaseClient:
+    """
+    The shared client for a service and endpoint, created on first use.
+    
+    ``client_kwargs`` (region, credentials) only apply when the client is
+    created; every caller of a service/endpoint gets the same client.
+    """
+    key = (service, endpoint_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = boto3.session.Session().client(
+                    service,
+                    endpoint_url=endpoint_url,
+                    config=Config(max_pool_connections=settings.aws_max_pool_connections),
+                    **client_kwargs,
+                )
+                _clients[key] = client
+                logger.info("AWS client created", service=service, endpoint_url=endpoint_url)
+    return client
+
+
+def init_aws_clients() -> None:
+    """Create the clients of the configured AWS services up front (API startup)."""
+    from app.services.result_store import get_result_store
+    from app.services.sqs_service import SQSService
+    from app.services.step_functions_service import StepFunctionsService
+    
+    if settings.queue_backend == "sqs":
+        SQSService()
+    if settings.step_functions_arn:
+        StepFunctionsService()
+    else:
+        logger.info("Step Functions not configured, using local mode")
+    if settings.result_store == "s3":
+        get_result_store().client
+
+
+def close_aws_clients() -> None:
+    """Close every shared client's connection pool (API shutdown)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
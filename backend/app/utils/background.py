@@ -0,0 +1,59 @@
+"""
+Helpers for running periodic background work inside the API process.
+"""
+import threading
+from typing import Callable
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+
+class PeriodicTask:
+    """
+    Runs a callable on a fixed interval in a daemon thread.
+    
+    ``trigger()`` wakes the thread early, so event-driven work (e.g. "capacity
+    just freed up") runs promptly while the interval still acts as a safety net.
+    """
+    
+    def __init__(self, name: str, interval_seconds: float, func: Callable[[], None]):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: threading.Thread = None
+    
+    def start(self):
+        """Start the background thread (no-op if already running)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info("Background task started", name=self.name, interval=self.interval_seconds)
+    
+    def trigger(self):
+        """Run the callable as soon as possible instead of waiting for the interval."""
+        self._wake_event.set()
+    
+    def stop(self, timeout: float = 5.0):
+        """Signal the thread to stop and wait for it to exit."""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        logger.info("Background task stopped", name=self.name)
+    
+    def _run(self):
+        """Invoke the callable until stopped, logging (not raising) errors."""
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self.interval_seconds)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                self.func()
+            except Exception as e:
+                logger.error("Background task failed", name=self.name, error=str(e))
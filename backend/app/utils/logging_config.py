@@ -0,0 +1,63 @@
+"""
+Structured logging setup for the API.
+
+Log calls must stay cheap on hot paths (one task completion is several log
+lines, and a job can have thousands of tasks), so:
+
+- events below ``LOG_LEVEL`` are dropped before any processing;
+- ``EventSampler`` keeps a ``LOG_SAMPLE_RATES`` fraction of named events and
+  caps every info/debug event at ``LOG_RATE_LIMIT_PER_SECOND``, reporting how
+  many were dropped on the next one that gets through (warnings and errors
+  are never dropped);
+- rendered lines go through a ``QueueHandler`` and are written to stdout by a
+  background ``QueueListener`` thread, so request threads never block on I/O.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import structlog
+from orchestrator_common.log_sampling import EventSampler
+
+from app.utils.config import get_settings
+
+settings = get_settings()
+
+_listener: logging.handlers.QueueListener = None
+
+
+def configure_logging() -> None:
+    """Configure structlog and the non-blocking stdout handler (once per process)."""
+    global _listener
+    if _listener is not None:
+        return
+    
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)  # Flush what's queued on exit
+    
+    app_logger = logging.getLogger("orchestrator")
+    app_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    app_logger.setLevel(logging.DEBUG)  # Level filtering happens in structlog
+    app_logger.propagate = False
+    
+    renderer = (
+        structlog.processors.JSONRenderer() if settings.log_format == "json"
+        else structlog.dev.ConsoleRenderer(colors=False)
+    )
+    structlog.configure(
+        processors=[
+            EventSampler(settings.log_sample_rates, settings.log_rate_limit_per_second),
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="%Y-%m-%d %H:%M:%S"),
+            renderer,
+        ],
+        wrapper_class=structlog.make_filtering_bound_logger(
+            logging.getLevelName(settings.log_level.upper())
+        ),
+        logger_factory=lambda *args: app_logger,
+        cache_logger_on_first_use=True,
+    )
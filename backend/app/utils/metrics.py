@@ -0,0 +1,72 @@
+"""
+Prometheus metrics for the API, served at ``/metrics``.
+
+Route latency is labelled with the route template (``/api/v1/jobs/{job_id}``),
+not the raw path, to keep label cardinality bounded.
+"""
+from typing import Iterator
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import REGISTRY, Collector
+
+HTTP_REQUEST_DURATION = Histogram(
+    "orchestrator_http_request_duration_seconds",
+    "API request latency by route",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "orchestrator_http_requests_in_progress",
+    "API requests currently being handled",
+    ["method"],
+)
+SQS_REQUEST_DURATION = Histogram(
+    "orchestrator_sqs_request_duration_seconds",
+    "Latency of SQS calls made by the API",
+    ["operation"],
+)
+SQS_BATCH_SIZE = Histogram(
+    "orchestrator_sqs_batch_size",
+    "Messages per SQS call made by the API",
+    ["operation"],
+    buckets=(0, 1, 2, 5, 10),
+)
+TASKS_ENQUEUED = Counter(
+    "orchestrator_tasks_enqueued_total",
+    "Task messages sent to the queue backend",
+    ["priority"],
+)
+TASKS_FINISHED = Counter(
+    "orchestrator_tasks_finished_total",
+    "Tasks that reached a final status",
+    ["job_type", "status"],
+)
+
+
+class DatabasePoolCollector(Collector):
+    """Connection pool stats of a SQLAlchemy engine, read at scrape time."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        pool = self.engine.pool
+        # Only QueuePool tracks these; SQLite's single-connection pools don't
+        for name, documentation, method in [
+            ("orchestrator_db_pool_size", "Connections kept in the pool", "size"),
+            ("orchestrator_db_pool_checked_out", "Connections currently in use", "checkedout"),
+            ("orchestrator_db_pool_overflow", "Connections open beyond the pool size", "overflow"),
+        ]:
+            if hasattr(pool, method):
+                yield GaugeMetricFamily(name, documentation, value=getattr(pool, method)())
+
+
+_pool_collector: DatabasePoolCollector = None
+
+
+def register_pool_collector(engine) -> None:
+    """Expose an engine's pool stats (once per process)."""
+    global _pool_collector
+    if _pool_collector is None:
+        _pool_collector = DatabasePoolCollector(engine)
+        REGISTRY.register(_pool_collector)
+
@@ -0,0 +1,132 @@
+"""
+Opt-in per-request profiling (``PROFILING_ENABLED=true``).
+
+Every request gets a ``Server-Timing`` header with its SQL statement count and
+total database time (from SQLAlchemy engine events), the slowest statement,
+JSON rendering time and the total, so regressions such as N+1 queries show up
+in browser dev tools or ``curl -v`` on an ordinary request.
+
+Requests sent with ``X-Profile: 1``, and a ``PROFILING_SAMPLE_RATE`` fraction
+of all requests, are also run under cProfile; the stats are written to
+``PROFILING_DIR`` as ``.prof`` files (``python -m pstats`` or snakeviz). The
+profiler follows the event loop thread, which runs the async route handlers.
+Only one request is profiled at a time.
+"""
+import cProfile
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import structlog
+
+from app.utils.config import get_settings
+
+logger = structlog.get_logger(__name__)
+settings = get_settings()
+
+# Longest statement text echoed in the Server-Timing header
+MAX_STATEMENT_LENGTH = 100
+
+
+class RequestTimings:
+    """Database and rendering time accumulated by one request."""
+    
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.render_seconds = 0.0
+    
+    def record_query(self, statement: str, seconds: float) -> None:
+        """Count one executed statement."""
+        self.queries += 1
+        self.db_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+    
+    def server_timing(self, total_seconds: float) -> str:
+        """Format as a ``Server-Timing`` header value (durations in milliseconds)."""
+        metrics = [
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries"',
+            f"render;dur={self.render_seconds * 1000:.2f}",
+            f"total;dur={total_seconds * 1000:.2f}",
+        ]
+        if self.slowest_statement:
+            statement = " ".join(self.slowest_statement.split())[:MAX_STATEMENT_LENGTH]
+            statement = statement.replace("\\", "\\\\").replace('"', '\\"')
+            metrics.append(f'slowest-query;dur={self.slowest_seconds * 1000:.2f};desc="{statement}"')
+        return ", ".join(metrics)
+
+
+# Set by the middleware; copied into the threadpool for sync handlers and dependencies
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+_profile_lock = threading.Lock()
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSON response that adds its rendering time to the request's timings."""
+    
+    def render(self, content) -> bytes:
+        timings = _current.get()
+        if timings is None:
+            return super().render(content)
+        start = time.perf_counter()
+        body = super().render(content)
+        timings.render_seconds += time.perf_counter() - start
+        return body
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    timings = _current.get()
+    if timings is not None:
+        timings.record_query(statement, time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement the engine executes on behalf of a request (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+async def profile_request(request: Request, call_next):
+    """Collect request timings into Server-Timing and profile sampled requests."""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    profiler = None
+    wanted = request.headers.get("x-profile") == "1" or random.random() < settings.profiling_sample_rate
+    if wanted and _profile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        total = time.perf_counter() - start
+        _current.reset(token)
+        if profiler:
+            profiler.disable()
+            _profile_lock.release()
+    
+    response.headers["Server-Timing"] = timings.server_timing(total)
+    if profiler:
+        route = request.scope.get("route")
+        name = (route.path if route else request.url.path).strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        os.makedirs(settings.profiling_dir, exist_ok=True)
+        path = os.path.join(settings.profiling_dir, f"{int(time.time() * 1000)}-{request.method}-{name}.prof")
+        profiler.dump_stats(path)
+        logger.info("Request profile written", path=path, duration_ms=round(total * 1000, 2), queries=timings.queries)
+    return response
@@ -0,0 +1,88 @@
+"""
+Shared fixtures: a throwaway SQLite database and an in-memory task queue.
+"""
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.db.models import Job, JobStatus, Task, TaskStatus
+from app.services import queue_backend
+from app.utils.config import get_settings
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessions on a fresh SQLite file; several sessions stand in for API replicas."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    """A session on the test database."""
+    with session_factory() as session:
+        yield session
+
+
+@pytest.fixture
+def memory_queue(monkeypatch):
+    """Route every send to a fresh in-memory queue and return it."""
+    backend = queue_backend.MemoryQueueBackend()
+    monkeypatch.setattr(get_settings(), "queue_backend", "memory")
+    monkeypatch.setattr(queue_backend, "_memory_backend", backend)
+    return backend
+
+
+@pytest.fixture
+def sent_task_ids(memory_queue):
+    """Drain the in-memory queue; returns the task id of every message sent so far."""
+    def drain():
+        return [
+            message["body"]["task_id"]
+            for queue in memory_queue.queues()
+            for message in memory_queue.receive(queue, max_messages=100000)
+        ]
+    return drain
+
+
+@pytest.fixture
+def make_job(db):
+    """Insert a job with ``task_count`` tasks in ``task_status``."""
+    def make(
+        task_count: int = 3,
+        job_type: str = "test",
+        status: JobStatus = JobStatus.RUNNING,
+        task_status: TaskStatus = TaskStatus.ENQUEUED,
+        **job_fields,
+    ) -> Job:
+        job = Job(**{
+            "id": str(uuid.uuid4()),
+            "job_type": job_type,
+            "status": status,
+            "total_tasks": task_count,
+            "completed_tasks": 0,
+            "failed_tasks": 0,
+            "parameters": "{}",
+            **job_fields,
+        })
+        db.add(job)
+        db.add_all([
+            Task(
+                id=str(uuid.uuid4()),
+                job_id=job.id,
+                task_index=index,
+                status=task_status,
+                retry_count=0,
+                max_retries=3,
+                parameters="{}",
+            )
+            for index in range(task_count)
+        ])
+        db.commit()
+        return job
+    return make
@@ -0,0 +1,92 @@
+"""
+Admission control: rejecting or holding jobs over the outstanding-task limits.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.database import get_db
+from app.db.models import Job, JobStatus, Task, TaskStatus
+from app.main import app
+from app.models.schemas import JobCreate
+from app.services import admission_service
+from app.services.admission_service import AdmissionController
+from app.services.job_service import JobService
+from app.utils.config import get_settings
+
+
+@pytest.fixture
+def limit(monkeypatch, memory_queue):
+    """Install an admission controller with the given limits."""
+    def install(max_outstanding_tasks=None, **per_type):
+        controller = AdmissionController(max_outstanding_tasks, per_type)
+        monkeypatch.setattr(admission_service, "_controller", controller)
+        return controller
+    return install
+
+
+def submit(db, job_type, num_tasks, submitted_at):
+    job = JobService(db).create_job(JobCreate(job_type=job_type, num_tasks=num_tasks))
+    # SQLite's default timestamps only have one-second resolution
+    job.created_at = submitted_at
+    db.commit()
+    return job
+
+
+def finish_all(db):
+    db.query(Task).update({Task.status: TaskStatus.COMPLETED})
+    db.commit()
+
+
+def is_admitted(db, job):
+    db.refresh(job)
+    return job.admission_request is None and db.query(Task).filter(Task.job_id == job.id).count() == job.total_tasks
+
+
+def test_job_over_the_limit_is_rejected_when_not_queueing(db, make_job, limit):
+    limit(max_outstanding_tasks=4)
+    make_job(3)
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        response = TestClient(app).post(
+            "/api/v1/jobs", json={"job_type": "test", "num_tasks": 2, "queue_when_busy": False}
+        )
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == str(get_settings().admission_retry_after_seconds)
+    assert db.query(Job).count() == 1
+
+
+def test_held_jobs_are_admitted_in_submission_order(db, make_job, limit):
+    controller = limit(max_outstanding_tasks=4)
+    make_job(3)
+    start = datetime.utcnow()
+    large = submit(db, "test", 3, start)
+    small = submit(db, "test", 1, start + timedelta(seconds=1))
+    later = submit(db, "test", 2, start + timedelta(seconds=2))
+    assert all(job.status == JobStatus.PENDING for job in (large, small, later))
+    
+    # The small job would fit, but doesn't overtake the large one
+    assert controller.admit(db) == 0
+    assert not is_admitted(db, small)
+    
+    finish_all(db)
+    assert controller.admit(db) == 2
+    assert is_admitted(db, large)
+    assert is_admitted(db, small)
+    assert not is_admitted(db, later)
+
+
+def test_job_over_its_type_limit_only_holds_its_own_type(db, make_job, limit):
+    controller = limit(big=2)
+    make_job(2, job_type="big")
+    start = datetime.utcnow()
+    big = submit(db, "big", 1, start)
+    other = submit(db, "other", 1, start + timedelta(seconds=1))
+    
+    assert controller.admit(db) == 1
+    assert not is_admitted(db, big)
+    assert is_admitted(db, other)
@@ -0,0 +1,74 @@
+"""
+Archival of finished jobs' tasks and reads that fall back to the archive.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.database import get_db
+from app.db.models import Job, JobStatus, Task, TaskArchive, TaskStatus
+from app.main import app
+from app.services.archive_service import ArchiveService
+from app.services.task_service import TaskService
+
+
+@pytest.fixture
+def finished_job(db, make_job):
+    """A job that completed 40 days ago."""
+    completed_at = datetime.utcnow() - timedelta(days=40)
+    job = make_job(3, status=JobStatus.COMPLETED, task_status=TaskStatus.COMPLETED, completed_at=completed_at)
+    for task in job.tasks:
+        task.completed_at = completed_at
+    db.commit()
+    return job
+
+
+def test_finished_job_tasks_are_moved_once(db, make_job, finished_job):
+    task_ids = sorted(task.id for task in finished_job.tasks)
+    recent = make_job(2, status=JobStatus.COMPLETED, task_status=TaskStatus.COMPLETED, completed_at=datetime.utcnow())
+    
+    assert ArchiveService(db).archive_finished_jobs(retention_days=30) == 1
+    assert ArchiveService(db).archive_finished_jobs(retention_days=30) == 0
+    
+    assert db.query(Task).filter(Task.job_id == finished_job.id).count() == 0
+    archived = ArchiveService(db).get_archived_tasks(finished_job.id)
+    assert sorted(task.id for task in archived) == task_ids
+    assert {task.status for task in archived} == {TaskStatus.COMPLETED}
+    assert db.get(Job, finished_job.id).archived_at is not None
+    assert db.query(Task).filter(Task.job_id == recent.id).count() == 2
+
+
+def test_failed_archive_keeps_tasks_in_the_hot_table(db, finished_job, monkeypatch):
+    def fail():
+        raise RuntimeError("connection lost")
+    monkeypatch.setattr(db, "commit", fail)
+    
+    with pytest.raises(RuntimeError):
+        ArchiveService(db).archive_finished_jobs(retention_days=30)
+    db.rollback()
+    
+    assert db.query(Task).filter(Task.job_id == finished_job.id).count() == 3
+    assert db.query(TaskArchive).count() == 0
+
+
+def test_archived_task_is_readable_by_id(db, finished_job):
+    task_id = finished_job.tasks[0].id
+    ArchiveService(db).archive_finished_jobs(retention_days=30)
+    
+    assert TaskService(db).get_task(task_id, include_archived=True).id == task_id
+    with pytest.raises(ValueError):
+        TaskService(db).get_task(task_id)  # Status updates never touch the archive
+
+
+def test_archived_task_is_served_by_the_task_route(db, finished_job):
+    task_id = finished_job.tasks[0].id
+    ArchiveService(db).archive_finished_jobs(retention_days=30)
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        response = TestClient(app).get(f"/api/v1/tasks/{task_id}")
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert response.status_code == 200
+    assert response.json()["status"] == "COMPLETED"
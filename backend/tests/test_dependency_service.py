@@ -0,0 +1,81 @@
+"""
+Stage dependencies of multi-stage jobs: releasing dependents and failing them with their inputs.
+"""
+import pytest
+
+from app.db.models import JobStatus, Task, TaskStatus
+from app.models.schemas import JobCreate, StageSpec, TaskCompleteRequest
+from app.services.dependency_service import task_id_for
+from app.services.job_service import JobService
+from app.services.task_service import TaskService
+
+
+@pytest.fixture
+def make_stage_job(db, memory_queue):
+    """Create a multi-stage job through the job service."""
+    def make(*stages: StageSpec):
+        return JobService(db).create_job(JobCreate(job_type="test", stages=list(stages)))
+    return make
+
+
+def task_at(db, job, task_index):
+    db.expire_all()
+    return db.get(Task, task_id_for(job.id, task_index))
+
+
+def complete(db, task_id):
+    TaskService(db).mark_task_complete(task_id, TaskCompleteRequest(result={"output": 1}))
+
+
+def test_one_to_one_dependent_is_released_by_its_input(session_factory, db, make_stage_job, sent_task_ids):
+    job = make_stage_job(
+        StageSpec(name="extract", num_tasks=2),
+        StageSpec(name="load", num_tasks=2, depends_on=["extract"], dependency="one_to_one"),
+    )
+    assert sorted(sent_task_ids()) == sorted([task_id_for(job.id, 0), task_id_for(job.id, 1)])
+    
+    # Delivered twice: the second completion must not decrement again
+    for _ in range(2):
+        with session_factory() as delivery_db:
+            complete(delivery_db, task_id_for(job.id, 0))
+    
+    assert sent_task_ids() == [task_id_for(job.id, 2)]
+    assert task_at(db, job, 2).status == TaskStatus.ENQUEUED
+    assert task_at(db, job, 2).pending_dependencies == 0
+    assert task_at(db, job, 3).status == TaskStatus.PENDING
+    assert task_at(db, job, 3).pending_dependencies == 1
+
+
+def test_all_dependent_waits_for_the_whole_stage(db, make_stage_job, sent_task_ids):
+    job = make_stage_job(
+        StageSpec(name="map", num_tasks=2),
+        StageSpec(name="merge", num_tasks=1, depends_on=["map"]),
+    )
+    sent_task_ids()  # The map tasks
+    
+    complete(db, task_id_for(job.id, 0))
+    assert sent_task_ids() == []
+    assert task_at(db, job, 2).status == TaskStatus.PENDING
+    
+    complete(db, task_id_for(job.id, 1))
+    assert sent_task_ids() == [task_id_for(job.id, 2)]
+    assert task_at(db, job, 2).status == TaskStatus.ENQUEUED
+
+
+def test_failure_cascades_to_everything_downstream(db, make_stage_job, sent_task_ids):
+    job = make_stage_job(
+        StageSpec(name="extract", num_tasks=1),
+        StageSpec(name="transform", num_tasks=1, depends_on=["extract"], dependency="one_to_one"),
+        StageSpec(name="report", num_tasks=1, depends_on=["transform"]),
+    )
+    failed = task_at(db, job, 0)
+    failed.retry_count = failed.max_retries - 1
+    db.commit()
+    
+    TaskService(db).mark_task_failed(failed.id, "boom", attempt=failed.max_retries - 1)
+    
+    assert [task_at(db, job, i).status for i in range(3)] == [TaskStatus.FAILED] * 3
+    assert task_at(db, job, 2).error_message == f"Upstream task {task_id_for(job.id, 1)} failed"
+    db.refresh(job)
+    assert job.failed_tasks == 3
+    assert job.status == JobStatus.COMPLETED
@@ -0,0 +1,73 @@
+"""
+Fair-share dispatch from several API replicas sharing one database.
+"""
+from app.db.models import JobStatus, Task, TaskStatus
+from app.services.fair_share_service import FairShareDispatcher
+from app.services.job_service import JobService
+
+
+def _replicas(session_factory, count=2, max_in_flight=100):
+    """Dispatchers that loaded the held tasks at startup, as every replica does."""
+    dispatchers = [FairShareDispatcher(weights={}, max_in_flight_per_group=max_in_flight) for _ in range(count)]
+    for dispatcher in dispatchers:
+        with session_factory() as db:
+            dispatcher.load(db)
+    return dispatchers
+
+
+def test_task_held_by_two_replicas_is_sent_once(session_factory, db, make_job, sent_task_ids):
+    jobs = [make_job(5, status=JobStatus.ENQUEUED, task_status=TaskStatus.PENDING) for _ in range(2)]
+    first, second = _replicas(session_factory)
+    
+    with session_factory() as replica_db:
+        assert first.dispatch(replica_db) == 10
+    with session_factory() as replica_db:
+        assert second.dispatch(replica_db) == 0
+    
+    sent = sent_task_ids()
+    assert sorted(sent) == sorted(task.id for job in jobs for task in job.tasks)
+    assert second.held_count() == 0
+    assert {task.status for task in db.query(Task)} == {TaskStatus.ENQUEUED}
+
+
+def test_job_cancelled_on_another_replica_sends_nothing(session_factory, db, make_job, sent_task_ids):
+    kept = make_job(3, status=JobStatus.ENQUEUED, task_status=TaskStatus.PENDING)
+    cancelled = make_job(3, status=JobStatus.ENQUEUED, task_status=TaskStatus.PENDING)
+    first, second = _replicas(session_factory)
+    
+    # Fair share is off in the test settings, so the cancel leaves both sub-queues alone
+    JobService(db).cancel_job(cancelled.id)
+    with session_factory() as replica_db:
+        first.dispatch(replica_db)
+    with session_factory() as replica_db:
+        second.dispatch(replica_db)
+    
+    assert sorted(sent_task_ids()) == sorted(task.id for task in kept.tasks)
+    db.expire_all()
+    assert {task.status for task in cancelled.tasks} == {TaskStatus.CANCELLED}
+
+
+def test_cap_counts_tasks_released_by_other_replicas(session_factory, make_job, sent_task_ids):
+    make_job(10, status=JobStatus.ENQUEUED, task_status=TaskStatus.PENDING)
+    first, second = _replicas(session_factory, max_in_flight=4)
+    
+    with session_factory() as replica_db:
+        assert first.dispatch(replica_db) == 4
+    with session_factory() as replica_db:
+        assert second.dispatch(replica_db) == 0
+    assert len(sent_task_ids()) == 4
+
+
+def test_failed_send_returns_tasks_to_pending(session_factory, db, make_job, memory_queue, monkeypatch):
+    job = make_job(3, status=JobStatus.ENQUEUED, task_status=TaskStatus.PENDING)
+    [dispatcher] = _replicas(session_factory, count=1)
+    
+    def fail(*args, **kwargs):
+        raise RuntimeError("queue unavailable")
+    monkeypatch.setattr(memory_queue, "send_batch", fail)
+    with session_factory() as replica_db:
+        assert dispatcher.dispatch(replica_db) == 0
+    
+    assert dispatcher.held_count() == 3
+    db.expire_all()
+    assert {task.status for task in job.tasks} == {TaskStatus.PENDING}
@@ -0,0 +1,56 @@
+"""
+GET /jobs/cancelled, polled by workers to drop queued work of cancelled jobs.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.database import get_db
+from app.db.models import JobStatus
+from app.main import app
+
+
+@pytest.fixture
+def client(db):
+    """A client whose requests use the test session."""
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+def refresh(client, since=None):
+    params = {"since": since} if since else {}
+    response = client.get("/api/v1/jobs/cancelled", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_cancelled_job_is_listed(client, make_job, memory_queue):
+    job = make_job(2, status=JobStatus.ENQUEUED)
+    
+    assert client.post(f"/api/v1/jobs/{job.id}/cancel").status_code == 200
+    
+    assert job.id in refresh(client)["job_ids"]
+
+
+def test_cancel_committed_after_a_refresh_is_seen_by_the_next_one(client, db, make_job):
+    first = refresh(client)
+    
+    # Stamped before the first refresh answered, but committed only afterwards
+    job = make_job(2, status=JobStatus.CANCELLED, completed_at=datetime.utcnow() - timedelta(seconds=5))
+    assert job.id not in first["job_ids"]
+    
+    second = refresh(client, since=first["as_of"])
+    assert job.id in second["job_ids"]
+    assert second["as_of"] >= first["as_of"]
+
+
+def test_refresh_skips_jobs_cancelled_before_since(client, make_job):
+    job = make_job(2, status=JobStatus.CANCELLED, completed_at=datetime.utcnow() - timedelta(hours=1))
+    
+    as_of = refresh(client)["as_of"]
+    
+    assert job.id not in refresh(client, since=as_of)["job_ids"]
@@ -0,0 +1,129 @@
+"""
+Query-plan checks for the hot-path indexes.
+
+Each test builds a query the way the services do and asserts the planner
+answers it from the intended index. SQLite always runs (``EXPLAIN QUERY
+PLAN`` on a seeded, analyzed database); Postgres runs when ``DATABASE_URL``
+points at one that has been migrated to head, with ``enable_seqscan`` off so
+an index plan is chosen whenever one applies. Seeded rows are rolled back.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, insert, or_
+from sqlalchemy.orm import Session
+
+from app.db.database import Base
+from app.db.models import Job, Task, TaskStatus
+
+SEED_JOBS = 20
+SEED_TASKS_PER_JOB = 100
+
+
+def _seed(conn) -> str:
+    """Insert jobs whose tasks are mostly finished, with a few running and retrying; returns one job id."""
+    now = datetime.utcnow()
+    job_ids = [str(uuid.uuid4()) for _ in range(SEED_JOBS)]
+    conn.execute(insert(Job), [
+        {"id": job_id, "job_type": "plan_check", "created_at": now - timedelta(minutes=i)}
+        for i, job_id in enumerate(job_ids)
+    ])
+    tasks = []
+    for job_id in job_ids:
+        for index in range(SEED_TASKS_PER_JOB):
+            status = TaskStatus.COMPLETED
+            if index % 50 == 0:
+                status = TaskStatus.RETRYING
+            elif index % 10 == 0:
+                status = TaskStatus.RUNNING
+            tasks.append({
+                "id": str(uuid.uuid4()),
+                "job_id": job_id,
+                "task_index": index,
+                "status": status,
+                "started_at": now - timedelta(seconds=index),
+                "next_retry_at": now + timedelta(seconds=index) if status == TaskStatus.RETRYING else None,
+            })
+    conn.execute(insert(Task), tasks)
+    conn.exec_driver_sql("ANALYZE")
+    return job_ids[0]
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def db(request, tmp_path):
+    """A seeded session on the dialect under test, rolled back afterwards."""
+    if request.param == "sqlite":
+        engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+        Base.metadata.create_all(engine)
+    else:
+        database_url = os.environ.get("DATABASE_URL", "")
+        if not database_url.startswith("postgresql"):
+            pytest.skip("DATABASE_URL does not point at Postgres")
+        engine = create_engine(database_url)
+    
+    conn = engine.connect()
+    transaction = conn.begin()
+    if request.param == "postgresql":
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    session = Session(bind=conn)
+    session.seeded_job_id = _seed(conn)
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        conn.close()
+        engine.dispose()
+
+
+def _plan(db: Session, query) -> str:
+    """The planner's output for an ORM query, as one string."""
+    conn = db.connection()
+    sql = str(query.statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    return "\n".join(str(row[-1]) for row in conn.exec_driver_sql(prefix + sql))
+
+
+def test_job_status_counts_use_job_status_index(db):
+    query = (
+        db.query(Task.status, func.count(Task.id))
+        .filter(Task.job_id == db.seeded_job_id)
+        .group_by(Task.status)
+    )
+    assert "ix_tasks_job_id_status" in _plan(db, query)
+
+
+def test_job_task_listing_uses_job_task_index(db):
+    query = db.query(Task).filter(Task.job_id == db.seeded_job_id).order_by(Task.task_index)
+    assert "uq_tasks_job_id_task_index" in _plan(db, query)
+
+
+def test_job_listing_uses_created_at_index(db):
+    query = db.query(Job).order_by(Job.created_at.desc()).offset(0).limit(20)
+    assert "ix_jobs_created_at" in _plan(db, query)
+
+
+def test_stuck_running_tasks_use_status_started_at_index(db):
+    cutoff = datetime.utcnow() - timedelta(seconds=30)
+    query = db.query(Task).filter(
+        Task.status == TaskStatus.RUNNING,
+        Task.speculated_at.is_(None),
+        Task.started_at < cutoff,
+    )
+    assert "ix_tasks_status_started_at" in _plan(db, query)
+
+
+def test_due_retries_use_partial_retrying_index(db):
+    horizon = datetime.utcnow() + timedelta(seconds=900)
+    query = (
+        db.query(Task)
+        .filter(
+            Task.status == TaskStatus.RETRYING,
+            or_(Task.next_retry_at <= horizon, Task.next_retry_at.is_(None)),
+        )
+        .order_by(Task.next_retry_at)
+        .limit(500)
+    )
+    assert "ix_tasks_retrying_next_retry_at" in _plan(db, query)
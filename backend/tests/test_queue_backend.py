@@ -0,0 +1,34 @@
+"""
+Database queue long polling.
+"""
+import asyncio
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.services.queue_backend import DatabaseQueueBackend
+
+
+def test_long_polls_share_a_small_pool(tmp_path):
+    # Two connections for twenty waiting receivers and a sender
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}", pool_size=2, max_overflow=0, pool_timeout=1)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    
+    async def scenario():
+        receivers = [
+            asyncio.create_task(DatabaseQueueBackend.receive_async(session_factory, "NORMAL", wait_time_seconds=2))
+            for _ in range(20)
+        ]
+        await asyncio.sleep(0.5)
+        with session_factory() as db:
+            DatabaseQueueBackend(db).send_batch("NORMAL", [{"task_id": "t1"}])
+            db.commit()
+        return await asyncio.gather(*receivers)
+    
+    results = asyncio.run(scenario())
+    engine.dispose()
+    
+    received = [message["body"]["task_id"] for messages in results for message in messages]
+    assert received == ["t1"]
@@ -0,0 +1,67 @@
+"""
+Reduce stages folded as tasks finish, including duplicate completions.
+"""
+import json
+
+import pytest
+
+from app.db.models import JobReducePartial, Task
+from app.models.schemas import JobCreate, ReduceSpec, TaskCompleteRequest
+from app.services.job_service import JobService
+from app.services.task_service import TaskService
+
+
+@pytest.fixture
+def make_reduce_job(db, memory_queue):
+    """Create a job with a reduce stage through the job service."""
+    def make(num_tasks: int, **spec):
+        return JobService(db).create_job(
+            JobCreate(job_type="test", num_tasks=num_tasks, reduce=ReduceSpec(**spec))
+        )
+    return make
+
+
+def tasks_of(db, job):
+    return db.query(Task).filter(Task.job_id == job.id).order_by(Task.task_index).all()
+
+
+def complete(db, task_id, output):
+    TaskService(db).mark_task_complete(task_id, TaskCompleteRequest(result={"output": output}))
+
+
+def test_duplicate_completions_are_folded_once(session_factory, db, make_reduce_job):
+    job = make_reduce_job(5, op="sum", fan_in=2)
+    
+    for task in tasks_of(db, job):
+        for _ in range(2):
+            with session_factory() as delivery_db:
+                complete(delivery_db, task.id, task.task_index + 1)
+    
+    db.expire_all()
+    assert json.loads(job.reduce_result) == 15
+    assert job.reduce_completed_at is not None
+    assert db.query(JobReducePartial).filter(JobReducePartial.job_id == job.id).count() == 0
+
+
+def test_concat_keeps_task_order(db, make_reduce_job):
+    job = make_reduce_job(4, op="concat", fan_in=2)
+    
+    for task in reversed(tasks_of(db, job)):
+        complete(db, task.id, [task.task_index])
+    
+    db.expire_all()
+    assert json.loads(job.reduce_result) == [0, 1, 2, 3]
+
+
+def test_failed_task_contributes_nothing(db, make_reduce_job):
+    job = make_reduce_job(3, op="sum", fan_in=2)
+    failed, *completed = tasks_of(db, job)
+    failed.retry_count = failed.max_retries - 1
+    db.commit()
+    
+    TaskService(db).mark_task_failed(failed.id, "boom", attempt=failed.max_retries - 1)
+    for task in completed:
+        complete(db, task.id, 10)
+    
+    db.expire_all()
+    assert json.loads(job.reduce_result) == 20
@@ -0,0 +1,92 @@
+"""
+Retry re-enqueueing when several API replicas poll for due retries.
+"""
+from datetime import datetime, timedelta
+
+from app.db.models import Task, TaskStatus
+from app.services.retry_service import RetryScheduler
+
+
+def make_retrying_task(db, make_job, next_retry_at):
+    job = make_job(1, task_status=TaskStatus.RETRYING)
+    task = job.tasks[0]
+    task.retry_count = 1
+    task.next_retry_at = next_retry_at
+    db.commit()
+    return task
+
+
+def test_due_retry_is_sent_once_across_replicas(session_factory, db, make_job, memory_queue, sent_task_ids):
+    task = make_retrying_task(db, make_job, datetime.utcnow() - timedelta(seconds=1))
+    
+    sent = 0
+    for _ in range(2):
+        with session_factory() as replica_db:
+            sent += RetryScheduler().run_due(replica_db)
+    
+    assert sent == 1
+    assert sent_task_ids() == [task.id]
+    db.expire_all()
+    assert task.status == TaskStatus.ENQUEUED
+    assert task.next_retry_at is None
+
+
+def test_replica_polling_mid_send_does_not_resend(
+    session_factory, db, make_job, memory_queue, sent_task_ids, monkeypatch
+):
+    task = make_retrying_task(db, make_job, datetime.utcnow() - timedelta(seconds=1))
+    
+    # The second replica polls while the first is sending the retry
+    send_batch = memory_queue.send_batch
+    concurrent = []
+    
+    def send_while_other_replica_polls(*args, **kwargs):
+        if not concurrent:
+            with session_factory() as other_db:
+                concurrent.append(RetryScheduler().run_due(other_db))
+        return send_batch(*args, **kwargs)
+    monkeypatch.setattr(memory_queue, "send_batch", send_while_other_replica_polls)
+    
+    with session_factory() as replica_db:
+        sent = RetryScheduler().run_due(replica_db)
+    
+    assert sent + concurrent[0] == 1
+    assert sent_task_ids() == [task.id]
+
+
+def test_retry_beyond_sqs_delay_stays_in_database(db, make_job, memory_queue, sent_task_ids):
+    task = make_retrying_task(db, make_job, datetime.utcnow() + timedelta(hours=1))
+    
+    assert RetryScheduler().run_due(db) == 0
+    assert sent_task_ids() == []
+    db.expire_all()
+    assert task.status == TaskStatus.RETRYING
+
+
+def test_cancelled_retry_is_not_sent(session_factory, db, make_job, memory_queue, sent_task_ids):
+    task = make_retrying_task(db, make_job, datetime.utcnow() - timedelta(seconds=1))
+    scheduler = RetryScheduler()
+    
+    # Cancelled after the poll picked the task up but before it was claimed
+    with session_factory() as replica_db:
+        polled = replica_db.get(Task, task.id)
+        db.query(Task).filter(Task.id == task.id).update({Task.status: TaskStatus.CANCELLED})
+        db.commit()
+        assert scheduler._enqueue(replica_db, polled, 0) is False
+    
+    assert sent_task_ids() == []
+    db.expire_all()
+    assert task.status == TaskStatus.CANCELLED
+
+
+def test_failed_send_returns_task_to_retrying(db, make_job, memory_queue, sent_task_ids, monkeypatch):
+    task = make_retrying_task(db, make_job, datetime.utcnow() - timedelta(seconds=1))
+    
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("queue unavailable")
+    monkeypatch.setattr(memory_queue, "send_batch", unavailable)
+    
+    assert RetryScheduler().run_due(db) == 0
+    db.expire_all()
+    assert task.status == TaskStatus.RETRYING
+    assert task.next_retry_at is not None
@@ -0,0 +1,38 @@
+"""
+Speculative copies when several API replicas run the straggler detector.
+"""
+from datetime import datetime, timedelta
+
+from app.db.models import TaskStatus
+from app.services.straggler_service import StragglerDetector
+
+
+def test_straggler_is_speculated_once_across_replicas(
+    session_factory, db, make_job, memory_queue, sent_task_ids, monkeypatch
+):
+    job = make_job(20, task_status=TaskStatus.COMPLETED, completed_tasks=19)
+    for task in job.tasks:
+        task.processing_time_seconds = 1.0
+    straggler = job.tasks[0]
+    straggler.status = TaskStatus.RUNNING
+    straggler.started_at = datetime.utcnow() - timedelta(minutes=5)
+    db.commit()
+    
+    # The second replica scans while the first is sending its copy
+    send_batch = memory_queue.send_batch
+    concurrent = []
+    
+    def send_while_other_replica_scans(*args, **kwargs):
+        if not concurrent:
+            with session_factory() as other_db:
+                concurrent.append(StragglerDetector().detect(other_db))
+        return send_batch(*args, **kwargs)
+    monkeypatch.setattr(memory_queue, "send_batch", send_while_other_replica_scans)
+    
+    with session_factory() as replica_db:
+        speculated = StragglerDetector().detect(replica_db)
+    
+    assert speculated + concurrent[0] == 1
+    assert sent_task_ids() == [straggler.id]
+    db.expire_all()
+    assert straggler.speculated_at is not None
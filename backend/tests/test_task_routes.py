@@ -0,0 +1,52 @@
+"""
+GET /tasks/{task_id}/result for offloaded results.
+"""
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.database import get_db
+from app.main import app
+from app.services import result_store
+from app.services.result_store import LocalResultStore
+
+PAYLOAD = {"output": {"values": list(range(1000))}}
+
+
+@pytest.fixture
+def client(db, make_job, tmp_path, monkeypatch):
+    """A client whose requests use the test session and a local result store holding one payload."""
+    store = LocalResultStore(str(tmp_path / "results"))
+    store.put("job/task.json.gz", gzip.compress(json.dumps(PAYLOAD).encode()))
+    monkeypatch.setattr(result_store, "_store", store)
+    
+    task = make_job(1).tasks[0]
+    task.result_ref = "job/task.json.gz"
+    task.result_digest = "sha256:test"
+    db.commit()
+    
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        yield TestClient(app), task.id
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_offloaded_result_is_served_gzipped_when_accepted(client):
+    http, task_id = client
+    response = http.get(f"/api/v1/tasks/{task_id}/result", headers={"Accept-Encoding": "gzip"})
+    
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["x-result-digest"] == "sha256:test"
+    assert response.json() == PAYLOAD
+
+
+@pytest.mark.parametrize("accept_encoding", ["identity", "gzip;q=0, br", ""])
+def test_offloaded_result_is_decompressed_otherwise(client, accept_encoding):
+    http, task_id = client
+    response = http.get(f"/api/v1/tasks/{task_id}/result", headers={"Accept-Encoding": accept_encoding})
+    
+    assert "content-encoding" not in response.headers
+    assert json.loads(response.content) == PAYLOAD
@@ -0,0 +1,78 @@
+"""
+Task completion and failure under duplicate deliveries and speculative copies.
+"""
+from app.db.models import JobStatus, TaskStatus
+from app.models.schemas import TaskCompleteRequest
+from app.services.task_service import TaskService
+
+
+def running_task(db, make_job, task_count=1):
+    job = make_job(task_count, task_status=TaskStatus.RUNNING)
+    return job, job.tasks[0]
+
+
+def test_duplicate_completion_is_counted_once(session_factory, db, make_job):
+    job, task = running_task(db, make_job)
+    
+    for _ in range(2):
+        with session_factory() as delivery_db:
+            TaskService(delivery_db).mark_task_complete(task.id, TaskCompleteRequest(result={"value": 1}))
+    
+    db.expire_all()
+    assert task.status == TaskStatus.COMPLETED
+    assert job.completed_tasks == 1
+    assert job.status == JobStatus.COMPLETED
+
+
+def test_duplicate_failure_of_an_attempt_uses_one_retry(session_factory, db, make_job, memory_queue):
+    job, task = running_task(db, make_job)
+    
+    for _ in range(2):
+        with session_factory() as delivery_db:
+            TaskService(delivery_db).mark_task_failed(task.id, "boom", attempt=0)
+    
+    # Rescheduled once; a short backoff goes straight back to the queue
+    db.expire_all()
+    assert task.status == TaskStatus.ENQUEUED
+    assert task.retry_count == 1
+
+
+def test_stale_attempt_failure_is_ignored(db, make_job, memory_queue):
+    job, task = running_task(db, make_job)
+    task.retry_count = 1
+    db.commit()
+    
+    TaskService(db).mark_task_failed(task.id, "late failure of the first attempt", attempt=0)
+    
+    db.expire_all()
+    assert task.status == TaskStatus.RUNNING
+    assert task.retry_count == 1
+    assert task.error_message is None
+
+
+def test_failure_after_completion_is_ignored(db, make_job, memory_queue):
+    job, task = running_task(db, make_job)
+    service = TaskService(db)
+    
+    # The speculative copy fails after the original completed
+    service.mark_task_complete(task.id, TaskCompleteRequest(result={"value": 1}))
+    service.mark_task_failed(task.id, "copy failed", attempt=0)
+    
+    db.expire_all()
+    assert task.status == TaskStatus.COMPLETED
+    assert job.completed_tasks == 1
+    assert job.failed_tasks == 0
+
+
+def test_failure_of_the_last_attempt_fails_the_task(db, make_job):
+    job, task = running_task(db, make_job, task_count=2)
+    task.retry_count = task.max_retries - 1
+    db.commit()
+    
+    TaskService(db).mark_task_failed(task.id, "boom", attempt=task.max_retries - 1)
+    
+    db.expire_all()
+    assert task.status == TaskStatus.FAILED
+    assert task.completed_at is not None
+    assert job.failed_tasks == 1
+    assert job.status == JobStatus.RUNNING
@@ -0,0 +1,3 @@
+"""
+Code shared by the API and the worker images.
+"""
@@ -0,0 +1,347 @@
+"""
+Task execution shared by the standalone worker and the API's embedded worker pool.
+
+The handler registry, the built-in handlers, ``TaskProcessor`` and the
+priority queue selector live here so both run a task the same way. The
+worker image and the backend image each install this package.
+"""
+import importlib
+import threading
+import time
+import structlog
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = structlog.get_logger(__name__)
+
+# Served by the worker on METRICS_PORT, and by the API at /metrics for embedded workers
+TASK_DURATION = Histogram(
+    "orchestrator_worker_task_duration_seconds",
+    "Handler execution time per task",
+    ["work_type"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+TASKS_PROCESSED = Counter(
+    "orchestrator_worker_tasks_total",
+    "Tasks executed, by outcome (completed, failed or cached)",
+    ["work_type", "outcome"],
+)
+TASKS_IN_FLIGHT = Gauge("orchestrator_worker_tasks_in_flight", "Tasks currently executing")
+EXECUTION_BATCH_SIZE = Histogram(
+    "orchestrator_worker_execution_batch_size",
+    "Tasks per batched handler call",
+    buckets=(2, 4, 8, 16, 32, 64),
+)
+
+
+class TaskHandlerRegistry:
+    """
+    Maps a task's ``work_type`` to the handler that runs it.
+    
+    A handler is a callable taking the task parameters and returning an
+    optional dict of output; a class is instantiated once, on first use, and
+    may define ``warm_up(parameters)`` to import dependencies and allocate
+    reusable buffers ahead of the first task, and ``batch_key(parameters)``
+    plus ``run_batch(parameters_list)`` to run compatible tasks in one call
+    (tasks of a job sharing a batch key are coalesced). Handlers are registered with the
+    ``register`` decorator, as "module:attr" strings (``TASK_HANDLERS``), or
+    through the ``orchestrator.task_handlers`` entry point group. String and
+    entry point handlers are only imported when a task of that type first
+    arrives (or at warm-up).
+    """
+    
+    ENTRY_POINT_GROUP = "orchestrator.task_handlers"
+    DEFAULT_WORK_TYPE = "default"
+    
+    def __init__(self):
+        self._specs: dict = {}
+        self._handlers: dict = {}
+        self._lock = threading.Lock()
+    
+    def register(self, work_type: str, handler=None):
+        """Register a handler (object or "module:attr"); usable as a decorator."""
+        if handler is None:
+            def decorator(obj):
+                self.register(work_type, obj)
+                return obj
+            return decorator
+        with self._lock:
+            self._specs[work_type] = handler
+            self._handlers.pop(work_type, None)
+        return handler
+    
+    def load_entry_points(self) -> int:
+        """Register the installed entry points (loaded lazily, like string specs)."""
+        from importlib.metadata import entry_points
+        found = entry_points(group=self.ENTRY_POINT_GROUP)
+        for entry_point in found:
+            self.register(entry_point.name, entry_point)
+        return len(found)
+    
+    def get(self, work_type: str):
+        """Resolve the handler for a work type, importing it on first use."""
+        handler = self._handlers.get(work_type)
+        if handler is not None:
+            return handler
+        
+        if work_type not in self._specs:
+            if work_type == self.DEFAULT_WORK_TYPE:
+                raise KeyError("No default task handler registered")
+            return self.get(self.DEFAULT_WORK_TYPE)
+        
+        with self._lock:
+            if work_type not in self._handlers:
+                self._handlers[work_type] = self._resolve(self._specs[work_type])
+                logger.info("Task handler loaded", work_type=work_type)
+            return self._handlers[work_type]
+    
+    def warm_up(self, work_types: dict):
+        """Load handlers ahead of time; ``work_types`` maps a work type to warm-up parameters."""
+        for work_type, parameters in work_types.items():
+            start_time = time.time()
+            handler = self.get(work_type)
+            if hasattr(handler, "warm_up"):
+                handler.warm_up(parameters or {})
+            logger.info("Task handler warmed up", work_type=work_type, seconds=round(time.time() - start_time, 3))
+    
+    @staticmethod
+    def _resolve(spec):
+        """Turn a registration into a ready handler (import, then instantiate classes)."""
+        if isinstance(spec, str):
+            module_name, _, attr = spec.partition(":")
+            spec = getattr(importlib.import_module(module_name), attr)
+        elif hasattr(spec, "load") and not callable(spec):
+            spec = spec.load()  # importlib.metadata.EntryPoint
+        return spec() if isinstance(spec, type) else spec
+
+
+handlers = TaskHandlerRegistry()
+
+
+@handlers.register("cpu_bound")
+def cpu_bound_handler(parameters: dict):
+    """Simulate CPU-intensive work."""
+    end_time = time.time() + parameters.get('work_duration_seconds', 2.0)
+    while time.time() < end_time:
+        # Simple CPU-bound computation
+        _ = sum(i * i for i in range(1000))
+        time.sleep(0.01)
+
+
+@handlers.register("io_bound")
+@handlers.register(TaskHandlerRegistry.DEFAULT_WORK_TYPE)
+def sleep_handler(parameters: dict):
+    """Simulate I/O-bound work (also the fallback for unknown work types)."""
+    time.sleep(parameters.get('work_duration_seconds', 2.0))
+
+
+@handlers.register("matrix_multiply")
+class MatrixMultiplyHandler:
+    """
+    Simulate matrix multiplication.
+    
+    numpy is imported once, on warm-up or the first task. Operands and products
+    live in stacked ``(n, size, size)`` arrays reused per matrix size (per
+    thread), so a batch of same-size tasks is one ``matmul`` over the stack
+    instead of one allocation and ``dot`` call per task; a single task uses
+    the first slice.
+    """
+    
+    def __init__(self):
+        self.np = None
+        self._local = threading.local()
+    
+    def warm_up(self, parameters: dict):
+        """Import numpy and allocate buffers for the matrix size and batch size."""
+        self._buffers(parameters.get('matrix_size', 100), parameters.get('batch_size', 1))
+    
+    def _buffers(self, size: int, count: int):
+        """Stacked operand and output arrays holding at least ``count`` matrices of ``size``."""
+        if self.np is None:
+            import numpy
+            self.np = numpy
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+            self._local.rng = self.np.random.default_rng()
+        if size not in buffers or len(buffers[size][0]) < count:
+            buffers[size] = tuple(self.np.empty((count, size, size)) for _ in range(3))
+        a, b, out = buffers[size]
+        return a[:count], b[:count], out[:count]
+    
+    def batch_key(self, parameters: dict):
+        """Tasks with the same matrix size can share one stacked matmul."""
+        return parameters.get('matrix_size', 100)
+    
+    def run_batch(self, parameters_list: list) -> list:
+        """Multiply one matrix pair per task in a single batched matmul."""
+        a, b, out = self._buffers(self.batch_key(parameters_list[0]), len(parameters_list))
+        rng = self._local.rng
+        rng.random(out=a)
+        rng.random(out=b)
+        self.np.matmul(a, b, out=out)
+        # The simulated wait overlaps across the batch
+        time.sleep(max(p.get('work_duration_seconds', 2.0) for p in parameters_list))
+        return [None] * len(parameters_list)
+    
+    def __call__(self, parameters: dict):
+        return self.run_batch([parameters])[0]
+
+
+class TaskProcessor:
+    """Processes individual tasks."""
+    
+    def __init__(self, registry: TaskHandlerRegistry = None):
+        self.registry = registry or handlers
+    
+    def process_task(self, task_id: str, job_id: str, task_index: int, parameters: dict) -> dict:
+        """
+        Process a task with the handler registered for its work type.
+        
+        In production, handlers perform actual work like:
+        - Data processing
+        - Image transformation
+        - ML inference
+        - ETL operations
+        """
+        start_time = time.time()
+        
+        work_duration = parameters.get('work_duration_seconds', 2.0)
+        work_type = parameters.get('work_type', 'cpu_bound')
+        
+        logger.debug(
+            "Processing task",
+            task_id=task_id,
+            job_id=job_id,
+            work_type=work_type,
+            duration=work_duration
+        )
+        
+        TASKS_IN_FLIGHT.inc()
+        try:
+            output = self.registry.get(work_type)(parameters)
+        except Exception:
+            TASKS_PROCESSED.labels(work_type, "failed").inc()
+            raise
+        finally:
+            TASKS_IN_FLIGHT.dec()
+        
+        processing_time = time.time() - start_time
+        TASK_DURATION.labels(work_type).observe(processing_time)
+        TASKS_PROCESSED.labels(work_type, "completed").inc()
+        
+        # Generate result
+        result = {
+            "task_id": task_id,
+            "job_id": job_id,
+            "task_index": task_index,
+            "processing_time_seconds": processing_time,
+            "work_type": work_type,
+            "status": "completed"
+        }
+        if output:
+            result["output"] = output
+        
+        logger.debug(
+            "Task completed",
+            task_id=task_id,
+            processing_time=processing_time
+        )
+        
+        return result
+    
+    def process_batch(self, tasks: list) -> list:
+        """
+        Process tasks sharing a work type with one ``run_batch`` call.
+        
+        Each result reports its share of the batch time as processing time.
+        """
+        start_time = time.time()
+        work_type = tasks[0]['parameters'].get('work_type', 'cpu_bound')
+        
+        logger.info("Processing task batch", work_type=work_type, size=len(tasks))
+        
+        EXECUTION_BATCH_SIZE.observe(len(tasks))
+        TASKS_IN_FLIGHT.inc(len(tasks))
+        try:
+            outputs = self.registry.get(work_type).run_batch([task['parameters'] for task in tasks])
+        except Exception:
+            TASKS_PROCESSED.labels(work_type, "failed").inc(len(tasks))
+            raise
+        finally:
+            TASKS_IN_FLIGHT.dec(len(tasks))
+        
+        processing_time = (time.time() - start_time) / len(tasks)
+        for _ in tasks:
+            TASK_DURATION.labels(work_type).observe(processing_time)
+        TASKS_PROCESSED.labels(work_type, "completed").inc(len(tasks))
+        
+        results = []
+        for task, output in zip(tasks, outputs):
+            result = {
+                "task_id": task['task_id'],
+                "job_id": task['job_id'],
+                "task_index": task['task_index'],
+                "processing_time_seconds": processing_time,
+                "work_type": work_type,
+                "batch_size": len(tasks),
+                "status": "completed"
+            }
+            if output:
+                result["output"] = output
+            results.append(result)
+        return results
+
+
+class PriorityQueueSelector:
+    """
+    Decides which priority queue to poll first on each receive.
+    
+    In weighted mode a smooth weighted round robin picks the first queue so
+    every queue with a non-zero weight gets its share of first attempts (no
+    starvation). The remaining queues follow in priority order, so a worker
+    never idles while lower-priority work is waiting.
+    """
+    
+    PRIORITY_ORDER = ["HIGH", "NORMAL", "LOW"]
+    
+    def __init__(self, queue_urls: dict, mode: str = "weighted", weights: dict = None, starvation_interval: int = 10):
+        # Collapse priorities that share a URL (unset queues fall back to NORMAL)
+        self.queues = []
+        for name in self.PRIORITY_ORDER:
+            url = queue_urls.get(name)
+            if url and url not in [u for _, u in self.queues]:
+                self.queues.append((name, url))
+        self.mode = mode
+        self.weights = {name: max((weights or {}).get(name, 1), 1) for name, _ in self.queues}
+        self.starvation_interval = max(starvation_interval, 1)
+        self._current = {name: 0 for name, _ in self.queues}
+        self._polls = 0
+    
+    @staticmethod
+    def parse_weights(spec: str) -> dict:
+        """Parse "HIGH=6,NORMAL=3,LOW=1" into a dict."""
+        weights = {}
+        for part in spec.split(','):
+            if '=' in part:
+                name, value = part.split('=', 1)
+                weights[name.strip().upper()] = int(value)
+        return weights
+    
+    def next_order(self) -> list:
+        """Return the (priority, queue_url) pairs to try for this poll, in order."""
+        self._polls += 1
+        if len(self.queues) <= 1:
+            return list(self.queues)
+        
+        if self.mode == "strict":
+            if self._polls % self.starvation_interval == 0:
+                return list(reversed(self.queues))
+            return list(self.queues)
+        
+        # Smooth weighted round robin (as used by nginx upstreams)
+        total = sum(self.weights.values())
+        for name in self._current:
+            self._current[name] += self.weights[name]
+        first = max(self._current, key=self._current.get)
+        self._current[first] -= total
+        return [q for q in self.queues if q[0] == first] + [q for q in self.queues if q[0] != first]
@@ -0,0 +1,53 @@
+"""
+Log sampling shared by the API and the worker.
+
+``EventSampler`` is a structlog processor that keeps a configured fraction of
+named events and caps every info/debug event per second, reporting how many
+were dropped on the next one that gets through. Warnings and errors are never
+dropped.
+"""
+import random
+import threading
+import time
+from typing import Dict
+import structlog
+
+# Levels EventSampler never drops
+UNSAMPLED_METHODS = {"warning", "warn", "error", "exception", "critical", "fatal"}
+
+
+class EventSampler:
+    """structlog processor that samples and rate-limits info/debug events by event name."""
+    
+    def __init__(self, sample_rates: Dict[str, float], rate_limit_per_second: int):
+        self.sample_rates = sample_rates
+        self.rate_limit_per_second = rate_limit_per_second
+        # event -> [current second, emitted in it, dropped since last emitted]
+        self._windows: Dict[str, list] = {}
+        self._lock = threading.Lock()
+    
+    def __call__(self, logger, method_name: str, event_dict: dict) -> dict:
+        if method_name in UNSAMPLED_METHODS:
+            return event_dict
+        event = event_dict.get("event")
+        
+        rate = self.sample_rates.get(event)
+        if rate is not None:
+            if random.random() >= rate:
+                raise structlog.DropEvent
+            event_dict["sample_rate"] = rate
+        
+        if self.rate_limit_per_second:
+            second = int(time.monotonic())
+            with self._lock:
+                window = self._windows.setdefault(event, [second, 0, 0])
+                if window[0] != second:
+                    window[0], window[1] = second, 0
+                if window[1] >= self.rate_limit_per_second:
+                    window[2] += 1
+                    raise structlog.DropEvent
+                window[1] += 1
+                if window[2]:
+                    event_dict["suppressed"] = window[2]
+                    window[2] = 0
+        return event_dict
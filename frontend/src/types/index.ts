@@ -17,10 +17,13 @@ export enum TaskStatus {
   RETRYING = 'RETRYING',
 }
 
+export type JobPriority = 'HIGH' | 'NORMAL' | 'LOW';
+
 export interface Job {
   id: string;
   job_type: string;
   status: JobStatus;
+  priority: JobPriority;
   total_tasks: number;
   completed_tasks: number;
   failed_tasks: number;
@@ -53,6 +56,7 @@ export interface JobCreateRequest {
   job_type: string;
   num_tasks: number;
   parameters?: Record<string, any>;
+  priority?: JobPriority;
 }
 
 export interface JobListResponse {
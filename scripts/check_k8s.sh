@@ -39,6 +39,6 @@ kubectl get pods,deployments,services,configmaps -n default 2>&1 | grep -E "job-
 
 echo ""
 echo "To deploy the worker:"
-echo "   1. Build image: cd worker && docker build -t job-worker:latest ."
+echo "   1. Build image: docker build -f worker/Dockerfile -t job-worker:latest ."
 echo "   2. Load into kind: kind load docker-image job-worker:latest"
 echo "   3. Apply manifests: kubectl apply -f infra/k8s/"
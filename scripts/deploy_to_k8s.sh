@@ -21,8 +21,7 @@ echo ""
 
 # Build worker image
 echo "🔨 Building worker Docker image..."
-cd worker
-docker build -t job-worker:latest . || {
+docker build -f worker/Dockerfile -t job-worker:latest . || {
     echo "❌ Failed to build image"
     exit 1
 }
@@ -36,7 +35,7 @@ echo "✅ Image loaded into cluster"
 echo ""
 
 # Go to k8s manifests
-cd ../infra/k8s
+cd infra/k8s
 
 # Create ConfigMap
 echo "📝 Creating ConfigMap..."
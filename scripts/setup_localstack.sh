@@ -75,6 +75,20 @@ aws --endpoint-url=http://localhost:4566 sqs set-queue-attributes \
 echo "Redrive policy configured"
 echo ""
 
+# Create queue shards (tasks-0 .. tasks-N-1) when SQS_SHARD_COUNT > 1
+SHARD_COUNT=${SQS_SHARD_COUNT:-1}
+if [ "$SHARD_COUNT" -gt 1 ]; then
+    echo "Creating $SHARD_COUNT queue shards..."
+    for ((i = 0; i < SHARD_COUNT; i++)); do
+        aws --endpoint-url=http://localhost:4566 sqs create-queue \
+            --queue-name "tasks-$i" \
+            --attributes "{\"RedrivePolicy\":\"{\\\"deadLetterTargetArn\\\":\\\"$DLQ_ARN\\\",\\\"maxReceiveCount\\\":3}\"}" \
+            --region us-east-1 2>&1 | grep -v "deprecated" || true
+    done
+    echo "Shards created"
+    echo ""
+fi
+
 echo "Queue Information:"
 echo "  Main Queue: $QUEUE_URL"
 echo "  DLQ: $DLQ_URL"
@@ -1,115 +1,443 @@
 """
 Kubernetes worker that polls SQS for tasks and processes them.
 """
+import atexit
+import logging
+import logging.handlers
 import os
+import queue
 import time
 import json
+import gzip
+import hashlib
+import importlib
+import math
+import tempfile
 import signal
 import sys
-from typing import Optional
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional
 import structlog
 import requests
 from pydantic_settings import BaseSettings
 import boto3
 from botocore.exceptions import ClientError
+from prometheus_client import Histogram, start_http_server
+
+# Shared with the API (common/); handler modules do "from worker import handlers"
+from orchestrator_common.execution import TASKS_PROCESSED, PriorityQueueSelector, TaskProcessor, handlers  # noqa: F401
+from orchestrator_common.log_sampling import EventSampler
 
 logger = structlog.get_logger(__name__)
 
+# Prometheus metrics, served on METRICS_PORT when set (task execution metrics
+# are defined with the execution core)
+QUEUE_REQUEST_DURATION = Histogram(
+    "orchestrator_worker_queue_request_duration_seconds",
+    "Latency of queue calls (SQS or the API's database queue)",
+    ["operation"],
+)
+RECEIVE_BATCH_SIZE = Histogram(
+    "orchestrator_worker_receive_batch_size",
+    "Messages per receive call",
+    buckets=(0, 1, 2, 5, 10),
+)
+API_REQUEST_DURATION = Histogram(
+    "orchestrator_worker_api_request_duration_seconds",
+    "Latency of task status reports to the API",
+    ["operation"],
+)
+
+# Task statuses after which another delivery of the task has nothing left to do
+FINISHED_TASK_STATUSES = {"COMPLETED", "FAILED", "CANCELLED"}
+
 
 class WorkerConfig(BaseSettings):
     """Worker configuration."""
     aws_region: str = "us-east-1"
     aws_access_key_id: str = ""
     aws_secret_access_key: str = ""
+    # "sqs" polls SQS directly; "http" consumes the backend's database queue
+    # (QUEUE_BACKEND=database on the API) through /api/v1/queue/...
+    queue_backend: str = "sqs"
+    # Sent with every receive when set; otherwise the queue's own timeout applies
+    visibility_timeout_seconds: Optional[int] = None
+    # Received messages are kept hidden until acked: every heartbeat extends
+    # them to visibility_extension_seconds. Keep the heartbeat well under the
+    # queue's timeout (SQS defaults to 30s).
+    visibility_heartbeat_seconds: float = 10.0
+    visibility_extension_seconds: int = 60
     sqs_queue_url: str = ""
+    # Optional priority queues polled alongside sqs_queue_url (the NORMAL queue)
+    sqs_high_priority_queue_url: str = ""
+    sqs_low_priority_queue_url: str = ""
+    # Must match the API's SQS_SHARD_COUNT; shards are "<queue_url>-0" .. "<queue_url>-(N-1)"
+    sqs_shard_count: int = 1
+    # How often to heartbeat to the API and recompute this worker's shards
+    shard_rebalance_seconds: float = 15.0
+    # "weighted": smooth weighted round robin over queues; "strict": always
+    # highest first, except every Nth poll which starts from the lowest
+    priority_mode: str = "weighted"
+    priority_weights: str = "HIGH=6,NORMAL=3,LOW=1"
+    strict_starvation_interval: int = 10
     api_base_url: str = "http://localhost:8000"
     poll_interval_seconds: int = 5
     max_messages_per_poll: int = 10
     wait_time_seconds: int = 20
     worker_id: str = ""
+    # How often to refresh the set of cancelled job ids from the API
+    cancelled_jobs_refresh_seconds: float = 5.0
+    # Recently processed message ids remembered to drop duplicate deliveries
+    processed_message_cache_size: int = 10000
+    # Opt-in memoization of task results keyed by (work_type, parameters, task_index).
+    # Jobs opt out with parameters {"cache_results": false}.
+    result_cache_enabled: bool = False
+    result_cache_size: int = 1024
+    # Optional on-disk tier shared by restarts (and by pods mounting the same volume)
+    result_cache_dir: str = ""
+    result_cache_disk_max_entries: int = 100000
+    # Extra handlers as {"work_type": "module:attr"} (JSON), imported on first use
+    task_handlers: Dict[str, str] = {}
+    # Modules imported at start so their @handlers.register decorators run
+    task_handler_modules: str = ""
+    # Handlers to load before polling, with warm-up parameters, e.g. {"matrix_multiply": {"matrix_size": 500}}
+    handler_warm_up: Dict[str, dict] = {}
+    # Run compatible tasks of a received batch with one call to their handler's run_batch
+    batch_execution_enabled: bool = True
+    # Results larger than this (serialized) go to the result store, gzip-compressed, and
+    # only a reference is reported. Must match the API's RESULT_STORE settings.
+    result_store: str = ""  # "" keeps every result inline; "local" or "s3"
+    result_store_path: str = "./results"
+    result_store_bucket: str = ""
+    result_store_prefix: str = "results/"
+    result_store_endpoint_url: str = ""
+    result_inline_max_bytes: int = 16384
+    
+    # Serve Prometheus metrics on this port (0 disables)
+    metrics_port: int = 0
+    
+    # Logging: info/debug events are capped per event name and second; sample
+    # rates keep a fraction of named events (JSON, e.g. {"Task failed": 0.1})
+    log_level: str = "INFO"
+    log_format: str = "console"  # or "json"
+    log_sample_rates: Dict[str, float] = {}
+    log_rate_limit_per_second: int = 100  # 0 = no limit
     
     class Config:
         env_file = ".env"
         case_sensitive = False
 
 
-class TaskProcessor:
-    """Processes individual tasks."""
+class ResultCache:
+    """
+    Memoizes task results for identical executions.
     
-    @staticmethod
-    def process_task(task_id: str, job_id: str, task_index: int, parameters: dict) -> dict:
-        """
-        Process a task - simulates computation work.
-        
-        In production, this would perform actual work like:
-        - Data processing
-        - Image transformation
-        - ML inference
-        - ETL operations
-        """
-        start_time = time.time()
-        
-        # Simulate work based on task parameters
-        work_duration = parameters.get('work_duration_seconds', 2.0)
-        work_type = parameters.get('work_type', 'cpu_bound')
-        
-        logger.info(
-            "Processing task",
-            task_id=task_id,
-            job_id=job_id,
-            work_type=work_type,
-            duration=work_duration
+    Keys are a SHA-256 of the work type, parameters and task index, so tasks of
+    re-submitted or duplicated jobs hit the entries of the original. Entries
+    live in an in-memory LRU and, if a directory is configured, in one JSON
+    file each on disk. The disk tier evicts the least recently used files, by
+    mtime, once it holds more than ``disk_max_entries``.
+    """
+    
+    OPT_OUT_PARAMETER = "cache_results"
+    
+    def __init__(self, max_entries: int = 1024, directory: str = "", disk_max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.disk_max_entries = disk_max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._disk_count = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_count = len(self._disk_files())
+    
+    @classmethod
+    def key(cls, work_type: str, parameters: dict, task_index: int) -> str:
+        """Stable hash of what determines a task's result."""
+        relevant = {k: v for k, v in parameters.items() if k != cls.OPT_OUT_PARAMETER}
+        payload = json.dumps(
+            {"work_type": work_type, "parameters": relevant, "task_index": task_index},
+            sort_keys=True,
+            default=str
         )
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    @classmethod
+    def enabled_for(cls, parameters: dict) -> bool:
+        """Whether a job allows caching (opt out with {"cache_results": false})."""
+        return parameters.get(cls.OPT_OUT_PARAMETER, True) is not False
+    
+    def get(self, key: str) -> Optional[dict]:
+        """Look up a result in memory, then on disk (promoting disk hits)."""
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+        elif self.directory:
+            result = self._read_disk(key)
+            if result is not None:
+                self._put_memory(key, result)
         
-        if work_type == 'cpu_bound':
-            # Simulate CPU-intensive work
-            end_time = start_time + work_duration
-            while time.time() < end_time:
-                # Simple CPU-bound computation
-                _ = sum(i * i for i in range(1000))
-                time.sleep(0.01)
-        elif work_type == 'io_bound':
-            # Simulate I/O-bound work
-            time.sleep(work_duration)
-        elif work_type == 'matrix_multiply':
-            # Simulate matrix multiplication
-            import numpy as np
-            size = parameters.get('matrix_size', 100)
-            a = np.random.rand(size, size)
-            b = np.random.rand(size, size)
-            _ = np.dot(a, b)
-            time.sleep(work_duration)
+        if result is None:
+            self.misses += 1
         else:
-            # Default: just sleep
-            time.sleep(work_duration)
-        
-        processing_time = time.time() - start_time
-        
-        # Generate result
-        result = {
-            "task_id": task_id,
-            "job_id": job_id,
-            "task_index": task_index,
-            "processing_time_seconds": processing_time,
-            "work_type": work_type,
-            "status": "completed"
+            self.hits += 1
+        return result
+    
+    def put(self, key: str, result: dict):
+        """Store a result in both tiers."""
+        self._put_memory(key, result)
+        if self.directory:
+            self._write_disk(key, result)
+    
+    def _put_memory(self, key: str, result: dict):
+        """Insert into the in-memory LRU, evicting the oldest entries."""
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def _path(self, key: str) -> str:
+        """File holding an entry in the disk tier."""
+        return os.path.join(self.directory, f"{key}.json")
+    
+    def _disk_files(self) -> list:
+        """Names of the entry files in the disk tier."""
+        return [name for name in os.listdir(self.directory) if name.endswith(".json")]
+    
+    def _read_disk(self, key: str) -> Optional[dict]:
+        """Load an entry from disk, refreshing its mtime."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            os.utime(path)  # Mark as recently used for eviction
+            return result
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to read cached result", key=key, error=str(e))
+            return None
+    
+    def _write_disk(self, key: str, result: dict):
+        """Persist an entry atomically and evict if the tier is over its limit."""
+        path = self._path(key)
+        existed = os.path.exists(path)
+        try:
+            # Rename into place so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(result, f, default=str)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to write cached result", key=key, error=str(e))
+            return
+        if not existed:
+            self._disk_count += 1
+        if self._disk_count > self.disk_max_entries:
+            self._evict_disk()
+    
+    def _evict_disk(self):
+        """Remove the least recently used files down to 90% of the limit."""
+        paths = [os.path.join(self.directory, name) for name in self._disk_files()]
+        paths.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        excess = len(paths) - int(self.disk_max_entries * 0.9)
+        for path in paths[:max(excess, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._disk_count = len(self._disk_files())
+
+
+class ResultStore:
+    """
+    Writes large task results to blob storage (the API reads them back).
+    
+    Payloads are gzip-compressed JSON keyed ``<job_id>/<task_id>.json.gz``;
+    the digest is a SHA-256 of the uncompressed JSON.
+    """
+    
+    def __init__(self, config: WorkerConfig):
+        self.kind = config.result_store
+        self.path = config.result_store_path
+        self.bucket = config.result_store_bucket
+        self.prefix = config.result_store_prefix
+        self.client = None
+        if self.kind == "s3":
+            self.client = boto3.client(
+                's3',
+                region_name=config.aws_region,
+                aws_access_key_id=config.aws_access_key_id or None,
+                aws_secret_access_key=config.aws_secret_access_key or None,
+                endpoint_url=config.result_store_endpoint_url or None
+            )
+        elif self.kind != "local":
+            raise ValueError(f"Unknown result store: {self.kind}")
+    
+    def put(self, key: str, data: bytes):
+        """Store a payload under key."""
+        if self.client:
+            self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+            return
+        path = os.path.join(self.path, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+    
+    def offload(self, task_id: str, job_id: str, payload: bytes) -> dict:
+        """Compress and store a serialized result; returns the reference fields for /complete."""
+        key = f"{job_id}/{task_id}.json.gz"
+        self.put(key, gzip.compress(payload))
+        return {
+            "result_ref": key,
+            "result_digest": f"sha256:{hashlib.sha256(payload).hexdigest()}",
+            "result_size_bytes": len(payload)
         }
+
+
+class ShardAssignment:
+    """
+    Decides which queue shards this worker polls.
+    
+    Workers heartbeat to ``POST /workers/{id}/heartbeat``, which returns the
+    live membership. Each shard is owned by ``ceil(workers / shards)`` workers
+    chosen by rendezvous (highest random weight) hashing with bounded load: a
+    shard goes to its highest-ranked workers that are still under their fair
+    share. Every worker computes the same assignment from the same membership,
+    every shard is polled, and scaling moves few shards. Until membership is
+    known, all shards are polled.
+    """
+    
+    def __init__(self, api_base_url: str, worker_id: str, shard_count: int, refresh_seconds: float = 15.0):
+        self.api_base_url = api_base_url
+        self.worker_id = worker_id
+        self.shard_count = shard_count
+        self.refresh_seconds = refresh_seconds
+        self.owned = list(range(shard_count))
+        self._last_refresh = 0.0
+        self._polls = 0
+    
+    @staticmethod
+    def assign(worker_id: str, workers: list, shard_count: int) -> list:
+        """Shards owned by worker_id given the live workers."""
+        workers = sorted(set(workers) | {worker_id})
+        owners_per_shard = math.ceil(len(workers) / shard_count)
+        capacity = math.ceil(shard_count * owners_per_shard / len(workers))
+        load = {worker: 0 for worker in workers}
         
-        logger.info(
-            "Task completed",
-            task_id=task_id,
-            processing_time=processing_time
-        )
+        def weight(worker: str, shard: int) -> int:
+            return int(hashlib.md5(f"{worker}:{shard}".encode()).hexdigest(), 16)
         
-        return result
+        owned = []
+        for shard in range(shard_count):
+            ranked = sorted(workers, key=lambda w: weight(w, shard), reverse=True)
+            owners = [w for w in ranked if load[w] < capacity][:owners_per_shard]
+            for owner in owners:
+                load[owner] += 1
+            if worker_id in owners:
+                owned.append(shard)
+        return owned
+    
+    def shards(self) -> list:
+        """Owned shards, rotated each call so no shard is always polled first."""
+        if time.time() - self._last_refresh >= self.refresh_seconds:
+            self.refresh()
+        self._polls += 1
+        offset = self._polls % len(self.owned) if self.owned else 0
+        return self.owned[offset:] + self.owned[:offset]
+    
+    def refresh(self):
+        """Heartbeat and recompute the owned shards from the live membership."""
+        self._last_refresh = time.time()
+        try:
+            response = requests.post(
+                f"{self.api_base_url}/api/v1/workers/{self.worker_id}/heartbeat",
+                timeout=5
+            )
+            response.raise_for_status()
+            workers = response.json().get("workers", [])
+        except Exception as e:
+            logger.warning("Failed to refresh shard assignment", error=str(e))
+            return
+        
+        owned = self.assign(self.worker_id, workers, self.shard_count)
+        if owned != self.owned:
+            logger.info("Shards rebalanced", shards=owned, workers=len(workers))
+            self.owned = owned
+    
+    def leave(self):
+        """Deregister so other workers pick up this worker's shards right away."""
+        try:
+            requests.delete(f"{self.api_base_url}/api/v1/workers/{self.worker_id}", timeout=5)
+        except Exception as e:
+            logger.warning("Failed to deregister worker", error=str(e))
 
 
-class SQSWorker:
-    """Worker that polls SQS and processes tasks."""
+class CancelledJobCache:
+    """
+    Locally cached set of cancelled job ids.
+    
+    Refreshed incrementally from ``GET /jobs/cancelled`` at most once per
+    refresh interval, so checking a message costs a set lookup. If the API is
+    unreachable the stale set is kept and tasks run as usual.
+    """
+    
+    def __init__(self, api_base_url: str, refresh_seconds: float = 5.0):
+        self.api_base_url = api_base_url
+        self.refresh_seconds = refresh_seconds
+        self.job_ids: set = set()
+        self._as_of: Optional[str] = None
+        self._last_refresh = 0.0
+    
+    def is_cancelled(self, job_id: str) -> bool:
+        """Check whether a job has been cancelled, refreshing the set if stale."""
+        if time.time() - self._last_refresh >= self.refresh_seconds:
+            self.refresh()
+        return job_id in self.job_ids
+    
+    def refresh(self):
+        """Fetch job ids cancelled since the last refresh."""
+        self._last_refresh = time.time()
+        params = {"since": self._as_of} if self._as_of else {}
+        try:
+            response = requests.get(
+                f"{self.api_base_url}/api/v1/jobs/cancelled",
+                params=params,
+                timeout=5
+            )
+            if response.status_code == 200:
+                data = response.json()
+                self.job_ids.update(data.get("job_ids", []))
+                self._as_of = data.get("as_of")
+        except Exception as e:
+            logger.warning("Failed to refresh cancelled jobs", error=str(e))
+
+
+class QueueBackend(ABC):
+    """Transport the worker receives task messages from."""
+    
+    @abstractmethod
+    def receive(self, queue: str, max_messages: int, wait_time_seconds: int, visibility_timeout: Optional[int]) -> list:
+        """Receive messages as dicts with message_id, receipt_handle and body (None = the queue's timeout)."""
+    
+    @abstractmethod
+    def ack(self, queue: str, receipt_handle: str):
+        """Delete a processed message."""
+    
+    @abstractmethod
+    def extend_visibility(self, queue: str, receipt_handle: str, timeout_seconds: int):
+        """Keep a message hidden from other workers for another timeout_seconds."""
+
+
+class SQSQueueBackend(QueueBackend):
+    """Receives task messages directly from SQS."""
     
     def __init__(self, config: WorkerConfig):
-        self.config = config
-        self.running = True
         # Determine if using LocalStack or real AWS
         endpoint_url = None
         if config.sqs_queue_url.startswith('http://'):
@@ -117,17 +445,217 @@ class SQSWorker:
             parts = config.sqs_queue_url.split('/')
             endpoint_url = '/'.join(parts[:3])  # http://host:port
         
-        self.sqs_client = boto3.client(
+        self.client = boto3.client(
             'sqs',
             region_name=config.aws_region,
             aws_access_key_id=config.aws_access_key_id or None,
             aws_secret_access_key=config.aws_secret_access_key or None,
             endpoint_url=endpoint_url
         )
+    
+    def receive(self, queue: str, max_messages: int, wait_time_seconds: int, visibility_timeout: Optional[int]) -> list:
+        """Receive messages from an SQS queue."""
+        options = {'VisibilityTimeout': visibility_timeout} if visibility_timeout else {}
+        try:
+            response = self.client.receive_message(
+                QueueUrl=queue,
+                MaxNumberOfMessages=max_messages,
+                WaitTimeSeconds=wait_time_seconds,
+                MessageAttributeNames=['All'],
+                **options
+            )
+        except ClientError as e:
+            logger.error("Failed to receive messages from SQS", queue_url=queue, error=str(e))
+            return []
+        
+        messages = []
+        for msg in response.get('Messages', []):
+            try:
+                messages.append({
+                    'message_id': msg['MessageId'],
+                    'receipt_handle': msg['ReceiptHandle'],
+                    'body': json.loads(msg['Body'])
+                })
+            except (json.JSONDecodeError, KeyError) as e:
+                logger.error("Failed to parse SQS message", error=str(e))
+        return messages
+    
+    def ack(self, queue: str, receipt_handle: str):
+        """Delete a message from SQS after processing."""
+        try:
+            self.client.delete_message(QueueUrl=queue, ReceiptHandle=receipt_handle)
+        except ClientError as e:
+            logger.error("Failed to delete message from SQS", error=str(e))
+    
+    def extend_visibility(self, queue: str, receipt_handle: str, timeout_seconds: int):
+        """Change a message's visibility timeout."""
+        try:
+            self.client.change_message_visibility(
+                QueueUrl=queue,
+                ReceiptHandle=receipt_handle,
+                VisibilityTimeout=timeout_seconds
+            )
+        except ClientError as e:
+            logger.warning("Failed to extend message visibility", error=str(e))
+
+
+class HTTPQueueBackend(QueueBackend):
+    """Receives task messages from the API's database-backed queue."""
+    
+    def __init__(self, config: WorkerConfig):
+        self.base_url = f"{config.api_base_url}/api/v1/queue"
+        self.session = requests.Session()
+    
+    def receive(self, queue: str, max_messages: int, wait_time_seconds: int, visibility_timeout: Optional[int]) -> list:
+        """Claim messages from a database queue (long-polled server side)."""
+        try:
+            response = self.session.post(
+                f"{self.base_url}/{queue}/receive",
+                json={
+                    "max_messages": max_messages,
+                    "wait_time_seconds": wait_time_seconds,
+                    "visibility_timeout": visibility_timeout
+                },
+                timeout=wait_time_seconds + 10
+            )
+            response.raise_for_status()
+            return response.json().get("messages", [])
+        except Exception as e:
+            logger.error("Failed to receive messages from API queue", queue=queue, error=str(e))
+            return []
+    
+    def ack(self, queue: str, receipt_handle: str):
+        """Delete a processed message from the database queue."""
+        try:
+            self.session.post(
+                f"{self.base_url}/{queue}/ack",
+                json={"receipt_handle": receipt_handle},
+                timeout=10
+            ).raise_for_status()
+        except Exception as e:
+            logger.error("Failed to ack message", queue=queue, error=str(e))
+    
+    def extend_visibility(self, queue: str, receipt_handle: str, timeout_seconds: int):
+        """Extend a message's visibility timeout in the database queue."""
+        try:
+            self.session.post(
+                f"{self.base_url}/{queue}/visibility",
+                json={"receipt_handle": receipt_handle, "timeout_seconds": timeout_seconds},
+                timeout=10
+            ).raise_for_status()
+        except Exception as e:
+            logger.warning("Failed to extend message visibility", queue=queue, error=str(e))
+
+
+class VisibilityHeartbeat:
+    """
+    Keeps received messages hidden from other workers until they are released.
+    
+    A daemon thread extends every held message's visibility each
+    ``interval_seconds``, so a task running longer than the queue's visibility
+    timeout is not redelivered to another worker mid-execution, and messages
+    waiting behind it in a received batch don't reappear either.
+    """
+    
+    def __init__(self, queue_backend: QueueBackend, interval_seconds: float, extension_seconds: int):
+        self.queue = queue_backend
+        self.interval_seconds = interval_seconds
+        self.extension_seconds = extension_seconds
+        self._held: Dict[str, str] = {}  # receipt handle -> queue
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start the heartbeat thread."""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="visibility-heartbeat", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the heartbeat thread."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def hold(self, queue: str, receipt_handle: str):
+        """Keep a received message hidden until it is released."""
+        with self._lock:
+            self._held[receipt_handle] = queue
+    
+    def release(self, receipt_handles):
+        """Stop extending messages (acked, or left to reappear after their timeout)."""
+        with self._lock:
+            for receipt_handle in receipt_handles:
+                self._held.pop(receipt_handle, None)
+    
+    def _run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            with self._lock:
+                held = list(self._held.items())
+            for receipt_handle, queue in held:
+                with QUEUE_REQUEST_DURATION.labels("change_visibility").time():
+                    self.queue.extend_visibility(queue, receipt_handle, self.extension_seconds)
+
+
+class SQSWorker:
+    """Worker that polls SQS and processes tasks."""
+    
+    def __init__(self, config: WorkerConfig):
+        self.config = config
+        self.running = True
+        
+        if config.queue_backend == "http":
+            # Database queues are named after the priority they serve
+            self.queue = HTTPQueueBackend(config)
+            queue_names = {"HIGH": "HIGH", "NORMAL": "NORMAL", "LOW": "LOW"}
+        else:
+            self.queue = SQSQueueBackend(config)
+            queue_names = {
+                "HIGH": config.sqs_high_priority_queue_url,
+                "NORMAL": config.sqs_queue_url,
+                "LOW": config.sqs_low_priority_queue_url,
+            }
         
         # Store queue URL (full URL or queue name)
         self.queue_url = config.sqs_queue_url
+        self.queue_selector = PriorityQueueSelector(
+            queue_names,
+            mode=config.priority_mode,
+            weights=PriorityQueueSelector.parse_weights(config.priority_weights),
+            starvation_interval=config.strict_starvation_interval,
+        )
+        # Shards only apply to SQS; the database queue scales with SKIP LOCKED
+        self.shards = None
+        if config.queue_backend == "sqs" and config.sqs_shard_count > 1:
+            self.shards = ShardAssignment(
+                config.api_base_url,
+                config.worker_id,
+                config.sqs_shard_count,
+                refresh_seconds=config.shard_rebalance_seconds
+            )
+        self.heartbeat = VisibilityHeartbeat(
+            self.queue,
+            config.visibility_heartbeat_seconds,
+            config.visibility_extension_seconds
+        )
         self.processor = TaskProcessor()
+        self._load_handlers()
+        self.result_store = ResultStore(config) if config.result_store else None
+        self.result_cache = None
+        if config.result_cache_enabled:
+            self.result_cache = ResultCache(
+                config.result_cache_size,
+                config.result_cache_dir,
+                config.result_cache_disk_max_entries
+            )
+        # LRU of message ids already processed (SQS delivers at least once)
+        self.processed_messages: OrderedDict = OrderedDict()
+        self.cancelled_jobs = CancelledJobCache(
+            config.api_base_url,
+            refresh_seconds=config.cancelled_jobs_refresh_seconds
+        )
         
         # Setup signal handlers
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -136,94 +664,135 @@ class SQSWorker:
         logger.info(
             "Worker initialized",
             worker_id=config.worker_id,
-            queue_url=config.sqs_queue_url,
+            queue_backend=config.queue_backend,
+            queues=[name for name, _ in self.queue_selector.queues],
+            shard_count=config.sqs_shard_count,
             api_base_url=config.api_base_url
         )
     
+    def _load_handlers(self):
+        """Register configured and installed task handlers, then warm up the requested ones."""
+        registry = self.processor.registry
+        registry.load_entry_points()
+        for module_name in filter(None, (m.strip() for m in self.config.task_handler_modules.split(','))):
+            importlib.import_module(module_name)
+        for work_type, spec in self.config.task_handlers.items():
+            registry.register(work_type, spec)
+        registry.warm_up(self.config.handler_warm_up)
+    
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals."""
         logger.info("Received shutdown signal", signal=signum)
         self.running = False
     
     def _receive_tasks(self) -> list:
-        """Receive tasks from SQS."""
-        try:
-            response = self.sqs_client.receive_message(
-                QueueUrl=self.queue_url,
-                MaxNumberOfMessages=self.config.max_messages_per_poll,
-                WaitTimeSeconds=self.config.wait_time_seconds,
-                MessageAttributeNames=['All']
-            )
-            
-            messages = response.get('Messages', [])
-            tasks = []
-            
-            for msg in messages:
-                try:
-                    body = json.loads(msg['Body'])
-                    tasks.append({
-                        'receipt_handle': msg['ReceiptHandle'],
-                        'message_id': msg['MessageId'],
-                        'task_id': body['task_id'],
-                        'job_id': body['job_id'],
-                        'task_index': body['task_index'],
-                        'parameters': body.get('parameters', {})
-                    })
-                except (json.JSONDecodeError, KeyError) as e:
-                    logger.error("Failed to parse SQS message", error=str(e))
-                    continue
-            
-            return tasks
-        except ClientError as e:
-            logger.error("Failed to receive messages from SQS", error=str(e))
-            return []
+        """Receive tasks from the priority queues in the selector's order."""
+        order = self.queue_selector.next_order()
+        if self.shards:
+            shards = self.shards.shards()
+            order = [
+                (priority, f"{queue_url}-{shard}")
+                for priority, queue_url in order
+                for shard in shards
+            ]
+        for i, (priority, queue_url) in enumerate(order):
+            # Only the last queue long-polls, so empty high-priority queues
+            # don't delay picking up lower-priority work
+            wait_time = self.config.wait_time_seconds if i == len(order) - 1 else 0
+            tasks = self._receive_from_queue(queue_url, wait_time)
+            if tasks:
+                return tasks
+        return []
     
-    def _delete_message(self, receipt_handle: str):
-        """Delete a message from SQS after processing."""
-        try:
-            self.sqs_client.delete_message(
-                QueueUrl=self.queue_url,
-                ReceiptHandle=receipt_handle
+    def _receive_from_queue(self, queue_url: str, wait_time_seconds: int) -> list:
+        """Receive tasks from a single queue."""
+        with QUEUE_REQUEST_DURATION.labels("receive").time():
+            messages = self.queue.receive(
+                queue_url,
+                self.config.max_messages_per_poll,
+                wait_time_seconds,
+                self.config.visibility_timeout_seconds
             )
-        except ClientError as e:
-            logger.error("Failed to delete message from SQS", error=str(e))
+        received_at = time.time()
+        RECEIVE_BATCH_SIZE.observe(len(messages))
+        
+        tasks = []
+        for msg in messages:
+            body = msg['body']
+            try:
+                tasks.append({
+                    'receipt_handle': msg['receipt_handle'],
+                    'message_id': msg['message_id'],
+                    'queue_url': queue_url,
+                    'delivered_at': received_at,
+                    'enqueued_at': body.get('enqueued_at'),
+                    'task_id': body['task_id'],
+                    'job_id': body['job_id'],
+                    'task_index': body['task_index'],
+                    'parameters': body.get('parameters', {}),
+                    'attempt': body.get('attempt')
+                })
+            except (KeyError, TypeError) as e:
+                logger.error("Failed to parse task message", error=str(e))
+                continue
+            # Hidden until its batch has been processed
+            self.heartbeat.hold(queue_url, msg['receipt_handle'])
+        
+        return tasks
+    
+    def _delete_message(self, receipt_handle: str, queue_url: str = None):
+        """Delete a message from the queue after processing."""
+        with QUEUE_REQUEST_DURATION.labels("delete").time():
+            self.queue.ack(queue_url or self.queue_url, receipt_handle)
     
-    def _mark_task_running(self, task_id: str) -> bool:
-        """Mark task as running via API."""
+    def _mark_task_running(self, task_id: str) -> Optional[str]:
+        """Mark task as running via API; returns the task's status (None if unknown)."""
         try:
-            response = requests.post(
-                f"{self.config.api_base_url}/api/v1/tasks/{task_id}/running",
-                timeout=5
-            )
-            return response.status_code == 200
+            with API_REQUEST_DURATION.labels("running").time():
+                response = requests.post(
+                    f"{self.config.api_base_url}/api/v1/tasks/{task_id}/running",
+                    timeout=5
+                )
+            if response.status_code == 200:
+                return response.json().get("status")
+            return None
         except Exception as e:
             logger.warning("Failed to mark task as running", task_id=task_id, error=str(e))
-            return False
+            return None
     
-    def _mark_task_complete(self, task_id: str, result: dict, processing_time: float) -> bool:
-        """Mark task as complete via API."""
+    def _mark_task_complete(self, task_id: str, result: dict, processing_time: float, timings: dict = None) -> bool:
+        """Mark task as complete via API, offloading a large result to the result store."""
+        body = {
+            "result": result,
+            "processing_time_seconds": processing_time,
+            **(timings or {})
+        }
         try:
-            response = requests.post(
-                f"{self.config.api_base_url}/api/v1/tasks/{task_id}/complete",
-                json={
-                    "result": result,
-                    "processing_time_seconds": processing_time
-                },
-                timeout=10
-            )
+            payload = json.dumps(result, default=str).encode()
+            if self.result_store and len(payload) > self.config.result_inline_max_bytes:
+                body.update(self.result_store.offload(task_id, result.get("job_id", "unknown"), payload))
+                body["result"] = None
+            
+            with API_REQUEST_DURATION.labels("complete").time():
+                response = requests.post(
+                    f"{self.config.api_base_url}/api/v1/tasks/{task_id}/complete",
+                    json=body,
+                    timeout=10
+                )
             return response.status_code == 200
         except Exception as e:
             logger.error("Failed to mark task as complete", task_id=task_id, error=str(e))
             return False
     
-    def _mark_task_failed(self, task_id: str, error_message: str) -> bool:
+    def _mark_task_failed(self, task_id: str, error_message: str, attempt: Optional[int] = None) -> bool:
         """Mark task as failed via API."""
         try:
-            response = requests.post(
-                f"{self.config.api_base_url}/api/v1/tasks/{task_id}/failed",
-                json={"error_message": error_message},
-                timeout=10
-            )
+            with API_REQUEST_DURATION.labels("failed").time():
+                response = requests.post(
+                    f"{self.config.api_base_url}/api/v1/tasks/{task_id}/failed",
+                    json={"error_message": error_message, "attempt": attempt},
+                    timeout=10
+                )
             return response.status_code == 200
         except Exception as e:
             logger.error("Failed to mark task as failed", task_id=task_id, error=str(e))
@@ -231,62 +800,215 @@ class SQSWorker:
     
     def _process_task(self, task: dict):
         """Process a single task."""
-        task_id = task['task_id']
-        job_id = task['job_id']
-        task_index = task['task_index']
-        parameters = task['parameters']
-        receipt_handle = task['receipt_handle']
+        if not self._start_task(task):
+            return
         
         try:
-            # Mark task as running
-            self._mark_task_running(task_id)
-            
-            # Process the task
-            result = self.processor.process_task(task_id, job_id, task_index, parameters)
-            processing_time = result['processing_time_seconds']
-            
-            # Mark task as complete
-            if self._mark_task_complete(task_id, result, processing_time):
-                # Delete message from SQS only after successful completion
-                self._delete_message(receipt_handle)
-                logger.info("Task processed successfully", task_id=task_id)
+            result = self._execute(task)
+        except Exception as e:
+            self._fail_task(task, str(e))
+            return
+        self._complete_task(task, result)
+    
+    def _process_batch(self, batch: list):
+        """Process compatible tasks with one batched handler call (see ``_coalesce``)."""
+        pending = []
+        for task in batch:
+            if not self._start_task(task):
+                continue
+            cached = self._cached_result(task)
+            if cached is not None:
+                self._complete_task(task, cached)
             else:
-                logger.error("Failed to mark task complete, message will be retried", task_id=task_id)
-                # DO NOT delete message - let it become visible again for retry
-                # The message will become visible after visibility timeout
+                pending.append(task)
+        if not pending:
+            return
         
+        try:
+            results = self.processor.process_batch(pending)
         except Exception as e:
-            error_msg = str(e)
-            logger.error("Task processing failed", task_id=task_id, error=error_msg)
-            
-            # Mark task as failed
-            self._mark_task_failed(task_id, error_msg)
-            
-            # Only delete message if we successfully marked it as failed
-            # Otherwise, let it retry after visibility timeout
-            # In production, check retry count and move to DLQ if exceeded
+            for task in pending:
+                self._fail_task(task, str(e))
+            return
+        
+        for task, result in zip(pending, results):
+            self._cache_result(task, result)
+            self._complete_task(task, result)
+    
+    def _coalesce(self, tasks: list) -> list:
+        """
+        Group a received batch into units of work, keeping receive order.
+        
+        Tasks of the same job and work type whose handler supports ``run_batch``
+        and returns the same ``batch_key`` (for matrix_multiply, the matrix
+        size) form one group; every other task is a group of one.
+        """
+        groups = OrderedDict()
+        for task in tasks:
+            parameters = task['parameters']
+            work_type = parameters.get('work_type', 'cpu_bound')
+            key = None
+            if self.config.batch_execution_enabled:
+                try:
+                    handler = self.processor.registry.get(work_type)
+                    if hasattr(handler, 'run_batch'):
+                        key = handler.batch_key(parameters)
+                except Exception as e:
+                    # Surfaces again, and fails the task, when it runs on its own
+                    logger.warning("Failed to load task handler", work_type=work_type, error=str(e))
+            if key is None:
+                groups[('single', task['message_id'])] = [task]
+            else:
+                groups.setdefault((task['job_id'], work_type, key), []).append(task)
+        return list(groups.values())
+    
+    def _start_task(self, task: dict) -> bool:
+        """
+        Check a delivery and mark its task running.
+        
+        Returns False (after acking the message) for duplicates, tasks of
+        cancelled jobs and tasks another delivery already finished.
+        """
+        task_id = task['task_id']
+        job_id = task['job_id']
+        receipt_handle = task['receipt_handle']
+        queue_url = task.get('queue_url')
+        message_id = task['message_id']
+        
+        if message_id in self.processed_messages:
+            # Duplicate delivery of a message this worker already handled
+            self._delete_message(receipt_handle, queue_url)
+            logger.info("Skipped duplicate message", task_id=task_id, message_id=message_id)
+            return False
+        
+        if self.cancelled_jobs.is_cancelled(job_id):
+            # Acknowledge and drop without running any work
+            self._delete_message(receipt_handle, queue_url)
+            logger.info("Skipped task of cancelled job", task_id=task_id, job_id=job_id)
+            return False
+        
+        # Mark task as running; a task another delivery already finished is skipped
+        status = self._mark_task_running(task_id)
+        if status in FINISHED_TASK_STATUSES:
+            self._delete_message(receipt_handle, queue_url)
+            self._remember_processed(message_id)
+            logger.info("Skipped already finished task", task_id=task_id, status=status)
+            return False
+        return True
+    
+    def _complete_task(self, task: dict, result: dict):
+        """Report a result, deleting the message only once the API has recorded it."""
+        task_id = task['task_id']
+        timings = {"enqueued_at": task.get('enqueued_at'), "received_at": task.get('delivered_at')}
+        if self._mark_task_complete(task_id, result, result['processing_time_seconds'], timings):
+            # Delete message from SQS only after successful completion
+            self._remember_processed(task['message_id'])
+            self._delete_message(task['receipt_handle'], task.get('queue_url'))
+            logger.debug("Task processed successfully", task_id=task_id)
+        else:
+            logger.error("Failed to mark task complete, message will be retried", task_id=task_id)
+            # DO NOT delete message - let it become visible again for retry
+            # The message will become visible after visibility timeout
+    
+    def _fail_task(self, task: dict, error_msg: str):
+        """Report a failed execution."""
+        task_id = task['task_id']
+        logger.error("Task processing failed", task_id=task_id, error=error_msg)
+        
+        # Mark task as failed. The backend owns the retry: it re-enqueues
+        # RETRYING tasks with backoff, so this delivery can be dropped.
+        if self._mark_task_failed(task_id, error_msg, task.get('attempt')):
+            self._remember_processed(task['message_id'])
             try:
-                self._delete_message(receipt_handle)
+                self._delete_message(task['receipt_handle'], task.get('queue_url'))
             except Exception as delete_error:
                 logger.warning("Failed to delete message after failure", task_id=task_id, error=str(delete_error))
+        else:
+            # Failure wasn't recorded - let the message become visible
+            # again after the visibility timeout so it is not lost
+            logger.error("Failed to mark task failed, message will be retried", task_id=task_id)
+    
+    def _execute(self, task: dict) -> dict:
+        """Run a task, or return the memoized result of an identical execution."""
+        cached = self._cached_result(task)
+        if cached is not None:
+            return cached
+        result = self.processor.process_task(
+            task['task_id'], task['job_id'], task['task_index'], task['parameters']
+        )
+        self._cache_result(task, result)
+        return result
+    
+    def _cache_key(self, task: dict) -> Optional[str]:
+        """Result cache key for a task, or None if caching doesn't apply to it."""
+        parameters = task['parameters']
+        if self.result_cache is None or not ResultCache.enabled_for(parameters):
+            return None
+        return ResultCache.key(parameters.get('work_type', 'cpu_bound'), parameters, task['task_index'])
+    
+    def _cached_result(self, task: dict) -> Optional[dict]:
+        """The memoized result of an identical execution, rewritten for this task."""
+        key = self._cache_key(task)
+        if key is None:
+            return None
+        
+        start_time = time.time()
+        cached = self.result_cache.get(key)
+        if cached is None:
+            return None
+        
+        logger.info("Result cache hit", task_id=task['task_id'], hits=self.result_cache.hits, misses=self.result_cache.misses)
+        TASKS_PROCESSED.labels(task['parameters'].get('work_type', 'cpu_bound'), "cached").inc()
+        return {
+            **cached,
+            "task_id": task['task_id'],
+            "job_id": task['job_id'],
+            "processing_time_seconds": time.time() - start_time,
+            "cached": True
+        }
+    
+    def _cache_result(self, task: dict, result: dict):
+        """Memoize a freshly computed result."""
+        key = self._cache_key(task)
+        if key is not None:
+            self.result_cache.put(key, result)
+    
+    def _remember_processed(self, message_id: str):
+        """Record a handled message id, evicting the least recently used past the cache size."""
+        self.processed_messages[message_id] = True
+        self.processed_messages.move_to_end(message_id)
+        while len(self.processed_messages) > self.config.processed_message_cache_size:
+            self.processed_messages.popitem(last=False)
     
     def run(self):
         """Main worker loop."""
         logger.info("Worker started", worker_id=self.config.worker_id)
+        self.heartbeat.start()
         
         while self.running:
             try:
-                # Receive tasks from SQS
+                # Receive tasks from the queue backend
                 tasks = self._receive_tasks()
                 
                 if tasks:
-                    logger.info("Received tasks", count=len(tasks))
+                    start_time = time.time()
                     
-                    # Process each task
-                    for task in tasks:
-                        if not self.running:
-                            break
-                        self._process_task(task)
+                    # Process each task, or compatible tasks together
+                    try:
+                        for batch in self._coalesce(tasks):
+                            if not self.running:
+                                break
+                            if len(batch) == 1:
+                                self._process_task(batch[0])
+                            else:
+                                self._process_batch(batch)
+                            # Messages that weren't acked reappear after the visibility timeout
+                            self.heartbeat.release(task['receipt_handle'] for task in batch)
+                    finally:
+                        self.heartbeat.release(task['receipt_handle'] for task in tasks)
+                    
+                    # One summary line per receive instead of several per task
+                    logger.info("Processed received tasks", count=len(tasks), seconds=round(time.time() - start_time, 3))
                 else:
                     # No tasks, wait before next poll
                     time.sleep(self.config.poll_interval_seconds)
@@ -298,27 +1020,75 @@ class SQSWorker:
                 logger.error("Error in worker loop", error=str(e))
                 time.sleep(self.config.poll_interval_seconds)
         
+        self.heartbeat.stop()
+        if self.shards:
+            self.shards.leave()
         logger.info("Worker stopped")
 
 
+def configure_logging(config: WorkerConfig):
+    """
+    Sampled, rate-limited structlog output written by a background thread.
+    
+    Lines are handed to a ``QueueListener`` so task threads never block on
+    stdout; warnings and errors are never sampled or rate-limited.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
+    atexit.register(listener.stop)  # Flush what's queued on exit
+    
+    worker_logger = logging.getLogger("worker")
+    worker_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    worker_logger.setLevel(logging.DEBUG)  # Level filtering happens in structlog
+    worker_logger.propagate = False
+    
+    renderer = (
+        structlog.processors.JSONRenderer() if config.log_format == "json"
+        else structlog.dev.ConsoleRenderer(colors=False)
+    )
+    structlog.configure(
+        processors=[
+            EventSampler(config.log_sample_rates, config.log_rate_limit_per_second),
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="%Y-%m-%d %H:%M:%S"),
+            renderer,
+        ],
+        wrapper_class=structlog.make_filtering_bound_logger(logging.getLevelName(config.log_level.upper())),
+        logger_factory=lambda *args: worker_logger,
+        cache_logger_on_first_use=True,
+    )
+
+
 def main():
     """Main entrypoint."""
+    # Handler modules do "from worker import handlers"; make that this module, not a second copy
+    sys.modules.setdefault("worker", sys.modules[__name__])
+    
     # Generate worker ID
     worker_id = os.getenv('WORKER_ID', f"worker-{os.getpid()}")
     
     config = WorkerConfig(
         worker_id=worker_id,
         sqs_queue_url=os.getenv('SQS_QUEUE_URL', ''),
+        sqs_high_priority_queue_url=os.getenv('SQS_HIGH_PRIORITY_QUEUE_URL', ''),
+        sqs_low_priority_queue_url=os.getenv('SQS_LOW_PRIORITY_QUEUE_URL', ''),
+        sqs_shard_count=int(os.getenv('SQS_SHARD_COUNT', '1')),
         api_base_url=os.getenv('API_BASE_URL', 'http://localhost:8000'),
         aws_region=os.getenv('AWS_REGION', 'us-east-1'),
         aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', ''),
         aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', ''),
     )
+    configure_logging(config)
     
-    if not config.sqs_queue_url:
+    if config.queue_backend == "sqs" and not config.sqs_queue_url:
         logger.error("SQS_QUEUE_URL environment variable is required")
         sys.exit(1)
     
+    if config.metrics_port:
+        start_http_server(config.metrics_port)
+        logger.info("Metrics server started", port=config.metrics_port)
+    
     worker = SQSWorker(config)
     worker.run()
 